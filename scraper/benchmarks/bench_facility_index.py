@@ -0,0 +1,113 @@
+# benchmarks/bench_facility_index.py
+#
+# Micro-Benchmark für facility_index.FacilityIndex mit synthetischen
+# Facilities (10k bis 1M), verteilt um mehrere Stadtzentren in NRW.
+# Gemessen: Aufbau, kNN (k=1/10, mit type- und Rollstuhl-Filter), Umkreis
+# 1 km; zum Vergleich ein linearer Scan über alle Punkte (wie ohne Index).
+# Die Index-Ergebnisse werden gegen den Scan geprüft.
+#
+# Aufruf (aus /app bzw. scraper/):
+#   python -m benchmarks.bench_facility_index
+#   python -m benchmarks.bench_facility_index --sizes 10000,100000,1000000 --queries 2000
+import argparse
+import random
+import time
+from typing import Callable, List, Tuple
+
+from facility_index import FacilityIndex, FacilityPoint, to_xyz
+
+# Gelsenkirchen, Essen, Bochum, Dortmund, Duisburg, Münster, Köln
+CENTERS = [
+    (51.5177, 7.0857), (51.4556, 7.0116), (51.4818, 7.2162), (51.5136, 7.4653),
+    (51.4344, 6.7623), (51.9607, 7.6261), (50.9375, 6.9603),
+]
+TYPES = ["ARZTPRAXIS"] * 6 + ["APOTHEKE"] * 2 + ["PFLEGE", "KRANKENHAUS", "THERAPIE", "SANITAETSHAUS"]
+
+
+def synthetic(n: int, seed: int) -> List[FacilityPoint]:
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        lat0, lon0 = rnd.choice(CENTERS)
+        rows.append((
+            i,
+            rnd.choice(TYPES),
+            lat0 + rnd.gauss(0, 0.05),
+            lon0 + rnd.gauss(0, 0.08),
+            rnd.choice((True, False, None)),
+        ))
+    return rows
+
+
+def brute_force(rows: List[FacilityPoint], xyz, lat: float, lon: float, k: int, ftype, wheelchair) -> List[int]:
+    qx, qy, qz = to_xyz(lat, lon)
+    cands = [
+        ((x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2, fid)
+        for (fid, t, _, _, wc), (x, y, z) in zip(rows, xyz)
+        if (ftype is None or t == ftype) and (wheelchair is None or wc is wheelchair)
+    ]
+    cands.sort()
+    return [fid for _, fid in cands[:k]]
+
+
+def timed(fn: Callable[[], object], repeat: int) -> Tuple[float, float]:
+    """-> (Mittelwert ms, p95 ms)"""
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return sum(samples) / len(samples), samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Micro-Benchmark k-d-Baum-Index für facilities")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--brute-queries", type=int, default=20, help="Abfragen für Vergleich/Prüfung per Scan")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    for n in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        rows = synthetic(n, args.seed)
+        t0 = time.perf_counter()
+        index = FacilityIndex(rows)
+        build_s = time.perf_counter() - t0
+
+        rnd = random.Random(args.seed + 1)
+        queries = [
+            (c[0] + rnd.gauss(0, 0.05), c[1] + rnd.gauss(0, 0.08))
+            for c in (rnd.choice(CENTERS) for _ in range(args.queries))
+        ]
+        it = iter(queries * 10)
+
+        print(f"[bench] ===== {n} Facilities, Aufbau {build_s:.2f}s =====")
+        cases = [
+            ("kNN k=1", lambda: index.nearest(*next(it), k=1)),
+            ("kNN k=10", lambda: index.nearest(*next(it), k=10)),
+            ("kNN k=10 APOTHEKE", lambda: index.nearest(*next(it), k=10, types=["APOTHEKE"])),
+            ("kNN k=10 rollstuhl", lambda: index.nearest(*next(it), k=10, wheelchair=True)),
+            ("Umkreis 1 km", lambda: index.within(*next(it), radius_km=1.0)),
+        ]
+        for name, fn in cases:
+            mean, p95 = timed(fn, args.queries)
+            print(f"[bench]   {name:<22} mean={mean:.3f} ms p95={p95:.3f} ms")
+
+        # linearer Scan als Referenz (und Korrektheitsprüfung)
+        xyz = [to_xyz(lat, lon) for _, _, lat, lon, _ in rows]
+        mismatches = 0
+        scan_ms = []
+        for lat, lon in queries[:args.brute_queries]:
+            for ftype, wheelchair in ((None, None), ("APOTHEKE", True)):
+                t0 = time.perf_counter()
+                expected = brute_force(rows, xyz, lat, lon, 10, ftype, wheelchair)
+                scan_ms.append((time.perf_counter() - t0) * 1000)
+                got = [fid for _, fid, _ in index.nearest(lat, lon, 10, [ftype] if ftype else None, wheelchair)]
+                mismatches += got != expected
+        print(f"[bench]   linearer Scan k=10     mean={sum(scan_ms) / len(scan_ms):.3f} ms "
+              f"(Abweichungen Index vs. Scan: {mismatches}/{len(scan_ms)})")
+
+
+if __name__ == "__main__":
+    main()
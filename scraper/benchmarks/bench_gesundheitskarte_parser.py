@@ -0,0 +1,104 @@
+# benchmarks/bench_gesundheitskarte_parser.py
+#
+# Vergleicht die Parser-Backends der Gesundheitskarte (Laufzeit + Peak-Speicher).
+#
+# Aufruf (aus /app bzw. scraper/):
+#   python -m benchmarks.bench_gesundheitskarte_parser --download seite.html
+#   python -m benchmarks.bench_gesundheitskarte_parser --html seite.html
+#   python -m benchmarks.bench_gesundheitskarte_parser --synthetic 20000
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Dict, List
+
+import http_client
+from sources import gelsenkirchen_gesundheitskarte as gk
+
+
+# Erzeugt eine Seite mit n Zeilen im Aufbau der echten Gesundheitskarte
+# (plus etwas "Rauschen" drumherum), falls keine gespeicherte Kopie vorliegt.
+def synthetic_page(n: int, seed: int = 42) -> str:
+    rnd = random.Random(seed)
+    labels = ["Krankenhaus", "Therapie", "Sanitätshaus", "Ambulanter Dienst", "Beratungsstelle", "Kurzzeitpflege"]
+    rows: List[str] = []
+    for i in range(n):
+        lat = 51.45 + rnd.random() * 0.15
+        lng = 7.00 + rnd.random() * 0.15
+        marker = (
+            f"{{&#39;lat&#39;:{lat:.6f},&#39;lng&#39;:{lng:.6f},"
+            f"&#39;address&#39;:&#39;Teststraße {i}, 458{rnd.randint(10, 99)} Gelsenkirchen&#39;}}"
+        )
+        rows.append(
+            f'<tr data-gemap-marker="{marker}">'
+            f"<td><strong>Einrichtung {i}</strong><br/>Tel.: 0209 {rnd.randint(100000, 999999)}"
+            f"<!-- intern --></td>"
+            f"<td> {rnd.choice(labels)} </td>"
+            f"<td><a href=\"/detail/{i}\">Details</a></td></tr>"
+        )
+    filler = "<div class='teaser'><p>" + ("Lorem ipsum dolor sit amet. " * 20) + "</p></div>"
+    return (
+        "<html><head><title>Gesundheitskarte</title><script>var x = '<tr>';</script></head><body>"
+        + filler * 50
+        + "<table><thead><tr><th>Name</th><th>Art</th><th></th></tr></thead><tbody>"
+        + "".join(rows)
+        + "</tbody></table>"
+        + filler * 50
+        + "</body></html>"
+    )
+
+
+def measure(parser: str, html: str, repeat: int) -> Dict[str, float]:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        gk.parse_facilities(html, parser=parser)
+        best = min(best, time.perf_counter() - started)
+
+    # tracemalloc sieht nur Python-Objekte; der C-Baum von lxml zählt nicht mit
+    tracemalloc.start()
+    items = gk.parse_facilities(html, parser=parser)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"seconds": best, "peak_mb": peak / (1024 * 1024), "rows": len(items)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark der Gesundheitskarte-Parser")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--html", help="gespeicherte Kopie von gesundheitskarte.aspx")
+    src.add_argument("--download", help="Seite live laden, hier speichern und benchmarken")
+    src.add_argument("--synthetic", type=int, help="synthetische Seite mit N Zeilen")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--parsers", nargs="*", default=list(gk.PARSERS))
+    args = parser.parse_args()
+
+    if args.download:
+        r = http_client.get(gk.URL, headers=gk.HEADERS)
+        r.raise_for_status()
+        with open(args.download, "w", encoding="utf-8") as f:
+            f.write(r.text)
+        html = r.text
+    elif args.html:
+        with open(args.html, "r", encoding="utf-8") as f:
+            html = f.read()
+    else:
+        html = synthetic_page(args.synthetic)
+
+    print(f"[bench] Seite: {len(html) / 1024:.0f} KiB, Wiederholungen: {args.repeat}")
+
+    # alle Backends müssen dasselbe Ergebnis liefern
+    reference = gk.parse_facilities(html, parser=args.parsers[0])
+    for name in args.parsers[1:]:
+        if gk.parse_facilities(html, parser=name) != reference:
+            print(f"[bench] ⚠️  {name} liefert andere Einträge als {args.parsers[0]}")
+
+    print(f"[bench] {'parser':<12} {'zeit (ms)':>10} {'peak (MiB)':>11} {'zeilen':>7}")
+    for name in args.parsers:
+        res = measure(name, html, args.repeat)
+        print(f"[bench] {name:<12} {res['seconds'] * 1000:>10.1f} {res['peak_mb']:>11.1f} {res['rows']:>7}")
+
+
+if __name__ == "__main__":
+    main()
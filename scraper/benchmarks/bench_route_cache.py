@@ -0,0 +1,158 @@
+# benchmarks/bench_route_cache.py
+#
+# Trefferquote und Latenz des Route-Caches (route_cache.py) für ein
+# synthetisches Nutzungsprofil: --users Startorte im Stadtgebiet, jede
+# Anfrage streut um --jitter-m Meter um ihren Startort (Karten-Klick/GPS),
+# Ziele sind --facilities Punkte, beliebte Ziele werden häufiger gefragt.
+#
+# Aufruf (aus /app bzw. scraper/):
+#   python -m benchmarks.bench_route_cache                       # Stub-OSRM, kein Container nötig
+#   python -m benchmarks.bench_route_cache --cell-m 25,50,100 --jitter-m 30
+#   python -m benchmarks.bench_route_cache --upstream http://osrm-routing:5000
+#
+# Ausgabe je Zellgröße: Trefferquote, eingesparte OSRM-Requests, p50/p95
+# für Treffer und Fehlschläge.
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+import requests
+
+import geo
+import route_cache
+
+Point = Tuple[float, float]
+
+
+# Minimaler OSRM-Ersatz: feste Latenz, Antwort im Format von /route
+class StubOsrmHandler(BaseHTTPRequestHandler):
+    latency_ms = 0.0
+
+    def do_GET(self) -> None:
+        time.sleep(self.latency_ms / 1000.0)
+        body = json.dumps({
+            "code": "Ok",
+            "routes": [{"distance": 1234.5, "duration": 210.0, "geometry": {"type": "LineString", "coordinates": []}}],
+            "waypoints": [],
+        }, separators=(",", ":")).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def start_stub(latency_ms: float) -> ThreadingHTTPServer:
+    handler = type("Handler", (StubOsrmHandler,), {"latency_ms": latency_ms})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-osrm", daemon=True).start()
+    return server
+
+
+def jitter(point: Point, meters: float, rnd: random.Random) -> Point:
+    dlat, dlon = geo.km_to_deg(point[0], meters / 1000.0)
+    return point[0] + rnd.gauss(0, dlat), point[1] + rnd.gauss(0, dlon)
+
+
+def workload(
+    pool: List[Point],
+    n_requests: int,
+    n_users: int,
+    n_facilities: int,
+    jitter_m: float,
+    seed: int,
+) -> List[Tuple[Point, Point]]:
+    rnd = random.Random(seed)
+    users = rnd.sample(pool, min(n_users, len(pool)))
+    facilities = rnd.sample(pool, min(n_facilities, len(pool)))
+    weights = [1.0 / (rank + 1) for rank in range(len(facilities))]  # Zipf-artig
+    return [
+        (jitter(rnd.choice(users), jitter_m, rnd), rnd.choices(facilities, weights)[0])
+        for _ in range(n_requests)
+    ]
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def run(upstream: str, cell_m: float, requests_: List[Tuple[Point, Point]], size: int) -> Dict[str, Any]:
+    proxy = route_cache.start_server(upstream=upstream, cache=route_cache.RouteCache(max_entries=size), cell_m=cell_m)
+    base = f"http://{proxy.server_address[0]}:{proxy.server_address[1]}"
+    session = requests.Session()
+    latencies: Dict[str, List[float]] = {"HIT": [], "MISS": []}
+
+    started = time.perf_counter()
+    for (o_lat, o_lon), (d_lat, d_lon) in requests_:
+        url = f"{base}/route/v1/driving/{o_lon:.6f},{o_lat:.6f};{d_lon:.6f},{d_lat:.6f}?overview=full&geometries=geojson"
+        t0 = time.perf_counter()
+        resp = session.get(url, timeout=30)
+        elapsed = time.perf_counter() - t0
+        latencies.setdefault(resp.headers.get(route_cache.CACHE_HEADER, "?"), []).append(elapsed)
+    total = time.perf_counter() - started
+
+    proxy.shutdown()
+    stats = proxy.cache.snapshot()
+    stats.update(
+        total_s=total,
+        hit_p50_ms=_pct(latencies["HIT"], 0.5) * 1000,
+        hit_p95_ms=_pct(latencies["HIT"], 0.95) * 1000,
+        miss_p50_ms=_pct(latencies["MISS"], 0.5) * 1000,
+        miss_p95_ms=_pct(latencies["MISS"], 0.95) * 1000,
+    )
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Trefferquote des OSRM-Route-Caches")
+    parser.add_argument("--upstream", default="", help="echtes OSRM (leer -> Stub mit --stub-latency-ms)")
+    parser.add_argument("--stub-latency-ms", type=float, default=15.0)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--facilities", type=int, default=100)
+    parser.add_argument("--jitter-m", type=float, default=20.0)
+    parser.add_argument("--cell-m", default=str(int(route_cache.ROUTE_CACHE_CELL_M)), help="kommagetrennt, z.B. 25,50,100")
+    parser.add_argument("--size", type=int, default=route_cache.ROUTE_CACHE_SIZE)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    boundary = geo.load_city_boundary()
+    pool = geo.grid_points_inside(boundary, 0.2)
+    requests_ = workload(pool, args.requests, args.users, args.facilities, args.jitter_m, args.seed)
+
+    stub = None
+    upstream = args.upstream
+    if not upstream:
+        stub = start_stub(args.stub_latency_ms)
+        upstream = f"http://127.0.0.1:{stub.server_address[1]}"
+
+    print(f"[bench] {len(requests_)} Anfragen, {args.users} Startorte (±{args.jitter_m:.0f} m), "
+          f"{args.facilities} Ziele, Upstream {upstream}")
+    print("[bench] ==========================================")
+    for cell_m in [float(c) for c in args.cell_m.split(",") if c.strip()]:
+        s = run(upstream, cell_m, requests_, args.size)
+        print(
+            f"[bench] Zelle {cell_m:>5.0f} m: Treffer {s['hit_rate']:>6.1%}, "
+            f"OSRM-Requests {s['misses']}/{len(requests_)}, "
+            f"Treffer p50/p95 {s['hit_p50_ms']:.1f}/{s['hit_p95_ms']:.1f} ms, "
+            f"Fehlschlag p50/p95 {s['miss_p50_ms']:.1f}/{s['miss_p95_ms']:.1f} ms, "
+            f"gesamt {s['total_s']:.2f}s"
+        )
+
+    if stub is not None:
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
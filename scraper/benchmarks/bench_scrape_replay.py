@@ -0,0 +1,119 @@
+# benchmarks/bench_scrape_replay.py
+#
+# End-to-end-Benchmark der Scraper gegen aufgenommene Antworten (ohne Netz).
+# Läuft wie main.main() über main.run_pipeline(): Migrationen, Quellen und
+# die Post-Stufen (Stadtteil-Zuordnung, Dubletten, Facility-Index).
+#
+# 1) Aufnehmen (einmalig, mit Netz). Die Suchpunkte plant search_planner
+#    aus search_stats.json, die der Lauf am Ende überschreibt -> vorher
+#    den Stand als Snapshot neben die Fixtures legen:
+#      cp /app/cache/search_stats.json /app/fixtures/
+#      HTTP_RECORD_DIR=/app/fixtures python main.py
+#    Ohne Snapshot schaltet der Benchmark die Planer ab (KVWL_PLANNER,
+#    APONET_PLANNER), dann auch so aufnehmen:
+#      KVWL_PLANNER=0 APONET_PLANNER=0 HTTP_RECORD_DIR=/app/fixtures python main.py
+# 2) Benchmark (DB muss laufen, kein Internet nötig):
+#      python -m benchmarks.bench_scrape_replay --fixtures /app/fixtures --latency-ms 80
+#      python -m benchmarks.bench_scrape_replay --fixtures /app/fixtures kvwl
+#
+# Damit jeder Lauf dieselben Requests schickt und nichts Produktives
+# verändert, laufen Suchstatistik und KVWL-Journal in einem frischen
+# Temp-Verzeichnis: der Planer liest eine Kopie des Snapshots
+# (SEARCH_STATS_PATH), das Journal (KVWL_JOURNAL_PATH) startet leer, ein
+# abgebrochener Benchmark wird also nie fortgesetzt.
+#
+# Ausgabe: Gesamtzeit, Zeit je Quelle und Post-Stufe, Requests/s am
+# Replay-Server, DB-Zeit (alle Statements + COPY)
+# und die Zeitverteilung aus metrics.py (METRICS_JSON_PATH für den vollen Report).
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from typing import Tuple
+
+import crawl_journal
+import db
+import http_cache
+import main as scraper
+import metrics
+import replay
+import search_planner
+from sources import aponet_apothekensuche
+
+
+def _db_totals() -> Tuple[float, int]:
+    """Summe aller db_statement_seconds (db.TimedCursor) -> (sekunden, anzahl)."""
+    seconds, count = 0.0, 0
+    for (name, _), hist in metrics.REGISTRY.histograms.items():
+        if name == "db_statement_seconds":
+            seconds += hist.sum
+            count += hist.count
+    return seconds, count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Scraper-Benchmark gegen den lokalen Replay-Server")
+    parser.add_argument("sources", nargs="*", default=list(scraper.SOURCES))
+    parser.add_argument("--fixtures", required=True)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    server = replay.start_server(
+        args.fixtures,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    host, port = server.server_address[:2]
+
+    # alles über den Replay-Server, kein Cache (sonst misst man nur SQLite)
+    replay.HTTP_REPLAY_URL = f"http://{host}:{port}"
+    replay.HTTP_RECORD_DIR = ""
+    http_cache.HTTP_CACHE_PATH = ""
+
+    # Planer-Statistik und Journal nur im Temp-Verzeichnis (s.o.)
+    workdir = tempfile.mkdtemp(prefix="bench_scrape_")
+    snapshot = os.path.join(args.fixtures, "search_stats.json")
+    search_planner.SEARCH_STATS_PATH = os.path.join(workdir, "search_stats.json")
+    if os.path.exists(snapshot):
+        shutil.copyfile(snapshot, search_planner.SEARCH_STATS_PATH)
+        print(f"[bench] Suchpunkte aus Snapshot {snapshot}")
+    else:
+        scraper.KVWL_PLANNER = False
+        aponet_apothekensuche.APONET_PLANNER = False
+        print("[bench] kein search_stats.json bei den Fixtures -> feste Suchpunkte (Planer aus)")
+    crawl_journal.KVWL_JOURNAL_PATH = os.path.join(workdir, "kvwl_journal.sqlite")
+
+    print(f"[bench] Replay-Server {replay.HTTP_REPLAY_URL} mit {len(server.fixtures)} Fixtures")
+    db.wait_for_db("[bench]")
+    metrics.REGISTRY.drain()  # wait_for_db nicht mitzählen
+
+    started = time.perf_counter()
+    results, stages = scraper.run_pipeline(args.sources, tag="[bench]")
+    total = time.perf_counter() - started
+    server.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    stats = server.stats
+    print("[bench] ==========================================")
+    for name, ok, written, elapsed in results:
+        print(f"[bench] {name:<32} {'ok' if ok else 'FEHLER':<6} {written:>6} Einträge {elapsed:>8.2f}s")
+    for name, ok, elapsed in stages:
+        print(f"[bench] {name:<32} {'ok' if ok else 'FEHLER':<6} {'':>6}          {elapsed:>8.2f}s")
+    print(f"[bench] Gesamtzeit:        {total:.2f}s")
+    print(f"[bench] HTTP-Requests:     {stats['requests']} ({stats['requests'] / total:.1f}/s)")
+    print(f"[bench]   ausgeliefert:    {stats['served']}")
+    print(f"[bench]   Fehler (inject): {stats['errors_injected']}")
+    print(f"[bench]   ohne Fixture:    {stats['missing']}")
+    db_seconds, db_statements = _db_totals()
+    print(f"[bench] DB-Zeit:           {db_seconds:.2f}s ({db_statements} Statements)")
+    metrics.write_report("bench_scrape_replay", "[bench]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# benchmarks/check_kvwl_abstracts.py
+#
+# Prüft aufgenommene KVWL-Suchantworten (replay.py-Fixtures) gegen den
+# Vorfilter: welche Schlüssel haben die DoctorAbstracts wirklich, und
+# woran würde main.abstract_location() sie einordnen (PLZ/Ort,
+# Koordinaten, ohne Ortsangabe -> immer getDoctor).
+#
+# Aufruf (aus /app bzw. scraper/):
+#   HTTP_RECORD_DIR=/app/fixtures python main.py kvwl     # einmal aufnehmen
+#   python -m benchmarks.check_kvwl_abstracts --fixtures /app/fixtures
+#
+# Exit-Code 1, wenn kein einziges Abstract eine Ortsangabe hat (dann ist
+# der Vorfilter wirkungslos und abstract_location passt nicht zur API).
+import argparse
+import json
+import sys
+from collections import Counter
+
+import main as scraper
+import replay
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DoctorAbstract-Struktur in KVWL-Fixtures prüfen")
+    parser.add_argument("--fixtures", required=True)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    keys: Counter = Counter()
+    location_keys: Counter = Counter()
+    basis: Counter = Counter()
+    pages = 0
+
+    for fixture in replay.load_fixtures(args.fixtures).values():
+        if fixture.get("url") != scraper.SEARCH_URL or fixture.get("status") != 200:
+            continue
+        pages += 1
+        data = json.loads(fixture["body"])
+        for abstract in ((data.get("DoctorAbstracts") or {}).get("DoctorAbstract")) or []:
+            keys.update(abstract.keys())
+            if isinstance(abstract.get("Location"), dict):
+                location_keys.update(abstract["Location"].keys())
+            lat, lon, postal, city = scraper.abstract_location(abstract)
+            if postal or city:
+                basis["plz"] += 1
+            elif lat is not None and lon is not None:
+                basis["coords"] += 1
+            else:
+                basis["unknown"] += 1
+
+    total = sum(basis.values())
+    print(f"[check] {pages} Suchseiten, {total} Abstracts")
+    print(f"[check] Schlüssel:          {', '.join(f'{k} ({n})' for k, n in keys.most_common(args.top))}")
+    print(f"[check] Location-Schlüssel: {', '.join(f'{k} ({n})' for k, n in location_keys.most_common(args.top))}")
+    print(f"[check] Vorfilter-Basis:    PLZ/Ort {basis['plz']}, Koordinaten {basis['coords']}, "
+          f"ohne Ortsangabe {basis['unknown']}")
+
+    if total and basis["unknown"] == total:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
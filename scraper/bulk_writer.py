@@ -0,0 +1,215 @@
+# bulk_writer.py
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from psycopg.rows import tuple_row
+
+import metrics
+
+
+# ============================================================
+# Gemeinsamer Bulk-Writer für alle Quellen
+# Statt pro Facility ein UPSERT + fetchone() (= ein Roundtrip pro Zeile)
+# laufen alle Zeilen per COPY in eine temporäre Staging-Tabelle.
+# Danach schreibt EIN Statement alles nach facilities und liefert per
+# RETURNING die Zuordnung source_key -> id zurück.
+#
+# Für Ärzte gilt dasselbe: alle Zeilen in doctors_stage, danach ein
+# einziges Statement, das fehlende löscht und geänderte upsertet.
+#
+# Anzahl Statements pro Quelle ist damit konstant, egal wie viele
+# Facilities/Ärzte geliefert werden.
+# ============================================================
+
+FACILITY_COLUMNS = (
+    "source",
+    "source_key",
+    "facility_name",
+    "type",
+    "street",
+    "postal_code",
+    "city",
+    "phone",
+    "latitude",
+    "longitude",
+    "wheelchair_accessible",
+    "content_hash",
+)
+
+CREATE_FACILITY_STAGE_SQL = """
+DROP TABLE IF EXISTS pg_temp.facilities_stage;
+CREATE TEMP TABLE facilities_stage (
+  source TEXT NOT NULL,
+  source_key TEXT NOT NULL,
+  facility_name TEXT,
+  type TEXT,
+  street TEXT,
+  postal_code TEXT,
+  city TEXT,
+  phone TEXT,
+  latitude DOUBLE PRECISION,
+  longitude DOUBLE PRECISION,
+  wheelchair_accessible BOOLEAN,
+  content_hash TEXT
+) ON COMMIT DROP;
+"""
+
+# DISTINCT ON: ON CONFLICT darf dieselbe Zeile nicht zweimal im selben
+# Statement treffen, doppelte source_keys einer Quelle werden hier entfernt.
+MERGE_FACILITIES_SQL = """
+INSERT INTO facilities
+  (source, source_key, facility_name, type, street, postal_code, city, phone,
+   latitude, longitude, wheelchair_accessible, content_hash{last_seen_col})
+SELECT DISTINCT ON (source, source_key)
+  source, source_key, facility_name, type, street, postal_code, city, phone,
+  latitude, longitude, wheelchair_accessible, content_hash{last_seen_val}
+FROM facilities_stage
+ORDER BY source, source_key
+ON CONFLICT (source, source_key)
+DO UPDATE SET
+  facility_name = EXCLUDED.facility_name,
+  type = EXCLUDED.type,
+  street = EXCLUDED.street,
+  postal_code = EXCLUDED.postal_code,
+  city = EXCLUDED.city,
+  phone = EXCLUDED.phone,
+  latitude = EXCLUDED.latitude,
+  longitude = EXCLUDED.longitude,
+  wheelchair_accessible = EXCLUDED.wheelchair_accessible,
+  content_hash = EXCLUDED.content_hash{last_seen_set}
+RETURNING source_key, id;
+"""
+
+DOCTOR_COLUMNS = (
+    "facility_id",
+    "source",
+    "source_key",
+    "first_name",
+    "last_name",
+    "name",
+    "specialty",
+    "content_hash",
+)
+
+CREATE_DOCTOR_STAGE_SQL = """
+DROP TABLE IF EXISTS pg_temp.doctors_stage;
+CREATE TEMP TABLE doctors_stage (
+  facility_id BIGINT NOT NULL,
+  source TEXT NOT NULL,
+  source_key TEXT NOT NULL,
+  first_name TEXT,
+  last_name TEXT,
+  name TEXT,
+  specialty TEXT,
+  content_hash TEXT
+) ON COMMIT DROP;
+"""
+
+# Ein Statement für den kompletten Abgleich der Ärzte einer Quelle:
+# - removed: Ärzte der betroffenen Facilities, die nicht mehr im Stage stehen
+#   (nur bei delete_missing, Zwischenstände löschen nichts)
+# - upserted: neue Ärzte + geänderte (Hash oder Facility anders).
+#   Unveränderte Zeilen werden über das WHERE im DO UPDATE gar nicht
+#   angefasst -> keine Dead Tuples.
+# Beide Teile betreffen disjunkte Zeilen, daher in einem Statement erlaubt.
+SYNC_DOCTORS_SQL = """
+WITH stage AS (
+  SELECT DISTINCT ON (source_key) *
+  FROM doctors_stage
+  ORDER BY source_key
+),
+removed AS (
+  DELETE FROM doctors d
+  WHERE %(delete_missing)s
+    AND d.source = %(source)s
+    AND d.facility_id IN (SELECT facility_id FROM stage)
+    AND NOT EXISTS (SELECT 1 FROM stage s WHERE s.source_key = d.source_key)
+  RETURNING 1
+),
+upserted AS (
+  INSERT INTO doctors (facility_id, source, source_key, first_name, last_name, name, specialty, content_hash)
+  SELECT facility_id, source, source_key, first_name, last_name, name, specialty, content_hash
+  FROM stage
+  ON CONFLICT (source, source_key)
+  DO UPDATE SET
+    facility_id = EXCLUDED.facility_id,
+    first_name = EXCLUDED.first_name,
+    last_name = EXCLUDED.last_name,
+    name = EXCLUDED.name,
+    specialty = EXCLUDED.specialty,
+    content_hash = EXCLUDED.content_hash
+  WHERE doctors.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+     OR doctors.facility_id IS DISTINCT FROM EXCLUDED.facility_id
+  RETURNING 1
+)
+SELECT (SELECT COUNT(*) FROM removed), (SELECT COUNT(*) FROM upserted);
+"""
+
+
+def copy_rows(cur, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+    """Streamt rows per COPY FROM STDIN in table und gibt die Anzahl zurück."""
+    count = 0
+    with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as copy:
+        for row in rows:
+            copy.write_row(row)
+            count += 1
+    metrics.inc("db_rows_copied", count, table=table)
+    return count
+
+
+def _facility_row(fac: Dict[str, Any]) -> List[Any]:
+    return [fac.get(col) for col in FACILITY_COLUMNS]
+
+
+def bulk_upsert_facilities(conn, facilities: List[Dict[str, Any]], touch_last_seen: bool = True) -> Dict[str, int]:
+    """
+    Schreibt alle facilities (Dicts mit FACILITY_COLUMNS) in einem Rutsch.
+    touch_last_seen=True setzt last_seen_at = NOW() (auch bei Updates).
+    Rückgabe: {source_key: facility_id}. Kein commit -> macht der Aufrufer.
+    """
+    if not facilities:
+        return {}
+
+    if touch_last_seen:
+        merge_sql = MERGE_FACILITIES_SQL.format(
+            last_seen_col=", last_seen_at",
+            last_seen_val=", NOW()",
+            last_seen_set=",\n  last_seen_at = NOW()",
+        )
+    else:
+        merge_sql = MERGE_FACILITIES_SQL.format(last_seen_col="", last_seen_val="", last_seen_set="")
+
+    # tuple_row: unabhängig davon, mit welcher row_factory die Connection geöffnet wurde
+    with conn.cursor(row_factory=tuple_row) as cur:
+        cur.execute(CREATE_FACILITY_STAGE_SQL)
+        copy_rows(cur, "facilities_stage", FACILITY_COLUMNS, (_facility_row(f) for f in facilities))
+        cur.execute(merge_sql)
+        ids = {source_key: facility_id for source_key, facility_id in cur.fetchall()}
+
+    metrics.inc("rows_written", len(ids), table="facilities", source=facilities[0]["source"])
+    return ids
+
+
+
+def bulk_sync_doctors(
+    conn,
+    source: str,
+    rows: Iterable[Sequence[Any]],
+    delete_missing: bool = True,
+) -> Tuple[int, int]:
+    """
+    Gleicht alle Ärzte einer Quelle in einem Rutsch ab.
+    rows: Tupel in der Reihenfolge von DOCTOR_COLUMNS, vollständig für alle
+    Facilities dieses Laufs (fehlende Ärzte dieser Facilities werden gelöscht).
+    delete_missing=False -> nur upserten (Zwischenstand, rows unvollständig).
+    Rückgabe: (gelöscht, geschrieben). Kein commit -> macht der Aufrufer.
+    """
+    with conn.cursor(row_factory=tuple_row) as cur:
+        cur.execute(CREATE_DOCTOR_STAGE_SQL)
+        if copy_rows(cur, "doctors_stage", DOCTOR_COLUMNS, rows) == 0:
+            return 0, 0
+        cur.execute(SYNC_DOCTORS_SQL, {"source": source, "delete_missing": delete_missing})
+        removed, upserted = cur.fetchone()
+
+    metrics.inc("rows_written", upserted, table="doctors", source=source)
+    metrics.inc("rows_deleted", removed, table="doctors", source=source)
+    return removed, upserted
@@ -0,0 +1,213 @@
+# crawl_journal.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# ============================================================
+# Journal für den KVWL-Crawl (SQLite)
+# Bisher lag der komplette Crawl bis zum Schluss nur im Speicher: ein
+# Absturz, Timeout oder Postgres-Neustart nach einer Stunde -> alles weg,
+# der nächste Lauf fing wieder bei Seite 0 des ersten Suchpunkts an.
+#
+# Das Journal hält pro Lauf fest:
+# - points:  geplante Suchpunkte + nächste Seite (Cursor) + fertig ja/nein
+# - ids:     jede gesehene Arzt-Id (queued -> fetched, oder skipped durch
+#            den Vorfilter), damit sie nach einem Neustart nicht erneut
+#            in die Detail-Queue kommt
+# - details: geholte getDoctor-Antworten (JSON), werden beim Fortsetzen
+#            ohne HTTP erneut gruppiert
+#
+# Ein Lauf ohne finished_at wird beim nächsten Start fortgesetzt (sofern
+# jünger als KVWL_JOURNAL_MAX_AGE_HOURS), sonst verworfen.
+# KVWL_JOURNAL_PATH leer -> kein Journal (Verhalten wie bisher).
+# ============================================================
+KVWL_JOURNAL_PATH = os.getenv("KVWL_JOURNAL_PATH", "/app/cache/kvwl_journal.sqlite")
+KVWL_JOURNAL_MAX_AGE_HOURS = float(os.getenv("KVWL_JOURNAL_MAX_AGE_HOURS", "24"))
+KVWL_JOURNAL_COMMIT_EVERY = int(os.getenv("KVWL_JOURNAL_COMMIT_EVERY", "50"))
+
+Point = Tuple[float, float]
+
+CREATE_TABLES_SQL = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS points (
+    run_id INTEGER NOT NULL,
+    point_key TEXT NOT NULL,
+    lat REAL NOT NULL,
+    lon REAL NOT NULL,
+    position INTEGER NOT NULL,
+    next_page INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, point_key)
+);
+CREATE TABLE IF NOT EXISTS ids (
+    run_id INTEGER NOT NULL,
+    doc_id TEXT NOT NULL,
+    point_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    PRIMARY KEY (run_id, doc_id)
+);
+CREATE TABLE IF NOT EXISTS details (
+    run_id INTEGER NOT NULL,
+    doc_id TEXT NOT NULL,
+    detail TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (run_id, doc_id)
+);
+"""
+
+
+def point_key(point: Point) -> str:
+    return f"{point[0]:.7f},{point[1]:.7f}"
+
+
+class CrawlJournal:
+    """Thread-safe: eine SQLite-Verbindung, Zugriffe über _lock serialisiert (wie http_cache)."""
+
+    def __init__(self, path: str, source: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.source = source
+        self.run_id = 0
+        self.resumed = False
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL;")
+        self._db.executescript(CREATE_TABLES_SQL)
+        self._db.commit()
+
+    # --------------------------------------------------------
+    # Lauf anlegen / fortsetzen
+    # --------------------------------------------------------
+    def open_run(self, planned: List[Point], max_age_hours: float = KVWL_JOURNAL_MAX_AGE_HOURS) -> List[Point]:
+        """
+        Setzt einen offenen Lauf fort oder legt einen neuen mit planned an.
+        Rückgabe: die Suchpunkte des Laufs (beim Fortsetzen die alten,
+        damit die Seiten-Cursor gültig bleiben).
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT run_id, started_at FROM runs WHERE source = ? AND finished_at IS NULL "
+                "ORDER BY run_id DESC LIMIT 1;",
+                (self.source,),
+            ).fetchone()
+
+            if row is not None and time.time() - row[1] <= max_age_hours * 3600:
+                self.run_id, self.resumed = row[0], True
+                points = self._db.execute(
+                    "SELECT lat, lon FROM points WHERE run_id = ? ORDER BY position;", (self.run_id,)
+                ).fetchall()
+                return [(lat, lon) for lat, lon in points]
+
+            # alte/abgebrochene Läufe dieser Quelle aufräumen
+            self._delete_runs("source = ?", (self.source,))
+            cur = self._db.execute(
+                "INSERT INTO runs (source, started_at) VALUES (?, ?);", (self.source, time.time())
+            )
+            self.run_id, self.resumed = cur.lastrowid, False
+            self._db.executemany(
+                "INSERT INTO points (run_id, point_key, lat, lon, position) VALUES (?, ?, ?, ?, ?);",
+                [(self.run_id, point_key(p), p[0], p[1], i) for i, p in enumerate(planned)],
+            )
+            self._db.commit()
+            return list(planned)
+
+    def _delete_runs(self, where: str, params: Tuple[Any, ...]) -> None:
+        run_ids = [r[0] for r in self._db.execute(f"SELECT run_id FROM runs WHERE {where};", params)]
+        for table in ("points", "ids", "details", "runs"):
+            self._db.executemany(f"DELETE FROM {table} WHERE run_id = ?;", [(r,) for r in run_ids])
+
+    def finish(self) -> None:
+        """Lauf abgeschlossen (alles in Postgres) -> Journal-Daten löschen."""
+        with self._lock:
+            self._db.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?;", (time.time(), self.run_id))
+            for table in ("points", "ids", "details"):
+                self._db.execute(f"DELETE FROM {table} WHERE run_id = ?;", (self.run_id,))
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    # --------------------------------------------------------
+    # Zustand für das Fortsetzen
+    # --------------------------------------------------------
+    def cursors(self) -> Dict[str, Tuple[int, bool]]:
+        """point_key -> (nächste Seite, fertig)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT point_key, next_page, done FROM points WHERE run_id = ?;", (self.run_id,)
+            ).fetchall()
+        return {k: (page, bool(done)) for k, page, done in rows}
+
+    def seen_ids(self) -> Dict[str, Tuple[str, str]]:
+        """doc_id -> (point_key, status) aller bereits gesehenen Ids."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT doc_id, point_key, status FROM ids WHERE run_id = ?;", (self.run_id,)
+            ).fetchall()
+        return {doc_id: (key, status) for doc_id, key, status in rows}
+
+    def iter_details(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT doc_id, detail FROM details WHERE run_id = ? ORDER BY fetched_at;", (self.run_id,)
+            ).fetchall()
+        for doc_id, detail in rows:
+            yield doc_id, json.loads(detail)
+
+    # --------------------------------------------------------
+    # Fortschritt schreiben (aus den Pipeline-Threads)
+    # --------------------------------------------------------
+    def _maybe_commit(self, force: bool = False) -> None:
+        self._pending += 1
+        if force or self._pending >= KVWL_JOURNAL_COMMIT_EVERY:
+            self._db.commit()
+            self._pending = 0
+
+    def record_id(self, point: Point, doc_id: str, status: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO ids (run_id, doc_id, point_key, status) VALUES (?, ?, ?, ?);",
+                (self.run_id, doc_id, point_key(point), status),
+            )
+            self._maybe_commit()
+
+    def record_page(self, point: Point, next_page: int, done: bool = False) -> None:
+        """Seite vollständig verarbeitet (alle Ids im Journal) -> Cursor weiter."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE points SET next_page = ?, done = ? WHERE run_id = ? AND point_key = ?;",
+                (next_page, int(done), self.run_id, point_key(point)),
+            )
+            self._maybe_commit(force=True)
+
+    def record_detail(self, doc_id: str, detail: Dict[str, Any]) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO details (run_id, doc_id, detail, fetched_at) VALUES (?, ?, ?, ?);",
+                (self.run_id, doc_id, json.dumps(detail, ensure_ascii=False), time.time()),
+            )
+            self._db.execute(
+                "UPDATE ids SET status = 'fetched' WHERE run_id = ? AND doc_id = ?;", (self.run_id, doc_id)
+            )
+            self._maybe_commit()
+
+
+def open_journal(source: str, path: Optional[str] = None) -> Optional[CrawlJournal]:
+    path = KVWL_JOURNAL_PATH if path is None else path
+    if not path:
+        return None
+    return CrawlJournal(path, source)
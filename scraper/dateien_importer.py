@@ -1,18 +1,18 @@
+import argparse
 import os
 import sys
 import time
-import psycopg
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Tuple
 
+import db
+import enrich_districts
+import metrics
+import migrations
 from sources.opendata_bevoelkerung_nationalitaet import persist_population_from_csv
 from sources.indikatorenkatalog_arbeitslosenquote import persist_unemployment_from_csv
 
 
-DB_HOST = os.getenv("DB_HOST", "db")
-DB_PORT = int(os.getenv("DB_PORT", "5432"))
-DB_NAME = os.getenv("DB_NAME", "bachelor")
-DB_USER = os.getenv("DB_USER", "bachelor")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "bachelor")
-
 DATA_DIR = os.getenv("DATA_DIR", "/app/data")
 
 POPULATION_CSV_PATH = os.getenv(
@@ -25,26 +25,8 @@ UNEMPLOYMENT_CSV_PATH = os.getenv(
     f"{DATA_DIR}/Stand_August25_Indikatorenkatalog.csv"
 )
 
-
-def wait_for_db(max_tries: int = 30, sleep_s: float = 1.0) -> None:
-    for i in range(max_tries):
-        try:
-            with psycopg.connect(
-                host=DB_HOST,
-                port=DB_PORT,
-                dbname=DB_NAME,
-                user=DB_USER,
-                password=DB_PASSWORD,
-            ) as conn:
-                with conn.cursor() as cur:
-                    cur.execute("SELECT 1;")
-            print("[file-importer] DB is ready.")
-            return
-        except Exception as e:
-            print(f"[file-importer] waiting for DB ({i+1}/{max_tries})... {e}")
-            time.sleep(sleep_s)
-
-    raise RuntimeError("DB did not become ready in time.")
+# Wie viele Jobs gleichzeitig laufen (jeder in eigenem Prozess mit eigener Connection)
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "4"))
 
 
 def import_population(conn):
@@ -81,26 +63,95 @@ def run_job(conn, job_name: str) -> None:
         raise
 
 
+# Führt einen Job in einem eigenen Prozess mit eigener Connection aus.
+# Commit/Rollback bleibt pro Job (run_job), Fehler werden nicht geworfen,
+# sondern zurückgegeben, damit die anderen Jobs weiterlaufen.
+# Die Messwerte des Jobs gehen mit zurück (metrics lebt pro Prozess).
+def run_job_isolated(job_name: str) -> Tuple[str, bool, float, str, Any]:
+    started = time.monotonic()
+    ok, error = True, ""
+    try:
+        with db.connection() as conn:
+            run_job(conn, job_name)
+    except Exception as e:
+        ok, error = False, str(e)
+        print(f"[file-importer] ❌ {job_name} fehlgeschlagen nach {time.monotonic() - started:.1f}s: {e}")
+
+    elapsed = time.monotonic() - started
+    metrics.observe("source_seconds", elapsed, source=job_name, status="ok" if ok else "error")
+    return job_name, ok, elapsed, error, metrics.REGISTRY.drain()
+
+
+def run_jobs(job_names: List[str], concurrency: int = IMPORT_CONCURRENCY) -> List[Tuple[str, bool, float, str]]:
+    concurrency = max(1, min(concurrency, len(job_names)))
+    if concurrency == 1:
+        results = [run_job_isolated(name) for name in job_names]
+    else:
+        with ProcessPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(run_job_isolated, job_names))
+
+    # Messwerte aller Worker-Prozesse im Hauptprozess zusammenführen
+    for *_, job_metrics in results:
+        metrics.REGISTRY.merge(job_metrics)
+    return [result[:4] for result in results]
+
+
+def parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Importiert OpenData-Dateien in die DB.")
+    parser.add_argument(
+        "jobs",
+        nargs="*",
+        default=["all"],
+        help=f"Jobs ({', '.join(IMPORT_JOBS)}) oder 'all' (Default)",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=IMPORT_CONCURRENCY,
+        help="maximale Anzahl paralleler Jobs (ENV: IMPORT_CONCURRENCY)",
+    )
+    return parser.parse_args(argv)
+
+
 def main():
-    wait_for_db()
-
-    target = sys.argv[1] if len(sys.argv) > 1 else "all"
-
-    with psycopg.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-    ) as conn:
-        if target == "all":
-            for job_name in IMPORT_JOBS:
-                run_job(conn, job_name)
-        else:
-            run_job(conn, target)
+    args = parse_args(sys.argv[1:])
+
+    job_names: List[str] = []
+    for target in args.jobs:
+        names = list(IMPORT_JOBS) if target == "all" else [target]
+        for name in names:
+            if name not in IMPORT_JOBS:
+                valid = ", ".join(sorted(IMPORT_JOBS.keys()))
+                raise ValueError(f"Unbekannter Import-Job '{name}'. Erlaubt: {valid}")
+            if name not in job_names:
+                job_names.append(name)
+
+    db.wait_for_db("[file-importer]")
+
+    # district_*-Tabellen anlegen, bevor die Jobs parallel hineinschreiben
+    migrations.run_migrations("[file-importer]")
+
+    # Worker-Prozesse bauen ihren eigenen Pool; den des Hauptprozesses
+    # vor dem Fork schließen (keine Pool-Threads/Sockets im Kindprozess)
+    db.close_pool()
+
+    results = run_jobs(job_names, args.concurrency)
+
+    # neue Stadtteil-Ids -> Zuordnung der Facilities vervollständigen
+    enriched = enrich_districts.run_enrichment("[file-importer]")
+
+    print("[file-importer] 📊 Zusammenfassung:")
+    for name, ok, elapsed, error in results:
+        status = "ok" if ok else f"FEHLER: {error}"
+        print(f"[file-importer]   {name:<16} {elapsed:>6.1f}s {status}")
+
+    metrics.write_report("file-importer", "[file-importer]")
+
+    if not enriched or not all(ok for _, ok, _, _ in results):
+        sys.exit(1)
 
     print("[file-importer] ✅ Alle gewünschten Dateiimporte abgeschlossen.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,254 @@
+# db.py
+import atexit
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+import psycopg
+from psycopg.rows import tuple_row
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+import metrics
+
+
+# ============================================================
+# Gemeinsame DB-Konfiguration für Scraper und Datei-Importer.
+# In Docker (docker-compose) werden diese Werte typischerweise
+# als Environment-Variablen gesetzt.
+# ============================================================
+DB_HOST = os.getenv("DB_HOST", "db")
+DB_PORT = int(os.getenv("DB_PORT", "5432"))
+DB_NAME = os.getenv("DB_NAME", "bachelor")
+DB_USER = os.getenv("DB_USER", "bachelor")
+DB_PASSWORD = os.getenv("DB_PASSWORD", "bachelor")
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+# Pool: Quellen-Threads und Post-Stufen teilen sich die Connections,
+# statt für jede Stufe (und jeden wait_for_db-Versuch) neu zu verbinden
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))         # Warten auf freie Connection
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))      # ungenutzte Connections schließen
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+
+# Startup: exponentielles Backoff statt fester 1s-Schritte
+DB_WAIT_MAX_TRIES = int(os.getenv("DB_WAIT_MAX_TRIES", "12"))
+DB_WAIT_BACKOFF_BASE = float(os.getenv("DB_WAIT_BACKOFF_BASE", "0.5"))
+DB_WAIT_BACKOFF_MAX = float(os.getenv("DB_WAIT_BACKOFF_MAX", "10"))
+
+
+# ============================================================
+# Cursor mit Zeitmessung: jedes execute/executemany/COPY landet als
+# db_statement_seconds{statement=INSERT|UPDATE|WITH|COPY|...} in metrics.
+# ============================================================
+def _statement_label(query: Any) -> str:
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    if isinstance(query, str):
+        words = query.split(None, 1)
+        return words[0].upper() if words else "EMPTY"
+    return "SQL"  # psycopg.sql.Composed o.ä.
+
+
+class TimedCursor(psycopg.Cursor):
+    def execute(self, query, *args: Any, **kwargs: Any):
+        with metrics.timer("db_statement_seconds", statement=_statement_label(query)):
+            return super().execute(query, *args, **kwargs)
+
+    def executemany(self, query, *args: Any, **kwargs: Any):
+        with metrics.timer("db_statement_seconds", statement=_statement_label(query)):
+            return super().executemany(query, *args, **kwargs)
+
+    # Achtung: COPY enthält auch die Zeit, in der die Zeilen erzeugt werden
+    # (Generator/CSV-Parsen). Reine Parse-Zeit siehe metrics.timed_iter.
+    @contextmanager
+    def copy(self, statement, *args: Any, **kwargs: Any):
+        with metrics.timer("db_statement_seconds", statement="COPY"):
+            with super().copy(statement, *args, **kwargs) as copy:
+                yield copy
+
+
+class TimedAsyncCursor(psycopg.AsyncCursor):
+    async def execute(self, query, *args: Any, **kwargs: Any):
+        with metrics.timer("db_statement_seconds", statement=_statement_label(query)):
+            return await super().execute(query, *args, **kwargs)
+
+    async def executemany(self, query, *args: Any, **kwargs: Any):
+        with metrics.timer("db_statement_seconds", statement=_statement_label(query)):
+            return await super().executemany(query, *args, **kwargs)
+
+
+def _connect_kwargs(**kwargs: Any) -> Dict[str, Any]:
+    kwargs.setdefault("cursor_factory", TimedCursor)
+    kwargs.setdefault("connect_timeout", DB_CONNECT_TIMEOUT)
+    return dict(
+        host=DB_HOST,
+        port=DB_PORT,
+        dbname=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        **kwargs,
+    )
+
+
+def connect(**kwargs) -> psycopg.Connection:
+    """
+    Neue, eigene Connection mit den ENV-Zugangsdaten (kwargs z.B. row_factory).
+    Für normale Arbeit connection() nehmen; connect() nur, wenn die
+    Session-Eigenschaften der Connection wichtig sind (z.B. Advisory Locks).
+    """
+    return psycopg.connect(**_connect_kwargs(**kwargs))
+
+
+# ============================================================
+# Gemeinsamer Connection-Pool (psycopg_pool)
+# - ein Pool pro Prozess (der Datei-Importer forkt Worker-Prozesse,
+#   geerbte Pool-Sockets/Threads dürfen dort nicht benutzt werden)
+# - check: jede Connection wird vor der Ausgabe kurz geprüft, tote
+#   Connections (DB-Neustart, Idle-Timeout) ersetzt der Pool selbst
+# - reset: row_factory zurück auf tuple_row, damit ein dict_row einer
+#   Quelle nicht bei der nächsten Stufe landet
+# connection() verhält sich wie "with connect() as conn": ohne Fehler
+# commit, bei Exception rollback.
+# ============================================================
+_pool: Optional[ConnectionPool] = None
+_pool_pid = 0
+_pool_lock = threading.Lock()
+
+
+def _reset_connection(conn: psycopg.Connection) -> None:
+    conn.row_factory = tuple_row
+
+
+def get_pool() -> ConnectionPool:
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(
+                kwargs=_connect_kwargs(),
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=max(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+                timeout=DB_POOL_TIMEOUT,
+                max_idle=DB_POOL_MAX_IDLE,
+                max_lifetime=DB_POOL_MAX_LIFETIME,
+                check=ConnectionPool.check_connection,
+                reset=_reset_connection,
+                name=f"db-{os.getpid()}",
+                open=False,
+            )
+            _pool.open(wait=False)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+atexit.register(close_pool)
+
+
+@contextmanager
+def connection(row_factory=None, timeout: Optional[float] = None) -> Iterator[psycopg.Connection]:
+    """Connection aus dem Pool leihen (row_factory z.B. dict_row)."""
+    with get_pool().connection(timeout=timeout) as conn:
+        if row_factory is not None:
+            conn.row_factory = row_factory
+        yield conn
+
+
+# ============================================================
+# Async-Variante (AsyncConnectionPool) für Aufrufer mit asyncio,
+# z.B. HTTP-Abrufe und DB-Writes in einer Event-Loop überlappen.
+# Der Pool gehört zu der Loop, in der er geöffnet wurde.
+# ============================================================
+_async_pool: Optional[AsyncConnectionPool] = None
+
+
+async def _reset_async_connection(conn: psycopg.AsyncConnection) -> None:
+    conn.row_factory = tuple_row
+
+
+async def get_async_pool() -> AsyncConnectionPool:
+    global _async_pool
+    if _async_pool is None:
+        _async_pool = AsyncConnectionPool(
+            kwargs=_connect_kwargs(cursor_factory=TimedAsyncCursor),
+            min_size=DB_POOL_MIN_SIZE,
+            max_size=max(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+            timeout=DB_POOL_TIMEOUT,
+            max_idle=DB_POOL_MAX_IDLE,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
+            check=AsyncConnectionPool.check_connection,
+            reset=_reset_async_connection,
+            name=f"db-async-{os.getpid()}",
+            open=False,
+        )
+        await _async_pool.open(wait=False)
+    return _async_pool
+
+
+async def close_async_pool() -> None:
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+    _async_pool = None
+
+
+@asynccontextmanager
+async def async_connection(row_factory=None, timeout: Optional[float] = None) -> AsyncIterator[psycopg.AsyncConnection]:
+    pool = await get_async_pool()
+    async with pool.connection(timeout=timeout) as conn:
+        if row_factory is not None:
+            conn.row_factory = row_factory
+        yield conn
+
+
+# ============================================================
+# DB-Startup-Helper: warten bis Postgres erreichbar ist
+# In Docker starten Container parallel. Postgres braucht meist
+# ein paar Sekunden, bis er "ready" ist. Damit der Scraper nicht
+# mit Connection-Errors abbricht, warten wir aktiv mit Retries.
+# Geprüft wird über den Pool (die erste Connection bleibt danach
+# offen), die Pausen wachsen exponentiell bis DB_WAIT_BACKOFF_MAX.
+# ============================================================
+def backoff_delay(attempt: int) -> float:
+    return min(DB_WAIT_BACKOFF_MAX, DB_WAIT_BACKOFF_BASE * (2 ** attempt))
+
+
+def _retry_delay(tag: str, attempt: int, max_tries: int, error: Exception) -> float:
+    """Gemeinsam für wait_for_db/wait_for_db_async: Pause berechnen und loggen."""
+    delay = backoff_delay(attempt)
+    print(f"{tag} waiting for DB ({attempt+1}/{max_tries}, next try in {delay:.1f}s)... {error}")
+    return delay
+
+
+def wait_for_db(tag: str = "[scraper]", max_tries: int = DB_WAIT_MAX_TRIES) -> None:
+    """Blockiert bis Postgres erreichbar ist oder wir nach max_tries abbrechen."""
+    for i in range(max_tries):
+        try:
+            with connection(timeout=DB_CONNECT_TIMEOUT) as conn:
+                conn.execute("SELECT 1;")
+            print(f"{tag} DB is ready.")
+            return
+        except Exception as e:
+            metrics.sleep(_retry_delay(tag, i, max_tries, e), reason="wait_for_db")
+    raise RuntimeError("DB did not become ready in time.")
+
+
+async def wait_for_db_async(tag: str = "[scraper]", max_tries: int = DB_WAIT_MAX_TRIES) -> None:
+    """Wie wait_for_db, über den AsyncConnectionPool."""
+    for i in range(max_tries):
+        try:
+            async with async_connection(timeout=DB_CONNECT_TIMEOUT) as conn:
+                await conn.execute("SELECT 1;")
+            print(f"{tag} DB is ready.")
+            return
+        except Exception as e:
+            await metrics.sleep_async(_retry_delay(tag, i, max_tries, e), reason="wait_for_db")
+    raise RuntimeError("DB did not become ready in time.")
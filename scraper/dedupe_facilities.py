@@ -0,0 +1,529 @@
+# dedupe_facilities.py
+import argparse
+import os
+import re
+import sys
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import db
+import geo
+import metrics
+import migrations
+from bulk_writer import copy_rows
+from psycopg.rows import tuple_row
+
+
+# ============================================================
+# Quellenübergreifende Dubletten (Entity Resolution)
+# Dieselbe Praxis/Apotheke kommt ggf. aus KVWL, aponet und der
+# Gesundheitskarte mit leicht anderem Namen oder anderer Schreibweise der
+# Straße. Jede Quelle baut ihren eigenen source_key (SHA1), in facilities
+# werden diese Zeilen also nie zusammengeführt.
+#
+# Diese Stufe läuft nach jedem Scrape und schreibt facility_clusters:
+# 1) Normalisieren: Kleinschreibung, Umlaute, "Straße"/"Str." -> "str",
+#    Hausnummer getrennt, Füllwörter im Namen ("Dr.", "med.", "Praxis")
+# 2) Blocking: nur Paare im selben/benachbarten Geohash (DEDUPE_GEOHASH_PRECISION)
+#    oder mit gleicher PLZ + Straßenanfang + Hausnummer -> nahezu linear statt n²
+# 3) Score: Trigramm-Ähnlichkeit (Dice) für Name und Straße + Distanz,
+#    nur Paare aus verschiedenen Quellen mit verträglichem Typ,
+#    abweichende Hausnummern schließen einen Treffer aus
+# 4) Paare über DEDUPE_THRESHOLD (bester Score zuerst) -> Union-Find ->
+#    Cluster mit höchstens einer Facility je Quelle; kanonisch ist die
+#    Facility der Quelle mit der höchsten Priorität
+#
+# Jede Facility bekommt eine Zeile (Einzelgänger sind ihr eigener Cluster),
+# Auswertungen ohne Doppelzählung laufen über die View canonical_facilities.
+# ============================================================
+DEDUPE_THRESHOLD = float(os.getenv("DEDUPE_THRESHOLD", "0.75"))
+DEDUPE_MAX_DIST_M = float(os.getenv("DEDUPE_MAX_DIST_M", "150"))
+DEDUPE_GEOHASH_PRECISION = int(os.getenv("DEDUPE_GEOHASH_PRECISION", "7"))
+DEDUPE_SOURCE_PRIORITY = [
+    s.strip()
+    for s in os.getenv("DEDUPE_SOURCE_PRIORITY", "kvwl,aponet_apotheken,gelsenkirchen_gesundheitskarte").split(",")
+    if s.strip()
+]
+
+WEIGHT_NAME = 0.5
+WEIGHT_STREET = 0.3
+WEIGHT_GEO = 0.2
+
+# Typen, die dieselbe Einrichtung beschreiben können
+TYPE_GROUPS = [
+    {"PFLEGE", "AMBULANTER_PFLEGEDIENST", "STATIONAERE_PFLEGE", "KURZZEITPFLEGE", "KURZZEITPFLEGEHEIM"},
+]
+
+NAME_STOPWORDS = {
+    "dr", "med", "dent", "prof", "dipl", "praxis", "arztpraxis", "zahnarztpraxis", "gemeinschaftspraxis", "praxisgemeinschaft",
+    "gmbh", "ohg", "kg", "ek", "inh", "inhaber", "und", "fuer", "in", "der", "die", "das", "am", "an",
+}
+
+CREATE_STAGE_SQL = """
+DROP TABLE IF EXISTS pg_temp.facility_clusters_stage;
+CREATE TEMP TABLE facility_clusters_stage (
+  facility_id BIGINT NOT NULL,
+  canonical_id BIGINT NOT NULL,
+  cluster_size INT NOT NULL,
+  match_score DOUBLE PRECISION
+) ON COMMIT DROP;
+"""
+
+STAGE_COLUMNS = ("facility_id", "canonical_id", "cluster_size", "match_score")
+
+SELECT_FACILITIES_SQL = """
+SELECT id, source, type, facility_name, street, postal_code, city, latitude, longitude
+FROM facilities;
+"""
+
+# Komplettabgleich in einem Statement: nur geänderte Zuordnungen anfassen
+MERGE_SQL = """
+WITH removed AS (
+  DELETE FROM facility_clusters c
+  WHERE NOT EXISTS (SELECT 1 FROM facility_clusters_stage s WHERE s.facility_id = c.facility_id)
+  RETURNING 1
+),
+upserted AS (
+  INSERT INTO facility_clusters (facility_id, canonical_id, cluster_size, match_score, assigned_at)
+  SELECT s.facility_id, s.canonical_id, s.cluster_size, s.match_score, NOW()
+  FROM facility_clusters_stage s
+  JOIN facilities f ON f.id = s.facility_id
+  ON CONFLICT (facility_id)
+  DO UPDATE SET
+    canonical_id = EXCLUDED.canonical_id,
+    cluster_size = EXCLUDED.cluster_size,
+    match_score = EXCLUDED.match_score,
+    assigned_at = NOW()
+  WHERE facility_clusters.canonical_id IS DISTINCT FROM EXCLUDED.canonical_id
+     OR facility_clusters.cluster_size IS DISTINCT FROM EXCLUDED.cluster_size
+  RETURNING 1
+)
+SELECT (SELECT COUNT(*) FROM removed), (SELECT COUNT(*) FROM upserted);
+"""
+
+
+# ============================================================
+# 1) Normalisieren
+# ============================================================
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss", "é": "e", "è": "e"})
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_STREET_SUFFIX = re.compile(r"(strasse|str)\b")
+_HOUSE_NUMBER = re.compile(r"\b(\d+)\s*([a-z])?\b(?:\s*(?:-|bis)?\s*\d+\s*[a-z]?)?\s*$")
+
+
+def normalize_text(value: Optional[str]) -> str:
+    v = (value or "").lower().translate(_UMLAUTS)
+    return " ".join(_NON_ALNUM.sub(" ", v).split())
+
+
+def normalize_name(name: Optional[str]) -> str:
+    return " ".join(t for t in normalize_text(name).split() if t not in NAME_STOPWORDS)
+
+
+def normalize_street(street: Optional[str]) -> Tuple[str, str]:
+    """'Bahnhofstraße 12a' / 'Bahnhofstr. 12 A' -> ('bahnhofstr', '12a')."""
+    s = normalize_text(street)
+    number = ""
+    m = _HOUSE_NUMBER.search(s)
+    if m:
+        number = m.group(1) + (m.group(2) or "")
+        s = s[:m.start()].strip()
+    s = _STREET_SUFFIX.sub("str", s)
+    return s.replace(" ", ""), number
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    if not text:
+        return frozenset()
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def dice(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def prepare(row: Tuple[Any, ...]) -> Dict[str, Any]:
+    """Facility-Zeile -> Datensatz mit vorberechneten Trigrammen (einmal pro Facility)."""
+    fid, source, ftype, name, street, postal, city, lat, lon = row
+    street_name, number = normalize_street(street)
+    return {
+        "id": fid,
+        "source": source,
+        "type": ftype or "SONSTIGES",
+        "postal": (postal or "").strip(),
+        "street": street_name,
+        "number": number,
+        "lat": float(lat) if lat is not None else None,
+        "lon": float(lon) if lon is not None else None,
+        "name_grams": trigrams(normalize_name(name)),
+        "street_grams": trigrams(street_name),
+    }
+
+
+# ============================================================
+# 2) Blocking
+# ============================================================
+def candidate_pairs(records: List[Dict[str, Any]], precision: int = DEDUPE_GEOHASH_PRECISION) -> Set[Tuple[int, int]]:
+    """Index-Paare (i < j) aus verschiedenen Quellen, die sich einen Block teilen."""
+    blocks: Dict[Tuple[str, str], List[int]] = {}
+    for i, r in enumerate(records):
+        if r["lat"] is not None and r["lon"] is not None:
+            blocks.setdefault(("gh", geo.geohash_encode(r["lat"], r["lon"], precision)), []).append(i)
+        if r["postal"] and r["street"]:
+            # Hausnummer im Schlüssel: lange Straßen bilden sonst riesige Blöcke
+            blocks.setdefault(("plz", f"{r['postal']}|{r['street'][:6]}|{r['number']}"), []).append(i)
+
+    pairs: Set[Tuple[int, int]] = set()
+
+    def add(members: List[int], others: List[int]) -> None:
+        for i in members:
+            for j in others:
+                if i < j and records[i]["source"] != records[j]["source"]:
+                    pairs.add((i, j))
+
+    for (kind, key), members in blocks.items():
+        if kind == "plz":
+            add(members, members)
+            continue
+        # Geohash: eigene Zelle + Nachbarn, damit Paare über Zellgrenzen nicht fehlen
+        r = records[members[0]]
+        for neighbor in geo.geohash_neighbors(r["lat"], r["lon"], precision):
+            add(members, blocks.get(("gh", neighbor), []))
+    return pairs
+
+
+# ============================================================
+# 3) Score
+# ============================================================
+def types_compatible(a: str, b: str) -> bool:
+    if a == b or "SONSTIGES" in (a, b):
+        return True
+    return any(a in group and b in group for group in TYPE_GROUPS)
+
+
+def score_pair(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """0..1; 0 bei unverträglichem Typ oder abweichender Hausnummer."""
+    if not types_compatible(a["type"], b["type"]):
+        return 0.0
+    if a["number"] and b["number"] and a["number"] != b["number"]:
+        return 0.0
+
+    name = dice(a["name_grams"], b["name_grams"])
+    street = dice(a["street_grams"], b["street_grams"])
+
+    if a["lat"] is not None and b["lat"] is not None:
+        dist_m = geo.haversine_km(a["lat"], a["lon"], b["lat"], b["lon"]) * 1000
+        near = max(0.0, 1.0 - dist_m / DEDUPE_MAX_DIST_M)
+    else:
+        # ohne Koordinaten zählt gleiche PLZ als halbe Nähe
+        near = 0.5 if a["postal"] and a["postal"] == b["postal"] else 0.0
+
+    return WEIGHT_NAME * name + WEIGHT_STREET * street + WEIGHT_GEO * near
+
+
+# ============================================================
+# 4) Cluster
+# ============================================================
+class UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, i: int) -> int:
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, i: int, j: int) -> None:
+        ri, rj = self.find(i), self.find(j)
+        if ri != rj:
+            self.parent[max(ri, rj)] = min(ri, rj)
+
+
+def _priority(record: Dict[str, Any]) -> Tuple[int, int]:
+    source = record["source"]
+    rank = DEDUPE_SOURCE_PRIORITY.index(source) if source in DEDUPE_SOURCE_PRIORITY else len(DEDUPE_SOURCE_PRIORITY)
+    return rank, record["id"]
+
+
+def cluster_facilities(
+    rows: Iterable[Tuple[Any, ...]],
+    threshold: float = DEDUPE_THRESHOLD,
+) -> Tuple[List[Tuple[int, int, int, Optional[float]]], Dict[str, int]]:
+    """
+    Rückgabe: Zeilen (facility_id, canonical_id, cluster_size, bester Score)
+    für alle Facilities + Kennzahlen (Paare, Treffer, Cluster).
+    """
+    records = [prepare(r) for r in rows]
+    pairs = candidate_pairs(records)
+
+    scored = [(score_pair(records[i], records[j]), i, j) for i, j in pairs]
+    scored = sorted((t for t in scored if t[0] >= threshold), key=lambda t: (-t[0], t[1], t[2]))
+
+    # Union-Find verbindet transitiv: zwei KVWL-Praxen, die beide zur selben
+    # GE-Zeile passen, landen sonst im selben Cluster. Deshalb pro Wurzel die
+    # Quellen merken und nur Cluster ohne gemeinsame Quelle vereinen; beste
+    # Scores zuerst, damit der bessere Partner gewinnt.
+    uf = UnionFind(len(records))
+    sources: Dict[int, Set[str]] = {i: {r["source"]} for i, r in enumerate(records)}
+    best: Dict[int, float] = {}
+    matches = 0
+    for score, i, j in scored:
+        ri, rj = uf.find(i), uf.find(j)
+        if ri != rj:
+            if sources[ri] & sources[rj]:
+                continue
+            merged = sources.pop(ri) | sources.pop(rj)
+            uf.union(ri, rj)
+            sources[uf.find(ri)] = merged
+        matches += 1
+        best[i] = max(best.get(i, 0.0), score)
+        best[j] = max(best.get(j, 0.0), score)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(records)):
+        clusters.setdefault(uf.find(i), []).append(i)
+
+    out: List[Tuple[int, int, int, Optional[float]]] = []
+    for members in clusters.values():
+        canonical = min((records[i] for i in members), key=_priority)["id"]
+        for i in members:
+            score = best.get(i)
+            out.append((records[i]["id"], canonical, len(members), round(score, 4) if score is not None else None))
+
+    n = len(records)
+    stats = {
+        "facilities": n,
+        "pairs": len(pairs),
+        "pairs_naive": n * (n - 1) // 2,
+        "matches": matches,
+        "clusters": len(clusters),
+        "merged": sum(1 for m in clusters.values() if len(m) > 1),
+    }
+    return out, stats
+
+
+# ============================================================
+# Selbsttest (ohne DB): python dedupe_facilities.py --self-check
+# Schreibweisen wie sie aus den drei Quellen kommen (KVWL Location.Street,
+# aponet "strasse", Gesundheitskarte Adresszeile vor der PLZ). Nach
+# Änderungen an Regex, Stoppwörtern, TYPE_GROUPS oder DEDUPE_THRESHOLD
+# laufen lassen.
+# ============================================================
+SELF_CHECK_STREETS = [
+    ("Bahnhofstraße 12a", ("bahnhofstr", "12a")),
+    ("Bahnhofstr. 12 A", ("bahnhofstr", "12a")),
+    ("Bahnhofstr.12a", ("bahnhofstr", "12a")),
+    ("Hauptstr. 3-5", ("hauptstr", "3")),
+    ("Hauptstraße 3 - 5", ("hauptstr", "3")),
+    ("Ückendorfer Straße 88", ("ueckendorferstr", "88")),
+    ("Ückendorfer Str. 88", ("ueckendorferstr", "88")),
+    ("Am Markt", ("ammarkt", "")),
+    ("", ("", "")),
+]
+
+SELF_CHECK_NAMES = [
+    ("Dr. med. Hans Müller", "hans mueller"),
+    ("Praxis Dr. med. Müller", "mueller"),
+    ("Gemeinschaftspraxis Dr. Schmidt und Dr. Weiß", "schmidt weiss"),
+    ("Bahnhof-Apotheke", "bahnhof apotheke"),
+    ("Stern-Apotheke Inh. Petra Kühn e.K.", "stern apotheke petra kuehn e k"),
+]
+
+SELF_CHECK_TYPES = [
+    ("PFLEGE", "AMBULANTER_PFLEGEDIENST", True),
+    ("KURZZEITPFLEGE", "KURZZEITPFLEGEHEIM", True),
+    ("APOTHEKE", "SONSTIGES", True),
+    ("APOTHEKE", "ARZTPRAXIS", False),
+    ("ARZTPRAXIS", "AMBULANTER_PFLEGEDIENST", False),
+]
+
+# (Zeile a, Zeile b, gleiche Einrichtung?) im Format von SELECT_FACILITIES_SQL
+SELF_CHECK_PAIRS = [
+    (
+        (1, "kvwl", "ARZTPRAXIS", "Praxis Dr. med. Müller", "Bahnhofstraße 12a", "45879", "Gelsenkirchen", 51.5049, 7.1022),
+        (2, "gelsenkirchen_gesundheitskarte", "ARZTPRAXIS", "Dr. Müller", "Bahnhofstr. 12 A", "45879", "Gelsenkirchen", 51.5050, 7.1023),
+        True,
+    ),
+    (
+        (3, "aponet_apotheken", "APOTHEKE", "Bahnhof-Apotheke", "Bahnhofstr. 2", "45879", "Gelsenkirchen", 51.5047, 7.1031),
+        (4, "gelsenkirchen_gesundheitskarte", "APOTHEKE", "Bahnhof Apotheke", "Bahnhofstraße 2", "45879", "Gelsenkirchen", 51.5048, 7.1030),
+        True,
+    ),
+    # ohne Koordinaten: nur über den PLZ-Block
+    (
+        (5, "kvwl", "ARZTPRAXIS", "Dr. med. dent. Anna Schulz", "Ückendorfer Straße 88", "45886", "Gelsenkirchen", None, None),
+        (6, "gelsenkirchen_gesundheitskarte", "ARZTPRAXIS", "Zahnarztpraxis Anna Schulz", "Ückendorfer Str. 88", "45886", "Gelsenkirchen", None, None),
+        True,
+    ),
+    (
+        (7, "gelsenkirchen_gesundheitskarte", "PFLEGE", "Pflegedienst Sonnenschein GmbH", "Hauptstr. 3-5", "45894", "Gelsenkirchen", 51.5712, 7.0641),
+        (8, "kvwl", "AMBULANTER_PFLEGEDIENST", "Pflegedienst Sonnenschein", "Hauptstraße 3", "45894", "Gelsenkirchen", 51.5712, 7.0642),
+        True,
+    ),
+    # abweichende Hausnummer -> andere Einrichtung
+    (
+        (9, "aponet_apotheken", "APOTHEKE", "Stern-Apotheke", "Bahnhofstr. 20", "45879", "Gelsenkirchen", 51.5047, 7.1031),
+        (10, "gelsenkirchen_gesundheitskarte", "APOTHEKE", "Stern Apotheke", "Bahnhofstraße 22", "45879", "Gelsenkirchen", 51.5047, 7.1032),
+        False,
+    ),
+    # gleiche Quelle -> nie zusammenführen (eigener source_key je Zeile)
+    (
+        (11, "kvwl", "ARZTPRAXIS", "Dr. med. Müller", "Bahnhofstraße 12a", "45879", "Gelsenkirchen", 51.5049, 7.1022),
+        (12, "kvwl", "ARZTPRAXIS", "Dr. Müller", "Bahnhofstr. 12a", "45879", "Gelsenkirchen", 51.5049, 7.1022),
+        False,
+    ),
+    # unverträglicher Typ an derselben Adresse
+    (
+        (13, "aponet_apotheken", "APOTHEKE", "Apotheke am Markt", "Am Markt 1", "45879", "Gelsenkirchen", 51.5060, 7.0990),
+        (14, "kvwl", "ARZTPRAXIS", "Praxis am Markt", "Am Markt 1", "45879", "Gelsenkirchen", 51.5060, 7.0990),
+        False,
+    ),
+]
+
+
+# (Zeilen, erwartete Cluster als Mengen von Ids): transitive Treffer
+SELF_CHECK_CLUSTERS = [
+    # zwei KVWL-Praxen passen beide zur GE-Zeile -> nur die bessere wird
+    # zusammengeführt, keine KVWL-Praxis verschwindet
+    (
+        [
+            (1, "kvwl", "ARZTPRAXIS", "Dr. med. Anna Schmidt", "Bahnhofstr. 12", "45879", "Gelsenkirchen", 51.5049, 7.1022),
+            (2, "kvwl", "ARZTPRAXIS", "Dr. med. Anna Schmitt", "Bahnhofstr. 12", "45879", "Gelsenkirchen", 51.5049, 7.1022),
+            (3, "gelsenkirchen_gesundheitskarte", "ARZTPRAXIS", "Dr. Anna Schmidt", "Bahnhofstraße 12", "45879", "Gelsenkirchen", 51.5049, 7.1022),
+        ],
+        [{1, 3}, {2}],
+    ),
+    # je eine Zeile aus allen drei Quellen -> ein Cluster
+    (
+        [
+            (4, "kvwl", "APOTHEKE", "Bahnhof-Apotheke", "Bahnhofstr. 2", "45879", "Gelsenkirchen", 51.5047, 7.1031),
+            (5, "aponet_apotheken", "APOTHEKE", "Bahnhof-Apotheke", "Bahnhofstr. 2", "45879", "Gelsenkirchen", 51.5047, 7.1031),
+            (6, "gelsenkirchen_gesundheitskarte", "APOTHEKE", "Bahnhof Apotheke", "Bahnhofstraße 2", "45879", "Gelsenkirchen", 51.5048, 7.1030),
+        ],
+        [{4, 5, 6}],
+    ),
+]
+
+
+def self_check(threshold: float = DEDUPE_THRESHOLD) -> bool:
+    failures: List[str] = []
+
+    for street, expected in SELF_CHECK_STREETS:
+        got = normalize_street(street)
+        if got != expected:
+            failures.append(f"normalize_street({street!r}) = {got}, erwartet {expected}")
+
+    for name, expected in SELF_CHECK_NAMES:
+        got = normalize_name(name)
+        if got != expected:
+            failures.append(f"normalize_name({name!r}) = {got!r}, erwartet {expected!r}")
+
+    for a, b, expected in SELF_CHECK_TYPES:
+        if types_compatible(a, b) != expected:
+            failures.append(f"types_compatible({a}, {b}) != {expected}")
+
+    for row_a, row_b, expected in SELF_CHECK_PAIRS:
+        assignments, _ = cluster_facilities([row_a, row_b], threshold)
+        merged = assignments[0][1] == assignments[1][1]
+        if merged != expected:
+            score = score_pair(prepare(row_a), prepare(row_b))
+            failures.append(
+                f"{row_a[3]!r} ({row_a[1]}) / {row_b[3]!r} ({row_b[1]}): "
+                f"zusammengeführt={merged}, erwartet {expected} (Score {score:.3f})"
+            )
+
+    for rows, expected in SELF_CHECK_CLUSTERS:
+        assignments, _ = cluster_facilities(rows, threshold)
+        groups: Dict[int, Set[int]] = {}
+        for facility_id, canonical_id, _, _ in assignments:
+            groups.setdefault(canonical_id, set()).add(facility_id)
+        got = sorted(sorted(g) for g in groups.values())
+        if got != sorted(sorted(g) for g in expected):
+            failures.append(f"Cluster {got}, erwartet {sorted(sorted(g) for g in expected)}")
+
+    total = (
+        len(SELF_CHECK_STREETS) + len(SELF_CHECK_NAMES) + len(SELF_CHECK_TYPES)
+        + len(SELF_CHECK_PAIRS) + len(SELF_CHECK_CLUSTERS)
+    )
+    for failure in failures:
+        print(f"[dedupe] ❌ {failure}")
+    print(f"[dedupe] Selbsttest: {total - len(failures)}/{total} ok (Schwelle {threshold})")
+    return not failures
+
+
+# ============================================================
+# Lauf
+# ============================================================
+def dedupe_facilities(conn, threshold: float = DEDUPE_THRESHOLD) -> Dict[str, int]:
+    """Berechnet alle Cluster neu und gleicht facility_clusters ab. Kein commit."""
+    with conn.cursor(row_factory=tuple_row) as cur:
+        cur.execute("SELECT to_regclass('facilities') IS NOT NULL;")
+        if not cur.fetchone()[0]:
+            print("[dedupe] Tabelle facilities existiert (noch) nicht, übersprungen.")
+            return {}
+
+        cur.execute(SELECT_FACILITIES_SQL)
+        rows = cur.fetchall()
+        with metrics.timer("stage_seconds", source="dedupe_facilities", stage="cluster"):
+            assignments, stats = cluster_facilities(rows, threshold)
+
+        cur.execute(CREATE_STAGE_SQL)
+        copy_rows(cur, "facility_clusters_stage", STAGE_COLUMNS, assignments)
+        cur.execute(MERGE_SQL)
+        removed, upserted = cur.fetchone()
+
+    metrics.inc("rows_written", upserted, table="facility_clusters", source="dedupe_facilities")
+    metrics.inc("rows_deleted", removed, table="facility_clusters", source="dedupe_facilities")
+    metrics.inc("dedupe_pairs", stats["pairs"])
+    metrics.inc("dedupe_matches", stats["matches"])
+    return stats
+
+
+def run_dedupe(tag: str) -> bool:
+    """Eigene Connection + Transaktion, Rückgabe ok/Fehler (wie run_enrichment)."""
+    started = time.monotonic()
+    try:
+        # Tabelle/View legt migrations.py an (requires facilities)
+        migrations.ensure_current(tag, strict=False)
+        with db.connection() as conn:
+            try:
+                stats = dedupe_facilities(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    except Exception as e:
+        print(f"{tag} ❌ Dubletten-Abgleich fehlgeschlagen: {e}")
+        return False
+
+    if stats:
+        print(
+            f"{tag} 🔗 Dubletten: {stats['merged']} Cluster mit mehreren Quellen, "
+            f"{stats['facilities']} Facilities -> {stats['clusters']} Einrichtungen "
+            f"({stats['pairs']} Kandidaten-Paare statt {stats['pairs_naive']}, "
+            f"{time.monotonic() - started:.1f}s)"
+        )
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Findet dieselbe Einrichtung über Quellen hinweg (facility_clusters).")
+    parser.add_argument("--self-check", action="store_true", help="Normalisierung/Matching ohne DB prüfen")
+    args = parser.parse_args()
+
+    if args.self_check:
+        sys.exit(0 if self_check() else 1)
+
+    db.wait_for_db("[dedupe]")
+    if not run_dedupe("[dedupe]"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# enrich_districts.py
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+import db
+import geo
+import metrics
+import migrations
+from bulk_writer import copy_rows
+from psycopg.rows import tuple_row
+
+
+# ============================================================
+# Anreicherung: Facility -> Stadtteil
+# Backend/Frontend verknüpfen facilities mit district_population /
+# district_unemployment über den Stadtteil. Bisher gab es keine
+# gespeicherte Zuordnung lat/lon -> Stadtteil.
+#
+# Diese Stufe läuft nach den Scrapern (main.py) und nach den
+# Datei-Importen (dateien_importer.py) und schreibt facility_district:
+# - Punkt-in-Polygon über geo.GridIndex (Raster-Index der 18 Stadtteile,
+#   exakter Test nur in Zellen, durch die eine Grenze läuft)
+# - nur neue Facilities oder solche mit geänderten Koordinaten
+#   (--full rechnet alles neu)
+# - COPY in eine Staging-Tabelle + ein INSERT ... ON CONFLICT
+# - stadtteil_id kommt per Name aus district_population/-unemployment
+#
+# Danach sind Stadtteil-Auswertungen normale Joins, z.B. die View
+# district_facility_density (Facilities pro 1.000 Einwohner).
+# ============================================================
+ENRICH_BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", "5000"))
+
+CREATE_STAGE_SQL = """
+DROP TABLE IF EXISTS pg_temp.facility_district_stage;
+CREATE TEMP TABLE facility_district_stage (
+  facility_id BIGINT NOT NULL,
+  stadtteil_name TEXT,
+  latitude DOUBLE PRECISION,
+  longitude DOUBLE PRECISION
+) ON COMMIT DROP;
+"""
+
+STAGE_COLUMNS = ("facility_id", "stadtteil_name", "latitude", "longitude")
+
+# neu, Koordinaten geändert (IS DISTINCT FROM behandelt NULL korrekt)
+# oder Stadtteil bekannt, aber noch ohne Id (district_* gab es damals nicht)
+SELECT_PENDING_SQL = """
+SELECT f.id, f.latitude, f.longitude
+FROM facilities f
+LEFT JOIN facility_district fd ON fd.facility_id = f.id
+WHERE fd.facility_id IS NULL
+   OR fd.latitude IS DISTINCT FROM f.latitude
+   OR fd.longitude IS DISTINCT FROM f.longitude
+   OR (fd.stadtteil_id IS NULL AND fd.stadtteil_name IS NOT NULL);
+"""
+
+SELECT_ALL_SQL = "SELECT id, latitude, longitude FROM facilities;"
+
+# {district_sources}: SELECT auf die vorhandenen district_*-Tabellen (siehe _district_sources)
+MERGE_SQL = """
+WITH district_ids AS (
+  SELECT DISTINCT ON (stadtteil_name) stadtteil_name, stadtteil_id
+  FROM ({district_sources}) d
+  ORDER BY stadtteil_name, stichtag DESC
+)
+INSERT INTO facility_district (facility_id, stadtteil_id, stadtteil_name, latitude, longitude, assigned_at)
+SELECT s.facility_id, d.stadtteil_id, s.stadtteil_name, s.latitude, s.longitude, NOW()
+FROM facility_district_stage s
+LEFT JOIN district_ids d ON d.stadtteil_name = s.stadtteil_name
+ON CONFLICT (facility_id)
+DO UPDATE SET
+  stadtteil_id = EXCLUDED.stadtteil_id,
+  stadtteil_name = EXCLUDED.stadtteil_name,
+  latitude = EXCLUDED.latitude,
+  longitude = EXCLUDED.longitude,
+  assigned_at = NOW();
+"""
+
+DISTRICT_TABLES = ("district_population", "district_unemployment")
+
+
+def _table_exists(cur, name: str) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (name,))
+    return bool(cur.fetchone()[0])
+
+
+# district_* legen die Importer an. Läuft der Scraper vor dem ersten
+# Import, fehlen sie noch -> stadtteil_id bleibt NULL, der Name steht
+# trotzdem drin und der Lauf nach dem Import holt die Ids nach.
+def _district_sources(cur) -> str:
+    selects = [
+        f"SELECT stadtteil_name, stadtteil_id, stichtag FROM {table}"
+        for table in DISTRICT_TABLES
+        if _table_exists(cur, table)
+    ]
+    if not selects:
+        return "SELECT NULL::text AS stadtteil_name, NULL::int AS stadtteil_id, NULL::date AS stichtag WHERE false"
+    return " UNION ALL ".join(selects)
+
+
+def assign_districts(
+    index: geo.GridIndex,
+    rows: List[Tuple[int, Optional[float], Optional[float]]],
+) -> List[Tuple[int, Optional[str], Optional[float], Optional[float]]]:
+    """(id, lat, lon) -> (id, stadtteil_name|None, lat, lon); ohne Koordinaten -> None."""
+    located = [(fid, float(lat), float(lon)) for fid, lat, lon in rows if lat is not None and lon is not None]
+    names = index.districts_of([(lat, lon) for _, lat, lon in located])
+    by_id = {fid: name for (fid, _, _), name in zip(located, names)}
+    return [(fid, by_id.get(fid), lat, lon) for fid, lat, lon in rows]
+
+
+def enrich_facility_districts(conn, index: geo.GridIndex, full: bool = False) -> Tuple[int, int]:
+    """
+    Ordnet alle offenen Facilities einem Stadtteil zu.
+    Rückgabe: (zugeordnet, außerhalb/ohne Koordinaten). Kein commit.
+    """
+    with conn.cursor(row_factory=tuple_row) as cur:
+        if not _table_exists(cur, "facilities"):
+            print("[enrich] Tabelle facilities existiert (noch) nicht, übersprungen.")
+            return 0, 0
+
+        cur.execute(SELECT_ALL_SQL if full else SELECT_PENDING_SQL)
+        pending = cur.fetchall()
+        if not pending:
+            return 0, 0
+
+        cur.execute(CREATE_STAGE_SQL)
+        assigned = unassigned = 0
+        for start in range(0, len(pending), ENRICH_BATCH_SIZE):
+            batch = pending[start:start + ENRICH_BATCH_SIZE]
+            with metrics.timer("stage_seconds", source="enrich_districts", stage="assign"):
+                rows = assign_districts(index, batch)
+            copy_rows(cur, "facility_district_stage", STAGE_COLUMNS, rows)
+            hits = sum(1 for _, name, _, _ in rows if name is not None)
+            assigned += hits
+            unassigned += len(rows) - hits
+
+        cur.execute(MERGE_SQL.format(district_sources=_district_sources(cur)))
+
+    metrics.inc("rows_written", assigned + unassigned, table="facility_district", source="enrich_districts")
+    return assigned, unassigned
+
+
+def run_enrichment(tag: str, full: bool = False) -> bool:
+    """Eigene Connection + Transaktion, Rückgabe ok/Fehler (wie run_source)."""
+    started = time.monotonic()
+    try:
+        # Tabelle/View legt migrations.py an (requires facilities)
+        migrations.ensure_current(tag, strict=False)
+        boundary = geo.load_city_boundary()
+        index = geo.GridIndex(boundary)
+        with db.connection() as conn:
+            try:
+                assigned, unassigned = enrich_facility_districts(conn, index, full=full)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    except Exception as e:
+        print(f"{tag} ❌ Stadtteil-Zuordnung fehlgeschlagen: {e}")
+        return False
+
+    print(
+        f"{tag} 🏘️  Stadtteil-Zuordnung: {assigned} zugeordnet, "
+        f"{unassigned} außerhalb/ohne Koordinaten ({time.monotonic() - started:.1f}s)"
+    )
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ordnet Facilities ihren Stadtteilen zu (facility_district).")
+    parser.add_argument("--full", action="store_true", help="alle Facilities neu zuordnen")
+    args = parser.parse_args()
+
+    db.wait_for_db("[enrich]")
+    if not run_enrichment("[enrich]", full=args.full):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
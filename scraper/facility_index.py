@@ -0,0 +1,302 @@
+# facility_index.py
+import argparse
+import heapq
+import math
+import os
+import pickle
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import db
+import metrics
+from psycopg.rows import tuple_row
+
+
+# ============================================================
+# Räumlicher Index über facilities (k-d-Baum, reines Python)
+# facilities hat keinen Geo-Index (kein PostGIS im Postgres-Image),
+# "nächste Facilities zu mir" hieße sonst: alle Zeilen lesen und sortieren.
+#
+# - Punkte als Einheitsvektoren (x, y, z) auf der Kugel: die euklidische
+#   Sehne wächst monoton mit der Großkreis-Distanz, funktioniert also
+#   auch über mehrere Städte ohne Projektion
+# - ein Baum pro FacilityType (type-Filter = Bäume auswählen),
+#   wheelchair_accessible wird beim Durchsuchen der Blätter gefiltert
+# - Blätter mit bis zu LEAF_SIZE Punkten, Split an der Achse mit der
+#   größten Ausdehnung
+#
+# Der Scraper baut den Index nach jedem Lauf neu und legt ihn als Pickle
+# unter FACILITY_INDEX_PATH ab; Abfragen laden ihn mit load_index().
+# CLI: python facility_index.py --near 51.57,7.05 -k 5 --type APOTHEKE
+# Benchmark: python -m benchmarks.bench_facility_index
+# ============================================================
+FACILITY_INDEX_PATH = os.getenv("FACILITY_INDEX_PATH", "/app/cache/facility_index.pickle")
+
+EARTH_RADIUS_KM = 6371.0088
+LEAF_SIZE = 16
+
+# (facility_id, type, lat, lon, wheelchair_accessible)
+FacilityPoint = Tuple[int, str, float, float, Optional[bool]]
+# (Distanz in km, facility_id, type)
+Hit = Tuple[float, int, str]
+
+SELECT_FACILITIES_SQL = """
+SELECT id, type, latitude, longitude, wheelchair_accessible
+FROM facilities
+WHERE latitude IS NOT NULL AND longitude IS NOT NULL;
+"""
+
+
+def to_xyz(lat: float, lon: float) -> Tuple[float, float, float]:
+    p, l = math.radians(lat), math.radians(lon)
+    cp = math.cos(p)
+    return cp * math.cos(l), cp * math.sin(l), math.sin(p)
+
+
+def chord_to_km(chord2: float) -> float:
+    """Quadrat der Sehne (Einheitskugel) -> Großkreis-Distanz in km."""
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord2) / 2))
+
+
+def km_to_chord2(km: float) -> float:
+    return (2 * math.sin(min(math.pi, km / EARTH_RADIUS_KM) / 2)) ** 2
+
+
+# ============================================================
+# k-d-Baum für eine Facility-Art
+# Knoten als parallele Listen: axis >= 0 -> innerer Knoten (split,
+# left, right), axis == -1 -> Blatt mit Punkten [left, right) in den
+# nach Baumordnung sortierten Punkt-Listen.
+# ============================================================
+class KDTree:
+    def __init__(self, facility_type: str, points: Sequence[FacilityPoint]):
+        self.facility_type = facility_type
+        xyz = [to_xyz(lat, lon) for _, _, lat, lon, _ in points]
+        order = list(range(len(points)))
+
+        self.axis: List[int] = []
+        self.split: List[float] = []
+        self.left: List[int] = []
+        self.right: List[int] = []
+        if order:
+            self._build(order, xyz, 0, len(order))
+
+        self.ids = [points[i][0] for i in order]
+        self.wheelchair = [points[i][4] for i in order]
+        self.xs = [xyz[i][0] for i in order]
+        self.ys = [xyz[i][1] for i in order]
+        self.zs = [xyz[i][2] for i in order]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _node(self, axis: int, split: float, left: int, right: int) -> int:
+        self.axis.append(axis)
+        self.split.append(split)
+        self.left.append(left)
+        self.right.append(right)
+        return len(self.axis) - 1
+
+    def _build(self, order: List[int], xyz: List[Tuple[float, float, float]], start: int, end: int) -> int:
+        if end - start <= LEAF_SIZE:
+            return self._node(-1, 0.0, start, end)
+
+        chunk = order[start:end]
+        spreads = [
+            max(xyz[i][a] for i in chunk) - min(xyz[i][a] for i in chunk)
+            for a in range(3)
+        ]
+        axis = spreads.index(max(spreads))
+        chunk.sort(key=lambda i: xyz[i][axis])
+        order[start:end] = chunk
+
+        mid = (start + end) // 2
+        node = self._node(axis, xyz[order[mid]][axis], 0, 0)
+        self.left[node] = self._build(order, xyz, start, mid)
+        self.right[node] = self._build(order, xyz, mid, end)
+        return node
+
+    def _search(
+        self,
+        q: Tuple[float, float, float],
+        heap: List[Tuple[float, int, str]],
+        k: Optional[int],
+        limit2: float,
+        wheelchair: Optional[bool],
+    ) -> None:
+        """
+        Gemeinsame Suche für kNN (k gesetzt, Max-Heap über -d²) und Radius
+        (k=None, alle Treffer <= limit2). heap wird über mehrere Bäume geteilt.
+        """
+        if not self.ids:
+            return
+        qx, qy, qz = q
+        axis, split, left, right = self.axis, self.split, self.left, self.right
+        xs, ys, zs, ids, wc = self.xs, self.ys, self.zs, self.ids, self.wheelchair
+        ftype = self.facility_type
+
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            worst = -heap[0][0] if k is not None and len(heap) >= k else limit2
+            if bound > worst:
+                continue
+
+            a = axis[node]
+            if a < 0:
+                for i in range(left[node], right[node]):
+                    if wheelchair is not None and wc[i] is not wheelchair:
+                        continue
+                    dx, dy, dz = xs[i] - qx, ys[i] - qy, zs[i] - qz
+                    d2 = dx * dx + dy * dy + dz * dz
+                    if k is None:
+                        if d2 <= limit2:
+                            heap.append((d2, ids[i], ftype))
+                    elif len(heap) < k:
+                        heapq.heappush(heap, (-d2, ids[i], ftype))
+                    elif d2 < -heap[0][0]:
+                        heapq.heapreplace(heap, (-d2, ids[i], ftype))
+                continue
+
+            diff = q[a] - split[node]
+            near, far = (right[node], left[node]) if diff >= 0 else (left[node], right[node])
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
+
+
+# ============================================================
+# Index über alle Facility-Arten
+# ============================================================
+class FacilityIndex:
+    def __init__(self, rows: Iterable[FacilityPoint]):
+        by_type: Dict[str, List[FacilityPoint]] = {}
+        for fid, ftype, lat, lon, wheelchair in rows:
+            if lat is None or lon is None:
+                continue
+            by_type.setdefault(ftype or "SONSTIGES", []).append(
+                (int(fid), ftype or "SONSTIGES", float(lat), float(lon), wheelchair)
+            )
+        self.trees: Dict[str, KDTree] = {t: KDTree(t, pts) for t, pts in by_type.items()}
+        self.built_at = time.time()
+
+    def __len__(self) -> int:
+        return sum(len(t) for t in self.trees.values())
+
+    def _trees(self, types: Optional[Sequence[str]]) -> List[KDTree]:
+        if types is None:
+            return list(self.trees.values())
+        return [self.trees[t] for t in types if t in self.trees]
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int = 5,
+        types: Optional[Sequence[str]] = None,
+        wheelchair: Optional[bool] = None,
+    ) -> List[Hit]:
+        """Die k nächsten Facilities (Distanz aufsteigend)."""
+        if k <= 0:
+            return []
+        q = to_xyz(lat, lon)
+        heap: List[Tuple[float, int, str]] = []
+        for tree in self._trees(types):
+            tree._search(q, heap, k, math.inf, wheelchair)
+        return [(chord_to_km(-d2), fid, ftype) for d2, fid, ftype in sorted(heap, reverse=True)]
+
+    def within(
+        self,
+        lat: float,
+        lon: float,
+        radius_km: float,
+        types: Optional[Sequence[str]] = None,
+        wheelchair: Optional[bool] = None,
+    ) -> List[Hit]:
+        """Alle Facilities im Umkreis radius_km (Distanz aufsteigend)."""
+        q = to_xyz(lat, lon)
+        limit2 = km_to_chord2(radius_km)
+        hits: List[Tuple[float, int, str]] = []
+        for tree in self._trees(types):
+            tree._search(q, hits, None, limit2, wheelchair)
+        return [(chord_to_km(d2), fid, ftype) for d2, fid, ftype in sorted(hits)]
+
+
+# ============================================================
+# Bauen / Speichern / Laden
+# ============================================================
+def load_facility_points(conn) -> List[FacilityPoint]:
+    with conn.cursor(row_factory=tuple_row) as cur:
+        cur.execute("SELECT to_regclass('facilities') IS NOT NULL;")
+        if not cur.fetchone()[0]:
+            return []
+        cur.execute(SELECT_FACILITIES_SQL)
+        return cur.fetchall()
+
+
+def save_index(index: FacilityIndex, path: str = FACILITY_INDEX_PATH) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)  # Leser sehen nie einen halben Index
+
+
+def load_index(path: str = FACILITY_INDEX_PATH) -> FacilityIndex:
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def rebuild_index(tag: str, path: str = FACILITY_INDEX_PATH) -> bool:
+    """Nach jedem Scrape: Index aus facilities neu bauen und ablegen. Rückgabe ok/Fehler."""
+    started = time.monotonic()
+    try:
+        with db.connection() as conn, metrics.timer("stage_seconds", source="facility_index", stage="load"):
+            rows = load_facility_points(conn)
+        with metrics.timer("stage_seconds", source="facility_index", stage="build"):
+            index = FacilityIndex(rows)
+        save_index(index, path)
+    except Exception as e:
+        print(f"{tag} ❌ Facility-Index fehlgeschlagen: {e}")
+        return False
+
+    print(f"{tag} 📍 Facility-Index: {len(index)} Facilities in {len(index.trees)} Typen ({time.monotonic() - started:.1f}s)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Räumlicher Facility-Index (k-d-Baum): bauen oder abfragen.")
+    parser.add_argument("--rebuild", action="store_true", help="Index aus der DB neu bauen")
+    parser.add_argument("--near", help="lat,lon für eine Abfrage")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--radius-km", type=float, default=None, help="Umkreis statt k nächste")
+    parser.add_argument("--type", default="", help="FacilityTypes, kommagetrennt")
+    parser.add_argument("--wheelchair", action="store_true", help="nur rollstuhlgerecht")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        db.wait_for_db("[facility-index]")
+        if not rebuild_index("[facility-index]"):
+            sys.exit(1)
+    if not args.near:
+        return
+
+    lat, lon = (float(v) for v in args.near.split(","))
+    types = [t.strip().upper() for t in args.type.split(",") if t.strip()] or None
+    wheelchair = True if args.wheelchair else None
+    index = load_index()
+
+    started = time.perf_counter()
+    if args.radius_km is not None:
+        hits = index.within(lat, lon, args.radius_km, types, wheelchair)
+    else:
+        hits = index.nearest(lat, lon, args.k, types, wheelchair)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    for dist, fid, ftype in hits:
+        print(f"[facility-index] {dist:>7.3f} km  id={fid:<8} {ftype}")
+    print(f"[facility-index] {len(hits)} Treffer in {elapsed_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
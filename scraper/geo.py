@@ -0,0 +1,339 @@
+# geo.py
+import json
+import math
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# ============================================================
+# Stadtgrenze Gelsenkirchen + kleine Geo-Helfer (ohne shapely/GEOS)
+# Quelle: frontend/Verwaltungsgrenzen_geojson.json (18 Stadtteile als
+# MultiPolygon, Koordinaten WGS84 lon/lat). Im Container wird die Datei
+# nach /app/geo gemountet (docker-compose), lokal geht CITY_BOUNDARY_PATH.
+# ============================================================
+CITY_BOUNDARY_PATH = os.getenv("CITY_BOUNDARY_PATH", "/app/geo/Verwaltungsgrenzen_geojson.json")
+
+EARTH_RADIUS_KM = 6371.0088
+
+Ring = List[Tuple[float, float]]  # [(lon, lat), ...]
+Polygon = Tuple[Ring, List[Ring]]  # (Außenring, Löcher)
+BBox = Tuple[float, float, float, float]  # (min_lon, min_lat, max_lon, max_lat)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _ring_bbox(ring: Ring) -> BBox:
+    xs = [x for x, _ in ring]
+    ys = [y for _, y in ring]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _ring_centroid(ring: Ring) -> Tuple[float, float, float]:
+    """Shoelace: (Fläche mit Vorzeichen, x, y) eines Rings in Grad."""
+    a = cx = cy = 0.0
+    for i in range(len(ring) - 1):
+        x0, y0 = ring[i]
+        x1, y1 = ring[i + 1]
+        cross = x0 * y1 - x1 * y0
+        a += cross
+        cx += (x0 + x1) * cross
+        cy += (y0 + y1) * cross
+    if a == 0:
+        return 0.0, ring[0][0], ring[0][1]
+    return a / 2, cx / (3 * a), cy / (3 * a)
+
+
+def point_in_ring(lon: float, lat: float, ring: Ring) -> bool:
+    """Ray-Casting (gerade Anzahl Schnittpunkte -> außen)."""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i]
+        xj, yj = ring[j]
+        if (yi > lat) != (yj > lat):
+            x_cross = xi + (lat - yi) * (xj - xi) / (yj - yi)
+            if lon < x_cross:
+                inside = not inside
+        j = i
+    return inside
+
+
+class District:
+    def __init__(self, name: str, polygons: List[Polygon]):
+        self.name = name
+        self.polygons = polygons
+        self.polygon_bboxes = [_ring_bbox(outer) for outer, _ in polygons]
+        boxes = self.polygon_bboxes
+        self.bbox: BBox = (
+            min(b[0] for b in boxes),
+            min(b[1] for b in boxes),
+            max(b[2] for b in boxes),
+            max(b[3] for b in boxes),
+        )
+
+    def centroid(self) -> Tuple[float, float]:
+        """Flächenschwerpunkt (lat, lon) über alle Teilflächen (Löcher abgezogen)."""
+        total_a = cx = cy = 0.0
+        for outer, holes in self.polygons:
+            for ring, sign in [(outer, 1.0)] + [(h, -1.0) for h in holes]:
+                a, x, y = _ring_centroid(ring)
+                a = sign * abs(a)
+                total_a += a
+                cx += a * x
+                cy += a * y
+        if total_a == 0:
+            x0, y0, x1, y1 = self.bbox
+            return (y0 + y1) / 2, (x0 + x1) / 2
+        return cy / total_a, cx / total_a
+
+    def contains(self, lat: float, lon: float) -> bool:
+        for (outer, holes), (x0, y0, x1, y1) in zip(self.polygons, self.polygon_bboxes):
+            if not (x0 <= lon <= x1 and y0 <= lat <= y1):
+                continue
+            if point_in_ring(lon, lat, outer) and not any(point_in_ring(lon, lat, h) for h in holes):
+                return True
+        return False
+
+
+class CityBoundary:
+    def __init__(self, districts: List[District]):
+        if not districts:
+            raise ValueError("Keine Stadtteile in der GeoJSON gefunden.")
+        self.districts = districts
+        self.bbox: BBox = (
+            min(d.bbox[0] for d in districts),
+            min(d.bbox[1] for d in districts),
+            max(d.bbox[2] for d in districts),
+            max(d.bbox[3] for d in districts),
+        )
+
+    def district_of(self, lat: float, lon: float) -> Optional[str]:
+        x0, y0, x1, y1 = self.bbox
+        if not (x0 <= lon <= x1 and y0 <= lat <= y1):
+            return None
+        for d in self.districts:
+            dx0, dy0, dx1, dy1 = d.bbox
+            if dx0 <= lon <= dx1 and dy0 <= lat <= dy1 and d.contains(lat, lon):
+                return d.name
+        return None
+
+    def contains(self, lat: float, lon: float) -> bool:
+        return self.district_of(lat, lon) is not None
+
+
+def _polygons(geometry: dict) -> List[Polygon]:
+    coords = geometry.get("coordinates") or []
+    if geometry.get("type") == "Polygon":
+        coords = [coords]
+    elif geometry.get("type") != "MultiPolygon":
+        return []
+
+    polygons: List[Polygon] = []
+    for poly in coords:
+        rings = [[(float(x), float(y)) for x, y, *_ in ring] for ring in poly]
+        if rings:
+            polygons.append((rings[0], rings[1:]))
+    return polygons
+
+
+def load_city_boundary(path: str = CITY_BOUNDARY_PATH, name_property: str = "stadtteil_name") -> CityBoundary:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    districts = []
+    for feature in data.get("features") or []:
+        name = str((feature.get("properties") or {}).get(name_property) or "").strip()
+        polygons = _polygons(feature.get("geometry") or {})
+        if name and polygons:
+            districts.append(District(name, polygons))
+    return CityBoundary(districts)
+
+
+# ============================================================
+# Raster in km (lokal flach genähert, für ~20 km Stadtgebiet ausreichend)
+# ============================================================
+def km_to_deg(lat: float, km: float) -> Tuple[float, float]:
+    """km -> (Grad Breite, Grad Länge) an der Breite lat."""
+    dlat = km / 111.32
+    dlon = km / (111.32 * math.cos(math.radians(lat)))
+    return dlat, dlon
+
+
+def grid_points(bbox: BBox, step_km: float) -> Iterator[Tuple[float, float]]:
+    """Rasterpunkte (lat, lon) über die BBox, Zellmitten im Abstand step_km."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    dlat, dlon = km_to_deg((min_lat + max_lat) / 2, step_km)
+    lat = min_lat + dlat / 2
+    while lat <= max_lat:
+        lon = min_lon + dlon / 2
+        while lon <= max_lon:
+            yield lat, lon
+            lon += dlon
+        lat += dlat
+
+
+def grid_points_inside(boundary: CityBoundary, step_km: float) -> List[Tuple[float, float]]:
+    return [p for p in grid_points(boundary.bbox, step_km) if boundary.contains(*p)]
+
+
+def grid_cell(lat: float, lon: float, bbox: BBox, step_km: float) -> Tuple[int, int]:
+    """Zelle (Zeile, Spalte) von (lat, lon) im selben Raster wie grid_points(bbox, step_km)."""
+    min_lon, min_lat, _, max_lat = bbox
+    dlat, dlon = km_to_deg((min_lat + max_lat) / 2, step_km)
+    return int((lat - min_lat) // dlat), int((lon - min_lon) // dlon)
+
+
+# ============================================================
+# Geohash (Base32, wie geohash.org) für Blocking/Schlüssel
+# Präzision 7 -> Zelle ca. 150 m x 95 m in Gelsenkirchen.
+# ============================================================
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lon: float, precision: int = 7) -> str:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    bits, ch, even = 0, 0, True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch, lon_lo = (ch << 1) | 1, mid
+            else:
+                ch, lon_hi = ch << 1, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch, lat_lo = (ch << 1) | 1, mid
+            else:
+                ch, lat_hi = ch << 1, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_GEOHASH_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(chars)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """(Grad Breite, Grad Länge) einer Geohash-Zelle."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lon_bits)
+
+
+def geohash_neighbors(lat: float, lon: float, precision: int = 7) -> List[str]:
+    """Zelle des Punkts + die 8 Nachbarzellen (für Blocking über Zellgrenzen)."""
+    dlat, dlon = geohash_cell_size(precision)
+    return sorted({
+        geohash_encode(lat + i * dlat, lon + j * dlon, precision)
+        for i in (-1, 0, 1)
+        for j in (-1, 0, 1)
+    })
+
+
+# ============================================================
+# Raster-Index für schnelle Punkt-Abfragen
+# Statt für jeden Punkt alle Polygone per Ray-Casting zu prüfen, wird
+# das Stadtgebiet einmal in Zellen (cell_km) zerlegt:
+# - Zelle komplett in einem Stadtteil -> Name direkt aus dem Dict
+# - Zelle ohne Stadtteil -> außerhalb (nicht im Dict)
+# - Zelle, in der eine Grenze verläuft -> EDGE, nur dann exakter Test
+# Eine Zelle gilt als "komplett", wenn alle vier Ecken im selben
+# Stadtteil liegen und keine Polygonkante sie schneidet. Nur Eckpunkte
+# zu prüfen reicht nicht: ein schmaler Streifen eines anderen Stadtteils
+# kann eine Zelle queren, ohne dass ein Eckpunkt in ihr liegt.
+# ============================================================
+EDGE = "\x00edge"
+
+
+def _segment_hits_box(x0: float, y0: float, x1: float, y1: float, box: BBox) -> bool:
+    """Schneidet die Strecke (x0,y0)-(x1,y1) das Rechteck (Liang-Barsky)?"""
+    bx0, by0, bx1, by1 = box
+    t0, t1 = 0.0, 1.0
+    dx, dy = x1 - x0, y1 - y0
+    for p, q in ((-dx, x0 - bx0), (dx, bx1 - x0), (-dy, y0 - by0), (dy, by1 - y0)):
+        if p == 0:
+            if q < 0:
+                return False
+            continue
+        t = q / p
+        if p < 0:
+            t0 = max(t0, t)
+        else:
+            t1 = min(t1, t)
+        if t0 > t1:
+            return False
+    return True
+
+
+class GridIndex:
+    def __init__(self, boundary: CityBoundary, cell_km: float = 0.2, buffer_km: float = 0.0):
+        self.boundary = boundary
+        self.cell_km = cell_km
+        min_lon, min_lat, max_lon, max_lat = boundary.bbox
+        self.dlat, self.dlon = km_to_deg((min_lat + max_lat) / 2, cell_km)
+        self.min_lat, self.min_lon = min_lat, min_lon
+        rows = int((max_lat - min_lat) // self.dlat) + 1
+        cols = int((max_lon - min_lon) // self.dlon) + 1
+
+        # Ecken einmal auswerten, benachbarte Zellen teilen sie sich
+        corners = [
+            [boundary.district_of(min_lat + r * self.dlat, min_lon + c * self.dlon) for c in range(cols + 1)]
+            for r in range(rows + 1)
+        ]
+        # jede Zelle, die eine Ring-Kante schneidet (in Zell-Koordinaten)
+        edge_cells = set()
+        for d in boundary.districts:
+            for outer, holes in d.polygons:
+                for ring in [outer] + holes:
+                    pts = [((lat - min_lat) / self.dlat, (lon - min_lon) / self.dlon) for lon, lat in ring]
+                    for (r0, c0), (r1, c1) in zip(pts, pts[1:] + pts[:1]):
+                        for r in range(int(math.floor(min(r0, r1))), int(math.floor(max(r0, r1))) + 1):
+                            for c in range(int(math.floor(min(c0, c1))), int(math.floor(max(c0, c1))) + 1):
+                                if _segment_hits_box(c0, r0, c1, r1, (c, r, c + 1, r + 1)):
+                                    edge_cells.add((r, c))
+
+        self.cells: Dict[Tuple[int, int], str] = {}
+        for r in range(rows):
+            for c in range(cols):
+                names = {corners[r][c], corners[r][c + 1], corners[r + 1][c], corners[r + 1][c + 1]}
+                if (r, c) in edge_cells or len(names) > 1:
+                    self.cells[(r, c)] = EDGE
+                elif None not in names:
+                    self.cells[(r, c)] = names.pop()
+
+        # Puffer: Zellen im Umkreis buffer_km um Stadt-/Randzellen gelten als "nah"
+        k = int(math.ceil(buffer_km / cell_km)) if buffer_km > 0 else 0
+        self.near = {
+            (r + dr, c + dc)
+            for (r, c) in self.cells
+            for dr in range(-k, k + 1)
+            for dc in range(-k, k + 1)
+        }
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int((lat - self.min_lat) // self.dlat), int((lon - self.min_lon) // self.dlon)
+
+    def district_of(self, lat: float, lon: float) -> Optional[str]:
+        value = self.cells.get(self._cell(lat, lon))
+        if value == EDGE:
+            return self.boundary.district_of(lat, lon)
+        return value
+
+    def contains(self, lat: float, lon: float) -> bool:
+        return self.district_of(lat, lon) is not None
+
+    def near_city(self, lat: float, lon: float) -> bool:
+        """True, wenn der Punkt in der Stadt oder höchstens ~buffer_km davor liegt."""
+        return self._cell(lat, lon) in self.near
+
+    def districts_of(self, points: List[Tuple[float, float]]) -> List[Optional[str]]:
+        """Batch-Variante für viele Punkte (lat, lon)."""
+        return [self.district_of(lat, lon) for lat, lon in points]
@@ -0,0 +1,184 @@
+# http_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+# ============================================================
+# Lokaler HTTP-Response-Cache (SQLite)
+# Schlüssel = Methode + URL (inkl. sortierter Query-Parameter) + Body.
+#
+# - TTL: innerhalb von HTTP_CACHE_TTL Sekunden wird der Eintrag ohne
+#   Netzwerk-Request zurückgegeben.
+# - Revalidierung: ist der Eintrag älter, wird mit If-None-Match /
+#   If-Modified-Since nachgefragt. Bei 304 bleibt der Body, nur der
+#   Zeitstempel wird erneuert.
+# - LRU: übersteigt die Datei HTTP_CACHE_MAX_MB, fliegen die am längsten
+#   nicht mehr gelesenen Einträge raus.
+# - Offline: HTTP_CACHE_OFFLINE=1 liefert nur aus dem Cache (egal wie alt),
+#   fehlende Einträge sind ein Fehler. Praktisch für Entwicklung ohne Netz.
+#
+# HTTP_CACHE_PATH leer lassen -> Cache komplett aus.
+# ============================================================
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", "/app/cache/http_cache.sqlite")
+HTTP_CACHE_TTL = float(os.getenv("HTTP_CACHE_TTL", str(24 * 3600)))
+HTTP_CACHE_MAX_MB = float(os.getenv("HTTP_CACHE_MAX_MB", "200"))
+HTTP_CACHE_OFFLINE = os.getenv("HTTP_CACHE_OFFLINE", "0") == "1"
+
+# Nur diese Header werden gespeichert (Body ist bereits dekomprimiert)
+_KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS responses (
+    cache_key TEXT PRIMARY KEY,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+"""
+
+CREATE_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at);
+"""
+
+
+class CacheMiss(RuntimeError):
+    """Offline-Modus und kein passender Eintrag im Cache."""
+
+
+def cache_key(
+    method: str,
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    json_body: Any = None,
+    data: Any = None,
+    ignore_params: Iterable[str] = (),
+) -> str:
+    """Stabiler Key aus Methode, URL, Query und Body (Reihenfolge egal)."""
+    ignore = set(ignore_params)
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in ignore]
+    query += [(k, str(v)) for k, v in (params or {}).items() if k not in ignore]
+    norm_url = urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(sorted(query)), ""))
+
+    if json_body is not None:
+        body = json.dumps(json_body, sort_keys=True, ensure_ascii=False)
+    elif data is not None:
+        body = data.decode("utf-8", "replace") if isinstance(data, bytes) else str(data)
+    else:
+        body = ""
+
+    raw = f"{method.upper()}|{norm_url}|{body}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str, max_bytes: int):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # eine Verbindung für alle Threads, Zugriffe über _lock serialisiert
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL;")
+        self._db.execute(CREATE_TABLE_SQL)
+        self._db.execute(CREATE_INDEX_SQL)
+        self._db.commit()
+
+    def get(self, key: str) -> Optional[Tuple[requests.Response, float]]:
+        """Liefert (Response, stored_at) oder None und markiert den Eintrag als gelesen."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, status, headers, body, stored_at FROM responses WHERE cache_key = ?;",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE cache_key = ?;", (time.time(), key))
+            self._db.commit()
+
+        url, status, headers, body, stored_at = row
+        return _to_response(url, status, json.loads(headers), body), stored_at
+
+    def put(self, key: str, method: str, resp: requests.Response) -> None:
+        headers = {h: resp.headers[h] for h in _KEPT_HEADERS if h in resp.headers}
+        body = resp.content or b""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                """
+                INSERT OR REPLACE INTO responses
+                  (cache_key, method, url, status, headers, body, size, stored_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+                """,
+                (key, method.upper(), resp.url, resp.status_code, json.dumps(headers), body, len(body), now, now),
+            )
+            self._evict()
+            self._db.commit()
+
+    def refresh(self, key: str) -> None:
+        """Nach 304 Not Modified: Eintrag gilt wieder als frisch."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ? WHERE cache_key = ?;",
+                (now, now, key),
+            )
+            self._db.commit()
+
+    # LRU: älteste Lesezugriffe zuerst löschen, bis wir unter 90% des Limits sind
+    def _evict(self) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses;").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        doomed = []
+        for key, size in self._db.execute("SELECT cache_key, size FROM responses ORDER BY accessed_at ASC;"):
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM responses WHERE cache_key = ?;", doomed)
+        print(f"[http-cache] 🧹 LRU: {len(doomed)} Einträge entfernt")
+
+
+def _to_response(url: str, status: int, headers: Dict[str, str], body: bytes) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    resp.url = url
+    resp.headers = CaseInsensitiveDict(headers)
+    resp._content = body
+    resp.encoding = get_encoding_from_headers(resp.headers)
+    return resp
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[ResponseCache]:
+    """Prozessweiter Cache (lazy) oder None, wenn HTTP_CACHE_PATH leer ist."""
+    global _cache
+    if not HTTP_CACHE_PATH:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(HTTP_CACHE_PATH, int(HTTP_CACHE_MAX_MB * 1024 * 1024))
+    return _cache
@@ -0,0 +1,238 @@
+# http_client.py
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+
+import http_cache
+import metrics
+import ratelimit
+import replay
+
+
+# ============================================================
+# Gemeinsamer HTTP-Client für alle Quellen
+# Statt requests.get/requests.post (neue TCP+TLS-Verbindung pro Call)
+# nutzen alle Quellen eine gemeinsame requests.Session:
+# - Keep-Alive + Connection-Pool pro Host
+# - Komprimierung (Accept-Encoding: gzip/deflate, ggf. br)
+# - zentrales Retry/Backoff bei 429 und 5xx (inkl. Retry-After)
+# - adaptives Rate-Limit pro Host (ratelimit.AdaptiveLimiter): jede
+#   Antwort geht als Feedback an den Limiter des Hosts, 429/503 und
+#   langsame Antworten drosseln, schnelle erhöhen die Rate
+#
+# Status-Retries laufen deshalb hier in _send und nicht in urllib3,
+# sonst würde der Limiter die 429/503 nie sehen. urllib3 wiederholt
+# nur noch Verbindungs-/Lesefehler.
+#
+# Tuning über ENV:
+# - HTTP_POOL_CONNECTIONS: Anzahl gepoolter Hosts
+# - HTTP_POOL_MAXSIZE: Verbindungen pro Host (>= Anzahl Worker-Threads)
+# - HTTP_RETRIES / HTTP_BACKOFF: Wiederholungen und Backoff-Faktor (s)
+# - HTTP_RATE_* / HTTP_HOST_MAX_RATE: Rate-Limit, siehe ratelimit.py
+# ============================================================
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _build_session() -> requests.Session:
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        # KVWL nutzt POST nur zum Lesen -> Wiederholen ist unkritisch
+        allowed_methods=frozenset({"GET", "HEAD", "POST"}),
+        # Status-Retries (inkl. Retry-After) macht _send, siehe oben
+        respect_retry_after_header=False,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(make_headers(accept_encoding=True))
+    return session
+
+
+def get_session() -> requests.Session:
+    """Liefert die prozessweit geteilte Session (lazy, thread-safe)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+# cache=True: Antwort über http_cache (TTL, ETag/Last-Modified, Offline).
+# cache_ttl überschreibt HTTP_CACHE_TTL für diesen Call.
+# cache_ignore_params: Query-Parameter, die nicht in den Key gehören
+# (z.B. wechselnde Tokens). Derselbe Key dient auch für Record/Replay.
+def request(
+    method: str,
+    url: str,
+    *,
+    session: Optional[requests.Session] = None,
+    cache: bool = False,
+    cache_ttl: Optional[float] = None,
+    cache_ignore_params: Iterable[str] = (),
+    **kwargs: Any,
+) -> requests.Response:
+    kwargs.setdefault("timeout", HTTP_TIMEOUT)
+    session = session or get_session()
+
+    key = ""
+    if cache or replay.HTTP_RECORD_DIR or replay.HTTP_REPLAY_URL:
+        key = http_cache.cache_key(
+            method,
+            url,
+            params=kwargs.get("params"),
+            json_body=kwargs.get("json"),
+            data=kwargs.get("data"),
+            ignore_params=cache_ignore_params,
+        )
+
+    store = http_cache.get_cache() if cache else None
+    if store is None:
+        resp = _send(session, method, url, key, kwargs)
+    else:
+        resp = _cached_request(store, session, method, url, key, cache_ttl, kwargs)
+
+    if replay.HTTP_RECORD_DIR:
+        replay.record_fixture(replay.HTTP_RECORD_DIR, key, method, url, resp)
+
+    return resp
+
+
+def _cached_request(
+    store: http_cache.ResponseCache,
+    session: requests.Session,
+    method: str,
+    url: str,
+    key: str,
+    cache_ttl: Optional[float],
+    kwargs: Dict[str, Any],
+) -> requests.Response:
+    ttl = http_cache.HTTP_CACHE_TTL if cache_ttl is None else cache_ttl
+
+    hit = store.get(key)
+    if hit is not None:
+        cached, stored_at = hit
+        if http_cache.HTTP_CACHE_OFFLINE or time.time() - stored_at < ttl:
+            metrics.inc("http_cache", result="hit", endpoint=endpoint_label(url))
+            return cached
+    elif http_cache.HTTP_CACHE_OFFLINE:
+        raise http_cache.CacheMiss(f"Offline-Modus: kein Cache-Eintrag für {method} {url}")
+
+    # abgelaufen -> mit Validatoren nachfragen, falls der Server welche geliefert hat
+    if hit is not None:
+        headers = dict(kwargs.get("headers") or {})
+        if cached.headers.get("ETag"):
+            headers["If-None-Match"] = cached.headers["ETag"]
+        if cached.headers.get("Last-Modified"):
+            headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+        kwargs = {**kwargs, "headers": headers}
+
+    resp = _send(session, method, url, key, kwargs)
+
+    if resp.status_code == 304 and hit is not None:
+        metrics.inc("http_cache", result="revalidated", endpoint=endpoint_label(url))
+        store.refresh(key)
+        return cached
+
+    metrics.inc("http_cache", result="miss", endpoint=endpoint_label(url))
+
+    if resp.status_code == 200:
+        store.put(key, method, resp)
+
+    return resp
+
+
+# OSRM kodiert die Koordinaten im Pfad ("/table/v1/driving/7.1,51.5;7.2,51.6")
+_COORDS_SEGMENT = re.compile(r"/-?\d+(\.\d+)?,-?\d+(\.\d+)?(;[^/]*)?$")
+
+
+def endpoint_label(url: str) -> str:
+    """Host + Pfad ohne Query -> begrenzte Anzahl Messreihen pro Endpoint."""
+    parts = urlsplit(url)
+    return f"{parts.netloc}{_COORDS_SEGMENT.sub('/{coords}', parts.path)}"
+
+
+# Eigentlicher Netzwerk-Call. Mit HTTP_REPLAY_URL geht er an den lokalen
+# Replay-Server (siehe replay.py) statt an den echten Host; das Rate-Limit
+# gilt trotzdem für den echten Host.
+#
+# Ablauf pro Versuch: Limiter.acquire -> Request -> Limiter.feedback.
+# Bei RETRY_STATUS wird bis zu HTTP_RETRIES-mal wiederholt:
+# - 429/503: der Limiter sperrt den Host (Retry-After oder 1/Rate)
+# - 500/502/504: exponentieller Backoff (HTTP_BACKOFF * 2^Versuch)
+# Die letzte Antwort geht an den Aufrufer (der macht raise_for_status()).
+def _send(session: requests.Session, method: str, url: str, key: str, kwargs: Dict[str, Any]) -> requests.Response:
+    endpoint = endpoint_label(url)
+    limiter = ratelimit.get_host_limiter(urlsplit(url).netloc)
+    if replay.HTTP_REPLAY_URL:
+        headers = dict(kwargs.get("headers") or {})
+        headers[replay.REPLAY_KEY_HEADER] = key
+        headers[replay.REPLAY_HOST_HEADER] = urlsplit(url).netloc
+        kwargs = {**kwargs, "headers": headers}
+        url = replay.to_replay_url(url, replay.HTTP_REPLAY_URL)
+
+    for attempt in range(HTTP_RETRIES + 1):
+        limiter.acquire()
+
+        started = time.perf_counter()
+        status: Any = "error"
+        try:
+            resp = session.request(method, url, **kwargs)
+            status = resp.status_code
+        except (requests.ConnectionError, requests.Timeout):
+            limiter.feedback(None, time.perf_counter() - started)
+            raise
+        finally:
+            metrics.observe(
+                "http_request_seconds",
+                time.perf_counter() - started,
+                method=method.upper(),
+                endpoint=endpoint,
+                status=status,
+            )
+
+        retry_after = ratelimit.parse_retry_after(resp.headers.get("Retry-After"))
+        limiter.feedback(resp.status_code, time.perf_counter() - started, retry_after)
+
+        if resp.status_code not in RETRY_STATUS or attempt == HTTP_RETRIES:
+            return resp
+
+        metrics.inc("http_retries", endpoint=endpoint, status=resp.status_code)
+        resp.close()
+        if resp.status_code not in ratelimit.THROTTLE_STATUS:
+            metrics.sleep(HTTP_BACKOFF * (2 ** attempt), reason="backoff")
+
+    return resp
+
+
+def get(url: str, **kwargs: Any) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs: Any) -> requests.Response:
+    return request("POST", url, **kwargs)
@@ -1,31 +1,76 @@
 import os
+import sys
 import time
 import hashlib
-import random
-from typing import Any, Dict, Iterable, Optional, Tuple, List
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Set, Tuple, List
+from urllib.parse import urlsplit
+import crawl_journal
+import db
+import dedupe_facilities
+import enrich_districts
+import facility_index
+import geo
+import http_client
+import metrics
+import migrations
+from bulk_writer import bulk_sync_doctors, bulk_upsert_facilities
+import ratelimit
+import retention
+import search_planner
 from sources.gelsenkirchen_gesundheitskarte import persist_gelsenkirchen_gesundheitskarte
 from sources.aponet_apothekensuche import persist_aponet_apotheken_gelsenkirchen
 
 
-import requests
-import psycopg
 from psycopg.rows import dict_row
 
 # ============================================================
-# 1) Konfiguration: DB-Zugangsdaten über ENV (Docker-friendly).
-# In Docker (docker-compose) werden diese Werte typischerweise
-# als Environment-Variablen gesetzt.
+# 1) Konfiguration über ENV (Docker-friendly).
+# DB-Zugangsdaten liegen in db.py (gemeinsam mit dem Datei-Importer).
 # ============================================================
-DB_HOST = os.getenv("DB_HOST", "db")
-DB_PORT = int(os.getenv("DB_PORT", "5432"))
-DB_NAME = os.getenv("DB_NAME", "bachelor")
-DB_USER = os.getenv("DB_USER", "bachelor")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "bachelor")
-
 
 # Datenquelle-Label (für Multi-Scraper später)
 SOURCE = "kvwl"
 
+# Parallelität für getDoctor:
+# - KVWL_WORKERS: wie viele Detail-Requests gleichzeitig unterwegs sein dürfen
+# - KVWL_RATE: Obergrenze in Requests pro Sekunde für www.kvwl.de. Die
+#   tatsächliche Rate regelt der adaptive Limiter (ratelimit.py) anhand
+#   von Latenz, 429/503 und Retry-After; Suche und Details teilen sie sich.
+# - KVWL_BURST: wie viele Requests direkt hintereinander erlaubt sind
+KVWL_WORKERS = int(os.getenv("KVWL_WORKERS", "4"))
+KVWL_RATE = float(os.getenv("KVWL_RATE", "5.0"))
+KVWL_BURST = int(os.getenv("KVWL_BURST", "2"))
+
+# Inkrementeller Lauf: getDoctor-Antworten, die jünger als
+# KVWL_REFRESH_AGE_HOURS sind, kommen aus dem HTTP-Cache statt von KVWL.
+# Leer -> es gilt HTTP_CACHE_TTL. 0 -> jeder Arzt wird neu geladen.
+_REFRESH_AGE = os.getenv("KVWL_REFRESH_AGE_HOURS", "")
+KVWL_REFRESH_AGE_S: Optional[float] = float(_REFRESH_AGE) * 3600 if _REFRESH_AGE else None
+
+# Pipeline Suche -> Details -> Gruppierung:
+# - KVWL_SEARCH_WORKERS: wie viele Suchpunkte gleichzeitig paginiert werden
+# - KVWL_QUEUE_SIZE: maximale Länge der Queues zwischen den Stufen
+KVWL_SEARCH_WORKERS = int(os.getenv("KVWL_SEARCH_WORKERS", "2"))
+KVWL_QUEUE_SIZE = int(os.getenv("KVWL_QUEUE_SIZE", "100"))
+KVWL_PAGE_SIZE = 20
+
+# Suchpunkte (siehe search_planner.py):
+# - KVWL_PLANNER=1: minimale Überdeckung des Stadtgebiets statt fester Punkte
+#   (braucht die Statistik eines Vorlaufs oder KVWL_SEARCH_RADIUS_KM)
+# - KVWL_SEARCH_RADIUS_KM: effektiven Suchradius fest vorgeben statt lernen
+KVWL_PLANNER = os.getenv("KVWL_PLANNER", "1") == "1"
+_SEARCH_RADIUS = os.getenv("KVWL_SEARCH_RADIUS_KM", "")
+KVWL_SEARCH_RADIUS_KM: Optional[float] = float(_SEARCH_RADIUS) if _SEARCH_RADIUS else None
+
+# Fortsetzbarer Crawl (siehe crawl_journal.py):
+# - KVWL_JOURNAL_PATH: SQLite-Journal (leer -> aus)
+# - KVWL_FLUSH_EVERY: nach so vielen Details die bis dahin gruppierten
+#   Facilities/Ärzte schon schreiben und committen (0 -> erst am Ende)
+KVWL_FLUSH_EVERY = int(os.getenv("KVWL_FLUSH_EVERY", "500"))
+
 
 # ============================================================
 # 2) KVWL HTTP Calls: Search und Detail
@@ -35,6 +80,10 @@ SOURCE = "kvwl"
 #
 # HEADERS: Damit Requests nicht sofort blockiert werden, setzen
 # wir u.a. Content-Type und einen User-Agent.
+#
+# Alle Calls laufen über http_client (gemeinsame Session mit
+# Keep-Alive, Connection-Pool und Retry bei 429/5xx) und den lokalen
+# Response-Cache (http_cache.py), damit Re-Runs nur Geändertes laden.
 # ============================================================
 SEARCH_URL = "https://www.kvwl.de/DocSearchService/DocSearchService/searchDocs"
 DETAIL_URL = "https://www.kvwl.de/DocSearchService/DocSearchService/getDoctor"
@@ -49,64 +98,28 @@ HEADERS = {
 def kvwl_search(payload: Dict[str, Any]) -> Dict[str, Any]:
     """Führt einen KVWL-Such-Request aus und gibt das JSON zurück."""
     print(f"[kvwl] search page={payload.get('PageId')} lat={payload.get('Latitude')} lon={payload.get('Longitude')}")
-    r = requests.post(SEARCH_URL, json=payload, headers=HEADERS, timeout=30)
+    r = http_client.post(SEARCH_URL, json=payload, headers=HEADERS, timeout=30, cache=True)
     print(f"[kvwl] search status={r.status_code} len={len(r.text or '')}")
     r.raise_for_status()
-    return r.json()
+    with metrics.timer("parse_seconds", source=SOURCE, stage="search"):
+        return r.json()
 
 
 def kvwl_get_doctor(doc_id: str) -> Dict[str, Any]:
     """Lädt KVWL-Detaildaten für eine Arzt-Id (Id Feld muss 'Id' heißen)."""
     print(f"[kvwl] getDoctor id={doc_id}")
-    r = requests.post(DETAIL_URL, json={"Id": doc_id}, headers=HEADERS, timeout=30)
+    r = http_client.post(
+        DETAIL_URL,
+        json={"Id": doc_id},
+        headers=HEADERS,
+        timeout=30,
+        cache=True,
+        cache_ttl=KVWL_REFRESH_AGE_S,
+    )
     print(f"[kvwl] getDoctor status={r.status_code} len={len(r.text or '')}")
     r.raise_for_status()
-    return r.json()
-
-# Funktion von gelsenkirchen_gesundheitskarte.py
-def run_html_sources(conn) -> None:
-    
-    print("[scraper] 🌐 Starte HTML-Quellen...")
-    persist_gelsenkirchen_gesundheitskarte(conn)
-    # Weitere Quellen können hinzugefügt werden
-
-    print("[scraper] 🌐 HTML-Quellen abgeschlossen.")
-    
-    
-    
-    print("[scraper] 🌐 Starte HTML-Gesundheitskarte-Quelle...")
-    persist_aponet_apotheken_gelsenkirchen(conn)
-    print("[scraper] 🌐 HTML-Gesundheitskarte-Quelle abgeschlossen.")
-    
-    
-    
-# ============================================================
-# 3) DB-Startup-Helper: warten bis Postgres erreichbar ist
-# In Docker starten Container parallel. Postgres braucht meist
-# ein paar Sekunden, bis er "ready" ist. Damit der Scraper nicht
-# mit Connection-Errors abbricht, warten wir aktiv mit Retries.
-# ============================================================
-def wait_for_db(max_tries: int = 30, sleep_s: float = 1.0) -> None:
-    """Blockiert bis Postgres erreichbar ist oder wir nach max_tries abbrechen."""
-    for i in range(max_tries):
-        try:
-            with psycopg.connect(
-                host=DB_HOST,
-                port=DB_PORT,
-                dbname=DB_NAME,
-                user=DB_USER,
-                password=DB_PASSWORD,
-            ) as conn:
-                with conn.cursor() as cur:
-                    cur.execute("SELECT 1;")
-            print("[scraper] DB is ready.")
-            return
-        except Exception as e:
-            print(f"[scraper] waiting for DB ({i+1}/{max_tries})... {e}")
-            time.sleep(sleep_s)
-    raise RuntimeError("DB did not become ready in time.")
-
-
+    with metrics.timer("parse_seconds", source=SOURCE, stage="detail"):
+        return r.json()
 
 
 # ============================================================
@@ -114,10 +127,19 @@ def wait_for_db(max_tries: int = 30, sleep_s: float = 1.0) -> None:
 # KVWL liefert Suchergebnisse in Seiten (PageId, PageSize).
 # Wir laufen so lange, bis eine Seite weniger Elemente als
 # page_size enthält (oder gar keine), dann sind wir am Ende.
+# Das Abstract wird mitgeliefert (Ort/PLZ für den Vorfilter, 4c).
+# start_page/on_page: Cursor für das Journal. on_page(nächste Seite,
+# fertig) kommt erst, wenn alle Ids der Seite beim Aufrufer waren.
 # ============================================================
-def iter_doctor_ids(lat: float, lon: float, page_size: int = 20) -> Iterable[str]:
-    """Yieldet KVWL-Arzt-Ids für eine Basis-Position (lat/lon), Seite für Seite."""
-    page_id = 0
+def iter_doctor_abstracts(
+    lat: float,
+    lon: float,
+    page_size: int = 20,
+    start_page: int = 0,
+    on_page: Optional[Callable[[int, bool], None]] = None,
+) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    """Yieldet (Arzt-Id, Abstract) für eine Basis-Position (lat/lon), Seite für Seite."""
+    page_id = start_page
 
     while True:
         payload = {
@@ -141,21 +163,279 @@ def iter_doctor_ids(lat: float, lon: float, page_size: int = 20) -> Iterable[str
         # data["DoctorAbstracts"]["DoctorAbstract"] -> list
         abstracts = (((data.get("DoctorAbstracts") or {}).get("DoctorAbstract")) or [])
         if not abstracts:
+            if on_page is not None:
+                on_page(page_id, True)
             return
 
         for a in abstracts:
             doc_id = a.get("Id")
             if doc_id:
-                yield str(doc_id)
+                yield str(doc_id), a
 
         # Wenn weniger als page_size -> letzte Seite erreicht
-        if len(abstracts) < page_size:
+        last = len(abstracts) < page_size
+        if on_page is not None:
+            on_page(page_id + 1, last)
+        if last:
             return
 
         page_id += 1
-        time.sleep(0.2) # kleine Pause für KVWL Seite
 
 
+# ============================================================
+# 4b) Pipeline: Suche -> Details -> Gruppierung
+# Drei Stufen, verbunden über begrenzte Queues:
+# - Such-Threads paginieren alle Suchpunkte und legen neue Ids in id_queue
+# - Detail-Threads holen getDoctor (Rate über den Host-Limiter) und legen
+#   (doc_id, detail) in detail_queue
+# - der Aufrufer konsumiert detail_queue (Gruppierung/Persistenz)
+#
+# Weil beide Queues begrenzt sind, blockieren schnelle Stufen, sobald
+# die langsamere nicht hinterherkommt -> Speicher bleibt konstant,
+# egal wie viele Ärzte KVWL liefert. Fehler in einem Thread brechen
+# die ganze Pipeline ab und werden im Aufrufer erneut geworfen.
+#
+# Mit journal: Ids, Seiten-Cursor und Details landen im Journal. Beim
+# Fortsetzen starten die Suchpunkte bei ihrer gespeicherten Seite,
+# fertige Punkte entfallen, bekannte Ids werden nicht erneut gemeldet
+# und Ids ohne Detail gehen vorab in die Detail-Queue.
+# ============================================================
+# Ein Limiter für alle KVWL-Calls (Suche + Details), Obergrenze KVWL_RATE
+KVWL_LIMITER = ratelimit.configure_host(urlsplit(SEARCH_URL).netloc, max_rate=KVWL_RATE, burst=KVWL_BURST)
+
+_STOP = object()
+
+
+def iter_kvwl_details(
+    search_points: List[Tuple[float, float]],
+    search_workers: int = KVWL_SEARCH_WORKERS,
+    detail_workers: int = KVWL_WORKERS,
+    queue_size: int = KVWL_QUEUE_SIZE,
+    stats: Optional[search_planner.SearchStats] = None,
+    prefilter: Optional["AbstractPrefilter"] = None,
+    journal: Optional[crawl_journal.CrawlJournal] = None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yieldet (doc_id, detail) für alle Suchpunkte, jede Arzt-Id nur einmal."""
+    search_workers = max(1, search_workers)
+    detail_workers = max(1, detail_workers)
+
+    cursors: Dict[str, Tuple[int, bool]] = journal.cursors() if journal is not None else {}
+    journaled: Dict[str, Tuple[str, str]] = journal.seen_ids() if journal is not None else {}
+
+    point_queue: "queue.Queue[Tuple[float, float]]" = queue.Queue()
+    for point in search_points:
+        if not cursors.get(crawl_journal.point_key(point), (0, False))[1]:
+            point_queue.put(point)
+
+    id_queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+    detail_queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+
+    # damit derselbe Arzt nicht mehrfach geholt wird, wenn er in mehreren Suchen auftaucht
+    seen_doc_ids = set(journaled)
+    seen_lock = threading.Lock()
+    pending_ids = [doc_id for doc_id, (_, status) in journaled.items() if status == "queued"]
+    if stats is not None:
+        for doc_id, (key, status) in journaled.items():
+            lat, lon = (float(v) for v in key.split(","))
+            stats.record_id((lat, lon), doc_id, True)
+
+    abort = threading.Event()
+    errors: List[BaseException] = []
+
+    def put(q: queue.Queue, item: Any) -> bool:
+        while not abort.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q: queue.Queue) -> Any:
+        while not abort.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _STOP
+
+    def fail(e: BaseException) -> None:
+        errors.append(e)
+        abort.set()
+
+    def search_worker() -> None:
+        try:
+            while not abort.is_set():
+                try:
+                    base_lat, base_lon = point_queue.get_nowait()
+                except queue.Empty:
+                    return
+
+                point = (base_lat, base_lon)
+                start_page = cursors.get(crawl_journal.point_key(point), (0, False))[0]
+                on_page = None
+                if journal is not None:
+                    on_page = lambda next_page, done, p=point: journal.record_page(p, next_page, done)
+
+                print(f"[scraper] 🔎 Suche für Punkt lat={base_lat}, lon={base_lon} (ab Seite {start_page})")
+                for doc_id, abstract in iter_doctor_abstracts(
+                    base_lat, base_lon, page_size=KVWL_PAGE_SIZE, start_page=start_page, on_page=on_page
+                ):
+                    with seen_lock:
+                        new = doc_id not in seen_doc_ids
+                        seen_doc_ids.add(doc_id)
+                    if stats is not None:
+                        stats.record_id((base_lat, base_lon), doc_id, new)
+                    if not new:
+                        metrics.inc("kvwl_ids", result="duplicate")
+                        continue
+                    # außerhalb der Stadt -> kein getDoctor
+                    if prefilter is not None and not prefilter.keep(doc_id, abstract):
+                        if stats is not None:
+                            lat, lon, _, _ = abstract_location(abstract)
+                            stats.record_location(doc_id, lat, lon, False)
+                        if journal is not None:
+                            journal.record_id(point, doc_id, "skipped")
+                        continue
+                    metrics.inc("kvwl_ids", result="new")
+                    if journal is not None:
+                        journal.record_id(point, doc_id, "queued")
+                    if not put(id_queue, doc_id):
+                        return
+        except BaseException as e:
+            fail(e)
+
+    def resume_worker() -> None:
+        # Ids aus dem abgebrochenen Lauf, für die noch kein Detail im Journal steht
+        try:
+            for doc_id in pending_ids:
+                if not put(id_queue, doc_id):
+                    return
+        except BaseException as e:
+            fail(e)
+
+    def detail_worker() -> None:
+        try:
+            while True:
+                doc_id = get(id_queue)
+                if doc_id is _STOP:
+                    return
+                detail = kvwl_get_doctor(doc_id)
+                if journal is not None:
+                    journal.record_detail(doc_id, detail)
+                if not put(detail_queue, (doc_id, detail)):
+                    return
+        except BaseException as e:
+            fail(e)
+
+    def start(target, name: str, count: int) -> List[threading.Thread]:
+        threads = [threading.Thread(target=target, name=f"{name}-{i}", daemon=True) for i in range(count)]
+        for t in threads:
+            t.start()
+        return threads
+
+    def close_stages(searchers: List[threading.Thread], fetchers: List[threading.Thread]) -> None:
+        # Stufe für Stufe schließen: erst wenn alle Suchen fertig sind, bekommen
+        # die Detail-Threads ihr Stop-Signal, danach der Konsument.
+        for t in searchers:
+            t.join()
+        for _ in fetchers:
+            put(id_queue, _STOP)
+        for t in fetchers:
+            t.join()
+        put(detail_queue, _STOP)
+
+    searchers = start(search_worker, "kvwl-search", search_workers)
+    if pending_ids:
+        print(f"[scraper] ♻️  {len(pending_ids)} Ids aus dem Journal ohne Detail -> erneut in die Queue")
+        searchers += start(resume_worker, "kvwl-resume", 1)
+    fetchers = start(detail_worker, "kvwl-detail", detail_workers)
+    closer = threading.Thread(target=close_stages, args=(searchers, fetchers), name="kvwl-close", daemon=True)
+    closer.start()
+
+    try:
+        while True:
+            item = get(detail_queue)
+            if item is _STOP:
+                break
+            yield item
+    finally:
+        # Konsument bricht ab (Exception/close) -> alle Stufen beenden
+        abort.set()
+        closer.join()
+
+    if errors:
+        raise errors[0]
+
+
+
+
+# ============================================================
+# 4c) Vorfilter auf Abstract-Ebene
+# Bisher wurde für jede Id getDoctor geladen und erst danach per
+# extract_location + is_in_gelsenkirchen aussortiert. Die Abstracts
+# aus der Suche enthalten (je nach Antwort) schon Ort/PLZ und/oder
+# Koordinaten. Damit fliegen Ärzte außerhalb vor dem Detail-Request raus:
+# - PLZ/Ort vorhanden -> dieselbe Regel wie is_in_gelsenkirchen
+# - nur Koordinaten -> Raster-Index der Stadtgrenze (geo.GridIndex) mit
+#   KVWL_PREFILTER_BUFFER_KM Puffer, damit Praxen direkt an der Grenze
+#   (Geokodierung ungenau) nicht verloren gehen
+# - nichts davon -> behalten (Entscheidung wie bisher nach dem Detail)
+# ============================================================
+KVWL_PREFILTER = os.getenv("KVWL_PREFILTER", "1") == "1"
+KVWL_PREFILTER_BUFFER_KM = float(os.getenv("KVWL_PREFILTER_BUFFER_KM", "0.5"))
+
+
+def _to_float(v: Any) -> Optional[float]:
+    try:
+        return float(str(v).replace(",", "."))
+    except (TypeError, ValueError):
+        return None
+
+
+def abstract_location(abstract: Dict[str, Any]) -> Tuple[Optional[float], Optional[float], str, str]:
+    """
+    (lat, lon, postal, city) aus einem DoctorAbstract, fehlende Werte None/"".
+    Gleiche Struktur wie im getDoctor-Detail (extract_location):
+    Location.PostalCode / Location.City / Location.Coordinates.Latitude|Longitude.
+    Keine geratenen Alternativ-Schlüssel: fehlt die Struktur, landet die Id
+    bei "unknown" (behalten) und print_report warnt. Gegen aufgenommene
+    Suchantworten prüfen: python -m benchmarks.check_kvwl_abstracts --fixtures DIR
+    """
+    lat, lon, _, postal, city = extract_location(abstract)
+    return _to_float(lat), _to_float(lon), postal, city
+
+
+class AbstractPrefilter:
+    def __init__(self, index: Optional[geo.GridIndex]):
+        self.index = index
+        self.counts = {"plz": 0, "coords": 0, "unknown": 0, "dropped": 0}
+        self._lock = threading.Lock()
+
+    def keep(self, doc_id: str, abstract: Dict[str, Any]) -> bool:
+        lat, lon, postal, city = abstract_location(abstract)
+        if postal or city:
+            decision, basis = is_in_gelsenkirchen(city, postal), "plz"
+        elif lat is not None and lon is not None and self.index is not None:
+            decision, basis = self.index.near_city(lat, lon), "coords"
+        else:
+            decision, basis = True, "unknown"
+
+        with self._lock:
+            self.counts[basis] += 1
+            if not decision:
+                self.counts["dropped"] += 1
+        metrics.inc("kvwl_prefilter", basis=basis, result="keep" if decision else "drop")
+        return decision
+
+    def print_report(self, tag: str) -> None:
+        c = self.counts
+        total = c["plz"] + c["coords"] + c["unknown"]
+        print(f"{tag} 🧭 Vorfilter: {c['dropped']} von {total} Ids ohne getDoctor verworfen "
+              f"(PLZ/Ort: {c['plz']}, Koordinaten: {c['coords']}, ohne Ortsangabe: {c['unknown']})")
+        if total and c["unknown"] == total:
+            print(f"{tag} ⚠️  Vorfilter wirkungslos: kein Abstract mit Location -> Struktur der "
+                  f"Suchantwort prüfen (benchmarks/check_kvwl_abstracts.py)")
 
 
 # ============================================================
@@ -245,6 +525,24 @@ def compute_facility_source_key(street: str, postal: str, city: str, lat: Option
     return sha1(raw)
 
 
+# Inhalts-Hashes für den inkrementellen Schreibvorgang:
+# Nur wenn sich der Hash gegenüber der DB ändert, wird die Zeile geschrieben.
+FACILITY_HASH_FIELDS = (
+    "facility_name", "type", "street", "postal_code", "city", "phone",
+    "latitude", "longitude", "wheelchair_accessible",
+)
+DOCTOR_HASH_FIELDS = ("first_name", "last_name", "name", "specialty")
+
+
+def facility_content_hash(fac: Dict[str, Any]) -> str:
+    return sha1("|".join(safe_str(fac[f]) for f in FACILITY_HASH_FIELDS))
+
+
+# facility_key gehört mit in den Hash: wechselt ein Arzt die Praxis, ist das eine Änderung.
+def doctor_content_hash(doctor: Dict[str, Any], facility_key: str) -> str:
+    return sha1("|".join([facility_key] + [safe_str(doctor[f]) for f in DOCTOR_HASH_FIELDS]))
+
+
 
 
 
@@ -262,238 +560,353 @@ def is_in_gelsenkirchen(city: str, postal: str) -> bool:
     return False
 
 
+# Ordnet einen Arzt (Detaildaten) seiner Facility zu.
+# Ärzte außerhalb von Gelsenkirchen werden verworfen (Rückgabe None),
+# sonst kommt der source_key der Facility zurück.
+def add_doctor_to_facilities(
+    facilities: Dict[str, Dict[str, Any]], doc_id: str, detail: Dict[str, Any]
+) -> Optional[str]:
+    lat, lon, street, postal, city = extract_location(detail)
+
+    if not is_in_gelsenkirchen(city, postal):
+        return None
+
+    facility_key = compute_facility_source_key(street, postal, city, lat, lon)
+
+    if facility_key not in facilities:
+        facilities[facility_key] = {
+            "source": SOURCE,
+            "source_key": facility_key,
+            "facility_name": pick_practice_name(detail),
+            "type": pick_type_for_facility(detail),
+            "street": street,
+            "postal_code": postal,
+            "city": city,
+            "phone": pick_phone(detail),
+            "latitude": lat,
+            "longitude": lon,
+            "wheelchair_accessible": pick_wheelchair(detail),
+            "doctors": {},
+        }
+
+    doctor_id = safe_str(detail.get("Id") or doc_id)
+    facilities[facility_key]["doctors"][doctor_id] = {
+        "source": SOURCE,
+        "source_key": doctor_id,
+        "first_name": safe_str(detail.get("FirstName")),
+        "last_name": safe_str(detail.get("LastName")),
+        "name": pick_doctor_name(detail),
+        "specialty": pick_specialty(detail),
+    }
+    return facility_key
+
+
 
 # ============================================================
-# 6) SQL: Facility upsert + Doctors replace
-# - UPSERT_FACILITY_RETURN_ID:
-#   Schreibt facility, wenn (source, source_key) noch nicht existiert,
-#   sonst Update und RETURNING id, damit wir sofort den PK haben.
+# 6) SQL: Facility-Hashes + Doctors diff
+# - SELECT_FACILITY_HASHES:
+#   content_hash je Facility (Spalten siehe bulk_writer.py), damit wir
+#   unveränderte Zeilen erkennen und gar nicht erst schreiben.
+#
+# - Geänderte Facilities schreibt bulk_writer.bulk_upsert_facilities()
+#   per COPY + einem INSERT ... SELECT (liefert source_key -> id).
 #
-# - DELETE_DOCTORS_FOR_FACILITY:
-#   Wir ersetzen die Doctors pro Facility immer komplett.
-#   Das ist simpel und robust, solange die Datenmenge klein/mittel ist.
+# - retention.mark_seen():
+#   Unveränderte Facilities bekommen nur ein neues last_seen_at,
+#   damit der Cleanup (retention.purge_stale) sie nicht als veraltet löscht.
 #
-# - INSERT_DOCTORS:
-#   Bulk Insert per executemany()
+# - Ärzte gleicht bulk_writer.bulk_sync_doctors() in einem Statement ab:
+#   fehlende löschen, neue/geänderte upserten, unveränderte nicht anfassen.
 # ============================================================
 
-UPSERT_FACILITY_RETURN_ID = """
-INSERT INTO facilities
-  (source, source_key, facility_name, type, street, postal_code, city, phone, 
-  latitude, longitude, wheelchair_accessible, last_seen_at)
-VALUES
-  (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s, NOW())
-ON CONFLICT (source, source_key)
-DO UPDATE SET
-  facility_name = EXCLUDED.facility_name,
-  type = EXCLUDED.type,
-  street = EXCLUDED.street,
-  postal_code = EXCLUDED.postal_code,
-  city = EXCLUDED.city,
-  phone = EXCLUDED.phone,
-  latitude = EXCLUDED.latitude,
-  longitude = EXCLUDED.longitude,
-  wheelchair_accessible = EXCLUDED.wheelchair_accessible,
-  last_seen_at = NOW()
-RETURNING id;
-"""
-
-DELETE_DOCTORS_FOR_FACILITY = "DELETE FROM doctors WHERE facility_id = %s;"
-
-INSERT_DOCTORS = """
-INSERT INTO doctors (facility_id, source, source_key, first_name, last_name, name, specialty)
-VALUES (%s, %s, %s, %s, %s, %s, %s);
-"""
+SELECT_FACILITY_HASHES = "SELECT id, source_key, content_hash FROM facilities WHERE source = %s;"
 
 
 
 # ============================================================
-# 7) Main
+# 7) KVWL: Crawl + Persistenz
 # ============================================================
-def main():
-    wait_for_db()
-
-    # mehrere Suchpunkte
-    search_points = [
-        (51.5285024259591, 7.07863180952606), # 45811
-        (51.5074086885497, 7.09422362114849), # 45879
-        (51.5154383889844, 7.05712246590032), # 45883
-        (51.4934186141858, 7.0845770890135),  # 45884
-        (51.4991346811294, 7.11864101982773), # 45886
-        (51.5179268800199, 7.11805545154942), # 45888
-        (51.5376570371888, 7.11022695447703), # 45889
-        (51.5593155331453, 7.08174970144914), # 45891
-        (51.5721755419602, 7.11157055160658), # 45892
-        (51.5826435374217, 7.05658911035039), # 45894
-        (51.6072345927372, 7.02851589356686), # 45896
-        (51.5605660236072, 7.04130812771978), # 45897
-        (51.5397718367201, 7.03043069983145), # 45899
-    ]
 
+# mehrere Suchpunkte
+SEARCH_POINTS = [
+    (51.5285024259591, 7.07863180952606), # 45811
+    (51.5074086885497, 7.09422362114849), # 45879
+    (51.5154383889844, 7.05712246590032), # 45883
+    (51.4934186141858, 7.0845770890135),  # 45884
+    (51.4991346811294, 7.11864101982773), # 45886
+    (51.5179268800199, 7.11805545154942), # 45888
+    (51.5376570371888, 7.11022695447703), # 45889
+    (51.5593155331453, 7.08174970144914), # 45891
+    (51.5721755419602, 7.11157055160658), # 45892
+    (51.5826435374217, 7.05658911035039), # 45894
+    (51.6072345927372, 7.02851589356686), # 45896
+    (51.5605660236072, 7.04130812771978), # 45897
+    (51.5397718367201, 7.03043069983145), # 45899
+]
+
+
+def plan_kvwl_points(boundary) -> List[Tuple[float, float]]:
+    if not KVWL_PLANNER or boundary is None:
+        return SEARCH_POINTS
+    return search_planner.plan_search_points(SOURCE, boundary, SEARCH_POINTS, radius_km=KVWL_SEARCH_RADIUS_KM)
+
+
+def crawl_kvwl(
+    journal: Optional[crawl_journal.CrawlJournal] = None,
+    flush: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    flush: bekommt alle KVWL_FLUSH_EVERY Details die Facilities, die sich
+    seit dem letzten Aufruf geändert haben (Ärzte noch unvollständig).
+    """
     facilities: Dict[str, Dict[str, Any]] = {}
+    dirty: Set[str] = set()
+
+    boundary = search_planner.load_boundary()
+    stats = search_planner.SearchStats(SOURCE, page_size=KVWL_PAGE_SIZE)
+    prefilter = None
+    if KVWL_PREFILTER:
+        index = geo.GridIndex(boundary, buffer_km=KVWL_PREFILTER_BUFFER_KM) if boundary is not None else None
+        prefilter = AbstractPrefilter(index)
+
+    def add(doc_id: str, detail: Dict[str, Any]) -> None:
+        lat, lon, _, postal, city = extract_location(detail)
+        stats.record_location(doc_id, lat, lon, is_in_gelsenkirchen(city, postal))
+        key = add_doctor_to_facilities(facilities, doc_id, detail)
+        if key is not None:
+            dirty.add(key)
+
+    # Suchpunkte: beim Fortsetzen die des abgebrochenen Laufs (Cursor passen dazu)
+    points = plan_kvwl_points(boundary)
+    if journal is not None:
+        points = journal.open_run(points)
+        if journal.resumed:
+            replayed = 0
+            for doc_id, detail in journal.iter_details():
+                add(doc_id, detail)
+                replayed += 1
+            print(f"[scraper] ♻️  Journal: setze abgebrochenen Lauf fort, {replayed} Details ohne Request übernommen")
+
+    # Suche, Detail-Requests und Gruppierung laufen überlappend (siehe 4b)
+    fetched = 0
+    for doc_id, detail in iter_kvwl_details(points, stats=stats, prefilter=prefilter, journal=journal):
+        add(doc_id, detail)
+        fetched += 1
+        if flush is not None and KVWL_FLUSH_EVERY > 0 and fetched % KVWL_FLUSH_EVERY == 0 and dirty:
+            flush([facilities[k] for k in dirty])
+            dirty.clear()
+
+    # Duplikate/Treffer außerhalb pro Suchpunkt -> Grundlage für den nächsten Plan
+    stats.print_report("[scraper]")
+    stats.save(boundary)
+    if prefilter is not None:
+        prefilter.print_report("[scraper]")
 
-    # Optional: damit du nicht denselben Arzt 10x holst, wenn er in mehreren Suchen auftaucht
-    seen_doc_ids = set()
-
-    for base_lat, base_lon in search_points:
-        print(f"[scraper] 🔎 Suche für Punkt lat={base_lat}, lon={base_lon}")
+    print(f"[scraper] Facilities gruppiert: {len(facilities)}")
+    return facilities
+
+
+# Schreibt facilities (Hash-Vergleich, siehe 6). final=False -> Zwischenstand
+# während des Crawls: die Ärzte-Listen sind noch unvollständig, deshalb
+# werden keine fehlenden Ärzte gelöscht. Rückgabe:
+# (Facilities geschrieben, unverändert, Ärzte geschrieben, Ärzte entfernt). Kein commit.
+def write_kvwl_facilities(conn, facilities: List[Dict[str, Any]], final: bool) -> Tuple[int, int, int, int]:
+    # Zwischenstände werden committet -> hier ist noch keine Transaktion offen
+    migrations.ensure_current("[scraper]")
+    with conn.cursor() as cur:
+        # Stand in der DB: Hashes aller KVWL-Facilities
+        cur.execute(SELECT_FACILITY_HASHES, (SOURCE,))
+        existing_facilities = {r["source_key"]: (r["id"], r["content_hash"]) for r in cur.fetchall()}
+
+        facilities_unchanged: List[int] = []
+
+        # 2.1 Facilities nur schreiben, wenn sich der Inhalt geändert hat
+        #     (alle geänderten in einem Bulk-Statement)
+        facility_ids: Dict[str, int] = {}
+        changed: List[Dict[str, Any]] = []
+        for fac in facilities:
+            fac_hash = facility_content_hash(fac)
+            known = existing_facilities.get(fac["source_key"])
+            if known and known[1] == fac_hash:
+                facility_ids[fac["source_key"]] = known[0]
+                facilities_unchanged.append(known[0])
+            else:
+                changed.append({**fac, "content_hash": fac_hash})
+
+        facility_ids.update(bulk_upsert_facilities(conn, changed))
+
+        # 2.2 Ärzte aller Facilities in einem Statement abgleichen
+        doctor_rows = (
+            (
+                facility_ids[fac["source_key"]],
+                d["source"],
+                d["source_key"],
+                d["first_name"],
+                d["last_name"],
+                d["name"],
+                d["specialty"],
+                doctor_content_hash(d, fac["source_key"]),
+            )
+            for fac in facilities
+            for d in fac["doctors"].values()
+        )
+        doctors_removed, doctors_written = bulk_sync_doctors(conn, SOURCE, doctor_rows, delete_missing=final)
 
-        for doc_id in iter_doctor_ids(base_lat, base_lon, page_size=20):
-            if doc_id in seen_doc_ids:
-                continue
-            seen_doc_ids.add(doc_id)
+        # 2.3 unveränderte Facilities nur als "gesehen" markieren
+        retention.mark_seen(cur, facilities_unchanged)
 
-            detail = kvwl_get_doctor(doc_id)
+    return len(changed), len(facilities_unchanged), doctors_written, doctors_removed
 
-            lat, lon, street, postal, city = extract_location(detail)
-            
-            if not is_in_gelsenkirchen(city, postal):
-                continue
-        
-        
-            facility_key = compute_facility_source_key(street, postal, city, lat, lon)
-
-            if facility_key not in facilities:
-                facilities[facility_key] = {
-                    "source": SOURCE,
-                    "source_key": facility_key,
-                    "facility_name": pick_practice_name(detail),
-                    "type": pick_type_for_facility(detail),
-                    "street": street,
-                    "postal_code": postal,
-                    "city": city,
-                    "phone": pick_phone(detail),
-                    "latitude": lat,
-                    "longitude": lon,
-                    "wheelchair_accessible": pick_wheelchair(detail),
-                    "doctors": {},
-                }
-
-            doctor_id = safe_str(detail.get("Id") or doc_id)
-            facilities[facility_key]["doctors"][doctor_id] = {
-                "source": SOURCE,
-                "source_key": doctor_id,
-                "first_name": safe_str(detail.get("FirstName")),
-                "last_name": safe_str(detail.get("LastName")),
-                "name": pick_doctor_name(detail),
-                "specialty": pick_specialty(detail),
-            }
-
-            time.sleep(random.uniform(0.6, 1.2))
-
-        # kleine Pause zwischen Basis-Suchen (optional)
-        time.sleep(0.8)
 
-    print(f"[scraper] Facilities gruppiert: {len(facilities)}")
+def persist_kvwl(conn) -> int:
+    journal = crawl_journal.open_journal(SOURCE)
 
-    # 2) Persist: Facility upsert + Doctors replace (delete + bulk insert)
-    # row_factory=dict_row sorgt dafür, dass fetchone() dicts liefert (cur.fetchone()["id"])
-    with psycopg.connect(
-        host=DB_HOST,
-        port=DB_PORT,
-        dbname=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        row_factory=dict_row,
-    ) as conn:
-        with conn.cursor() as cur:
-            
-            # Cleanup: erst abhängige doctors löschen, dann facilities (FK-Schutz)
-            cur.execute(
-                """
-                WITH doomed AS (
-                    SELECT id
-                    FROM facilities
-                    WHERE source = %s
-                      AND last_seen_at < NOW() - INTERVAL '7 days'
-                )
-                DELETE FROM doctors d
-                USING doomed
-                WHERE d.facility_id = doomed.id;
-                """,
-                (SOURCE,),
-            )
-            doctors_deleted = cur.rowcount
-
-            cur.execute(
-                """
-                DELETE FROM facilities
-                WHERE source = %s
-                  AND last_seen_at < NOW() - INTERVAL '7 days';
-                """,
-                (SOURCE,),
+    def flush(batch: List[Dict[str, Any]]) -> None:
+        with metrics.timer("stage_seconds", source=SOURCE, stage="flush"):
+            written, unchanged, doctors_written, _ = write_kvwl_facilities(conn, batch, final=False)
+            conn.commit()
+        print(f"[scraper] 💾 Zwischenstand: {written} Facilities geschrieben, {unchanged} unverändert, "
+              f"{doctors_written} Doctors")
+
+    try:
+        with metrics.timer("stage_seconds", source=SOURCE, stage="crawl"):
+            facilities = crawl_kvwl(journal, flush)
+
+        # Persist: nur geänderte Facilities/Doctors schreiben (Hash-Vergleich).
+        # Die Connection kommt mit row_factory=dict_row (cur.fetchone()["id"]).
+        # Veraltete Facilities räumt run_source() danach über retention.py ab.
+        with metrics.timer("stage_seconds", source=SOURCE, stage="write"):
+            # vollständiger Abgleich inkl. Löschen fehlender Ärzte
+            facilities_written, facilities_unchanged, doctors_written, doctors_removed = write_kvwl_facilities(
+                conn, list(facilities.values()), final=True
             )
-            facilities_deleted = cur.rowcount
 
-            conn.commit()
-            print(f"[scraper] 🧹 Alte Doctors gelöscht: {doctors_deleted}")
-            print(f"[scraper] 🧹 Alte Facilities gelöscht: {facilities_deleted}")
-            
-            facilities_written = 0
-            doctors_written = 0
-
-            for fac in facilities.values():
-                # 2.1 Facility upsert → facility_id bekommen
-                cur.execute(
-                    UPSERT_FACILITY_RETURN_ID,
-                    (
-                        fac["source"],
-                        fac["source_key"],
-                        fac["facility_name"],
-                        fac["type"],
-                        fac["street"],
-                        fac["postal_code"],
-                        fac["city"],
-                        fac["phone"],
-                        fac["latitude"],
-                        fac["longitude"],
-                        fac["wheelchair_accessible"],
-                    ),
-                )
-                facility_id = cur.fetchone()["id"]
-                facilities_written += 1
-
-                # 2.2 Doctors dieser Facility ersetzen (löschen und neu einfügen)
-                cur.execute(DELETE_DOCTORS_FOR_FACILITY, (facility_id,))
-
-                rows = []
-                for d in fac["doctors"].values():
-                    rows.append(
-                        (
-                            facility_id,
-                            d["source"],
-                            d["source_key"],
-                            d["first_name"],
-                            d["last_name"],
-                            d["name"],
-                            d["specialty"],
-                        )
-                    )
-
-                if rows:
-                    cur.executemany(INSERT_DOCTORS, rows)
-                    doctors_written += len(rows)
-
-            # 2.3 Transaktion abschließen
-            conn.commit()
-            
-            print("[scraper] ✅ KVWL fertig – starte HTML-Quellen...")
+        # erst wenn alles in Postgres steht, ist der Lauf im Journal erledigt
+        conn.commit()
+        if journal is not None:
+            journal.finish()
+    finally:
+        if journal is not None:
+            journal.close()
+
+    print(f"[scraper] ✅ Facilities upserted: {facilities_written} (unverändert: {facilities_unchanged})")
+    print(f"[scraper] ✅ Doctors upserted: {doctors_written} (entfernt: {doctors_removed})")
+    return facilities_written
+
+
+# ============================================================
+# 8) Orchestrator: alle Quellen parallel
+# Die Quellen hängen nicht voneinander ab. Jede läuft in einem
+# eigenen Thread mit eigener Connection und eigener Transaktion:
+# - Erfolg -> commit, Fehler -> rollback, die anderen laufen weiter
+# - pro Quelle wird die Laufzeit gemessen
+# Gesamtlaufzeit = langsamste Quelle statt Summe aller Quellen.
+# ============================================================
+SOURCES: Dict[str, Callable[[Any], int]] = {
+    "kvwl": persist_kvwl,
+    "gelsenkirchen_gesundheitskarte": persist_gelsenkirchen_gesundheitskarte,
+    "aponet_apotheken": persist_aponet_apotheken_gelsenkirchen,
+}
+
+
+def run_source(name: str) -> Tuple[str, bool, int, float]:
+    """Führt eine Quelle isoliert aus. Rückgabe: (name, ok, geschrieben, sekunden)."""
+    job = SOURCES[name]
+    started = time.monotonic()
+    print(f"[scraper] 🌐 Starte Quelle: {name}")
+
+    try:
+        with db.connection(row_factory=dict_row) as conn:
             try:
-                run_html_sources(conn)  # nutzt dieselbe Connection
-                conn.commit()           # commit für HTML-Daten
-            except Exception as e:
-                print(f"[scraper] ❌ HTML-Quellen Fehler: {e}")
-                
+                written = job(conn)
+                # gleiche Transaktion: nur aufräumen, wenn die Quelle durchgelaufen ist
+                with metrics.timer("stage_seconds", source=name, stage="cleanup"):
+                    facilities_deleted, doctors_deleted = retention.purge_stale(conn, name)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    except Exception as e:
+        elapsed = time.monotonic() - started
+        metrics.observe("source_seconds", elapsed, source=name, status="error")
+        print(f"[scraper] ❌ {name} fehlgeschlagen nach {elapsed:.1f}s: {e}")
+        return name, False, 0, elapsed
+
+    elapsed = time.monotonic() - started
+    metrics.observe("source_seconds", elapsed, source=name, status="ok")
+    if facilities_deleted or doctors_deleted:
+        print(f"[scraper] 🧹 {name}: {facilities_deleted} veraltete Facilities entfernt "
+              f"(inkl. {doctors_deleted} Doctors, älter als {retention.retention_days(name):g} Tage)")
+    print(f"[scraper] ✅ {name} fertig: {written} Einträge in {elapsed:.1f}s")
+    return name, True, written, elapsed
+
+
+def run_sources(names: List[str]) -> List[Tuple[str, bool, int, float]]:
+    with ThreadPoolExecutor(max_workers=max(1, len(names)), thread_name_prefix="source") as pool:
+        return list(pool.map(run_source, names))
+
+
+# Kompletter Lauf ohne wait_for_db/Report (auch für benchmarks/bench_scrape_replay):
+# Migrationen, Quellen, danach die Post-Stufen der Reihe nach.
+# Rückgabe: (Ergebnisse je Quelle, [(Stufe, ok, sekunden)]).
+def run_pipeline(
+    names: List[str],
+    tag: str = "[scraper]",
+) -> Tuple[List[Tuple[str, bool, int, float]], List[Tuple[str, bool, float]]]:
+    stages: List[Tuple[str, bool, float]] = []
+
+    def stage(name: str, job: Callable[[], bool]) -> None:
+        started = time.monotonic()
+        ok = job()
+        stages.append((name, ok, time.monotonic() - started))
+
+    # Schema (Spalten, Indizes, district_*) einmal vor allen Quellen,
+    # Fehler brechen den Lauf ab
+    started = time.monotonic()
+    migrations.run_migrations(tag)
+    stages.append(("migrations", True, time.monotonic() - started))
+
+    results = run_sources(names)
+
+    # danach: neue/verschobene Facilities ihrem Stadtteil zuordnen
+    stage("enrich_districts", lambda: enrich_districts.run_enrichment(tag))
+
+    # dieselbe Einrichtung aus mehreren Quellen zusammenführen (facility_clusters)
+    stage("dedupe_facilities", lambda: dedupe_facilities.run_dedupe(tag))
+
+    # räumlichen Index (k nächste Facilities) auf den neuen Stand bringen
+    stage("facility_index", lambda: facility_index.rebuild_index(tag))
+    return results, stages
+
+
+# ============================================================
+# 9) Main
+# Aufruf: python main.py [quelle ...]   (ohne Argument: alle Quellen)
+# ============================================================
+def main():
+    names = sys.argv[1:] or list(SOURCES)
+    unknown = [n for n in names if n not in SOURCES]
+    if unknown:
+        valid = ", ".join(SOURCES)
+        raise ValueError(f"Unbekannte Quelle(n) {unknown}. Erlaubt: {valid}")
+
+    db.wait_for_db("[scraper]")
+
+    started = time.monotonic()
+    results, stages = run_pipeline(names)
 
-        # jetzt sind wir außerhalb der Connection → alles fertig
-        print(f"[scraper] ✅ Facilities upserted: {facilities_written}")
-        print(f"[scraper] ✅ Doctors inserted: {doctors_written}")
-        print("[scraper] ✅ Alles fertig.")
-            
-            
+    print("[scraper] 📊 Zusammenfassung:")
+    for name, ok, written, elapsed in results:
+        status = "ok" if ok else "FEHLER"
+        print(f"[scraper]   {name:<32} {status:<6} {written:>6} Einträge {elapsed:>8.1f}s")
+    print(f"[scraper] ✅ Alles fertig in {time.monotonic() - started:.1f}s.")
 
+    # Zeitverteilung + Report (METRICS_JSON_PATH / METRICS_PROM_PATH)
+    metrics.write_report("scraper", "[scraper]")
 
+    if not all(ok for _, ok, _ in stages) or not all(ok for _, ok, _, _ in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,272 @@
+# metrics.py
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# ============================================================
+# Leichtgewichtige Messwerte für Scraper und Datei-Importer
+# Statt nur print()-Ausgaben sammeln alle Module Zahlen in einer
+# prozessweiten Registry:
+# - Histogramme (Dauer in Sekunden): HTTP-Latenz pro Endpoint,
+#   Parse-Zeit, DB-Statement-Zeit, Schlaf-/Backoff-Zeit, Stages
+# - Zähler: geschriebene Zeilen, Cache-Treffer, Retries, ...
+#
+# Am Ende eines Laufs schreibt write_report():
+# - METRICS_JSON_PATH: JSON-Report (ein Eintrag pro Messreihe)
+# - METRICS_PROM_PATH: Prometheus-Textfile (node_exporter textfile collector)
+# Beide leer (Default) -> nur die Zusammenfassung im Log.
+# ============================================================
+METRICS_JSON_PATH = os.getenv("METRICS_JSON_PATH", "")
+METRICS_PROM_PATH = os.getenv("METRICS_PROM_PATH", "")
+METRICS_PREFIX = "scraper_"
+
+# Bucket-Grenzen in Sekunden (von einzelnen DB-Statements bis zu ganzen Quellen)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, labels: Dict[str, Any]) -> LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # letzter Eintrag = +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.histograms: Dict[LabelKey, Histogram] = {}
+        self.counters: Dict[LabelKey, float] = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram()
+            hist.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def drain(self) -> Tuple[Dict[LabelKey, Histogram], Dict[LabelKey, float]]:
+        """Gibt alle Messwerte zurück und leert die Registry (für Worker-Prozesse)."""
+        with self._lock:
+            data = (self.histograms, self.counters)
+            self.histograms, self.counters = {}, {}
+        return data
+
+    def merge(self, data: Tuple[Dict[LabelKey, Histogram], Dict[LabelKey, float]]) -> None:
+        histograms, counters = data
+        with self._lock:
+            for key, hist in histograms.items():
+                if key in self.histograms:
+                    self.histograms[key].merge(hist)
+                else:
+                    self.histograms[key] = hist
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+
+REGISTRY = Registry()
+
+
+# ============================================================
+# API für die Module
+# ============================================================
+def observe(name: str, value: float, **labels: Any) -> None:
+    REGISTRY.observe(name, value, **labels)
+
+
+def inc(name: str, value: float = 1, **labels: Any) -> None:
+    REGISTRY.inc(name, value, **labels)
+
+
+@contextmanager
+def timer(name: str, **labels: Any) -> Iterator[None]:
+    """Misst die Dauer des with-Blocks (auch wenn er mit Exception endet)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(name, time.perf_counter() - started, **labels)
+
+
+def timed_iter(items: Iterable[Any], name: str, **labels: Any) -> Iterator[Any]:
+    """
+    Reicht items durch und misst nur die Zeit, die im Iterator selbst
+    steckt (z.B. CSV-Parsen), nicht die Zeit beim Verbraucher (COPY).
+    """
+    it = iter(items)
+    total = 0.0
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                total += time.perf_counter() - started
+            yield item
+    finally:
+        REGISTRY.observe(name, total, **labels)
+
+
+def sleep(seconds: float, reason: str) -> None:
+    """time.sleep mit Messung, damit Pausen/Backoff im Report sichtbar sind."""
+    if seconds <= 0:
+        return
+    time.sleep(seconds)
+    REGISTRY.observe("sleep_seconds", seconds, reason=reason)
+
+
+async def sleep_async(seconds: float, reason: str) -> None:
+    """asyncio-Gegenstück zu sleep()."""
+    if seconds <= 0:
+        return
+    await asyncio.sleep(seconds)
+    REGISTRY.observe("sleep_seconds", seconds, reason=reason)
+
+
+# ============================================================
+# Report
+# ============================================================
+def snapshot(job: str) -> Dict[str, Any]:
+    with REGISTRY._lock:
+        histograms = [
+            {
+                "name": name,
+                "labels": dict(labels),
+                "count": h.count,
+                "sum": round(h.sum, 6),
+                "min": round(h.min, 6) if h.count else None,
+                "max": round(h.max, 6),
+                "mean": round(h.sum / h.count, 6) if h.count else None,
+                "buckets": {str(le): c for le, c in zip(list(h.buckets) + ["+Inf"], h.counts)},
+            }
+            for (name, labels), h in sorted(REGISTRY.histograms.items())
+        ]
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in sorted(REGISTRY.counters.items())
+        ]
+
+    return {
+        "job": job,
+        "started_at": REGISTRY.started_at,
+        "finished_at": time.time(),
+        "histograms": histograms,
+        "counters": counters,
+    }
+
+
+def _prom_labels(labels: Dict[str, str], extra: Optional[Dict[str, str]] = None) -> str:
+    merged = {**labels, **(extra or {})}
+    if not merged:
+        return ""
+    parts = []
+    for k, v in merged.items():
+        v = v.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def to_prometheus(report: Dict[str, Any]) -> str:
+    lines: List[str] = []
+    job = {"pipeline": report["job"]}
+    typed = set()
+
+    for h in report["histograms"]:
+        name = METRICS_PREFIX + h["name"]
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for le, c in h["buckets"].items():
+            cumulative += c
+            lines.append(f"{name}_bucket{_prom_labels({**job, **h['labels']}, {'le': le})} {cumulative}")
+        lines.append(f"{name}_sum{_prom_labels({**job, **h['labels']})} {h['sum']}")
+        lines.append(f"{name}_count{_prom_labels({**job, **h['labels']})} {h['count']}")
+
+    for c in report["counters"]:
+        name = METRICS_PREFIX + c["name"] + "_total"
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_prom_labels({**job, **c['labels']})} {c['value']}")
+
+    name = METRICS_PREFIX + "last_run_timestamp_seconds"
+    lines.append(f"# TYPE {name} gauge")
+    lines.append(f"{name}{_prom_labels(job)} {report['finished_at']:.0f}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)  # node_exporter soll nie eine halbe Datei lesen
+
+
+def print_summary(tag: str, top: int = 10) -> None:
+    """Wohin ist die Zeit gegangen? Die Messreihen mit der größten Summe."""
+    with REGISTRY._lock:
+        items = sorted(REGISTRY.histograms.items(), key=lambda kv: kv[1].sum, reverse=True)[:top]
+    if not items:
+        return
+    print(f"{tag} ⏱️  Zeitverteilung (Top {len(items)}):")
+    for (name, labels), h in items:
+        label_str = ",".join(f"{k}={v}" for k, v in labels)
+        print(f"{tag}   {name:<24} {label_str:<60} n={h.count:<6} sum={h.sum:>8.2f}s max={h.max:>7.3f}s")
+
+
+def write_report(job: str, tag: str) -> None:
+    print_summary(tag)
+    if not (METRICS_JSON_PATH or METRICS_PROM_PATH):
+        return
+
+    report = snapshot(job)
+    if METRICS_JSON_PATH:
+        _write_atomic(METRICS_JSON_PATH, json.dumps(report, ensure_ascii=False, indent=2))
+        print(f"{tag} 📈 Metriken (JSON): {METRICS_JSON_PATH}")
+    if METRICS_PROM_PATH:
+        _write_atomic(METRICS_PROM_PATH, to_prometheus(report))
+        print(f"{tag} 📈 Metriken (Prometheus): {METRICS_PROM_PATH}")
@@ -0,0 +1,446 @@
+# migrations.py
+import argparse
+import datetime
+import os
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+from psycopg.rows import tuple_row
+
+import db
+
+
+# ============================================================
+# Versioniertes Schema für alles, was die Python-Loader anlegen
+# Bisher: CREATE TABLE IF NOT EXISTS in den Quell-Modulen (district_population,
+# district_unemployment) bei jedem Lauf, keine Versionierung und keine
+# Indizes auf den Pfaden, die jeder Lauf nimmt (Stale-Cleanup, Doctors je
+# Facility, Filter nach type) -> Seq Scans, die mit den Daten wachsen.
+#
+# migrate() läuft beim Start von Scraper und Datei-Importer:
+# - schema_migrations merkt sich die angewendeten Versionen
+# - pg_advisory_lock: parallel startende Container warten aufeinander
+# - jede Migration in eigener Transaktion, danach commit
+#
+# facilities/doctors gehören dem Backend (Hibernate, ddl-auto=update).
+# Migrationen mit requires warten, bis diese Tabellen existieren, und
+# werden bis dahin nicht eingetragen. Der Scraper wartet nur auf
+# "service_started" des Backends, auf einer frischen DB fehlen die
+# Tabellen beim Start also evtl. noch -> jede Quelle ruft vor ihrem
+# ersten Schreiben ensure_current() auf und holt offene Migrationen nach.
+# Die Partitionierung der district_*-Tabellen ist optional
+# (SCHEMA_PARTITION_DISTRICTS=1), ohne Flag bleibt sie offen.
+# ============================================================
+SCHEMA_PARTITION_DISTRICTS = os.getenv("SCHEMA_PARTITION_DISTRICTS", "0") == "1"
+
+# beliebige, feste Nummer für pg_advisory_lock
+MIGRATIONS_LOCK_KEY = 47112025
+
+CREATE_MIGRATIONS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+  version INT PRIMARY KEY,
+  name TEXT NOT NULL,
+  applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+"""
+
+
+# ============================================================
+# Migrationen (nur anhängen, nie nachträglich ändern)
+# ============================================================
+CREATE_DISTRICT_POPULATION_SQL = """
+CREATE TABLE IF NOT EXISTS district_population (
+  id BIGSERIAL PRIMARY KEY,
+
+  stichtag DATE NOT NULL,
+
+  stadtbezirk_id INT,
+  stadtbezirk_name TEXT,
+
+  stadtteil_id INT NOT NULL,
+  stadtteil_name TEXT NOT NULL,
+
+  deutsch INT,
+  deutsch_mit_2_sta INT,
+  nichtdeutsch INT,
+
+  gesamt INT GENERATED ALWAYS AS (
+    COALESCE(deutsch,0) + COALESCE(nichtdeutsch,0)
+  ) STORED,
+
+  UNIQUE (stichtag, stadtteil_id)
+);
+"""
+
+CREATE_DISTRICT_UNEMPLOYMENT_SQL = """
+CREATE TABLE IF NOT EXISTS district_unemployment (
+    id BIGSERIAL PRIMARY KEY,
+    stichtag DATE NOT NULL,
+    stadtteil_id INTEGER NOT NULL,
+    stadtteil_name VARCHAR(255) NOT NULL,
+    arbeitslosenanteil NUMERIC(6,2),
+    arbeitslosenanteil_maennlich NUMERIC(6,2),
+    arbeitslosenanteil_weiblich NUMERIC(6,2),
+    arbeitslosenanteil_deutsch NUMERIC(6,2),
+    arbeitslosenanteil_nichtdeutsch NUMERIC(6,2),
+    jugendarbeitslosigkeit_u25 NUMERIC(6,2),
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    CONSTRAINT uq_district_unemployment UNIQUE (stichtag, stadtteil_id)
+);
+CREATE INDEX IF NOT EXISTS idx_district_unemployment_stichtag
+ON district_unemployment (stichtag);
+"""
+
+# content_hash je Facility/Doctor, damit Quellen unveränderte Zeilen
+# erkennen und gar nicht erst schreiben (weniger WAL/Dead Tuples).
+ADD_CONTENT_HASH_COLUMNS_SQL = """
+ALTER TABLE facilities ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE doctors ADD COLUMN IF NOT EXISTS content_hash TEXT;
+"""
+
+# - Stale-Cleanup: WHERE source = ? AND last_seen_at < ? -> SELECT id
+#   (INCLUDE id: Index-Only-Scan, kein Heap-Zugriff für die Kandidaten)
+# - Doctors einer Facility (Cleanup, SYNC_DOCTORS_SQL): doctors.facility_id
+#   hat zwar einen FK, Postgres legt dafür aber keinen Index an
+# - Backend/Frontend filtern Facilities nach type
+CREATE_ACCESS_PATH_INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS idx_facilities_source_last_seen_at
+ON facilities (source, last_seen_at) INCLUDE (id);
+CREATE INDEX IF NOT EXISTS idx_doctors_facility_id ON doctors (facility_id);
+CREATE INDEX IF NOT EXISTS idx_facilities_type ON facilities (type);
+"""
+
+
+# ============================================================
+# Tabellen/Views der Post-Stufen (enrich_districts, dedupe_facilities,
+# osrm_matrix). Alle hängen per FK an facilities -> requires facilities.
+# ============================================================
+CREATE_FACILITY_DISTRICT_SQL = """
+CREATE TABLE IF NOT EXISTS facility_district (
+  facility_id BIGINT PRIMARY KEY REFERENCES facilities(id) ON DELETE CASCADE,
+  stadtteil_id INT,
+  stadtteil_name TEXT,
+  latitude DOUBLE PRECISION,
+  longitude DOUBLE PRECISION,
+  assigned_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_facility_district_stadtteil_id ON facility_district (stadtteil_id);
+CREATE INDEX IF NOT EXISTS idx_facility_district_stadtteil_name ON facility_district (stadtteil_name);
+"""
+
+# Facilities je Stadtteil und Typ, bezogen auf den letzten Bevölkerungs-Stichtag
+CREATE_DISTRICT_FACILITY_DENSITY_VIEW_SQL = """
+CREATE OR REPLACE VIEW district_facility_density AS
+WITH latest_population AS (
+  SELECT DISTINCT ON (stadtteil_id) stadtteil_id, stadtteil_name, stichtag, gesamt
+  FROM district_population
+  ORDER BY stadtteil_id, stichtag DESC
+)
+SELECT
+  p.stadtteil_id,
+  p.stadtteil_name,
+  f.type,
+  COUNT(f.id) AS facilities,
+  p.gesamt AS einwohner,
+  p.stichtag,
+  ROUND(COUNT(f.id) * 1000.0 / NULLIF(p.gesamt, 0), 3) AS facilities_per_1000
+FROM latest_population p
+JOIN facility_district fd ON fd.stadtteil_id = p.stadtteil_id
+JOIN facilities f ON f.id = fd.facility_id
+GROUP BY p.stadtteil_id, p.stadtteil_name, f.type, p.gesamt, p.stichtag;
+"""
+
+CREATE_FACILITY_CLUSTERS_SQL = """
+CREATE TABLE IF NOT EXISTS facility_clusters (
+  facility_id BIGINT PRIMARY KEY REFERENCES facilities(id) ON DELETE CASCADE,
+  canonical_id BIGINT NOT NULL,
+  cluster_size INT NOT NULL,
+  match_score DOUBLE PRECISION,
+  assigned_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_facility_clusters_canonical_id ON facility_clusters (canonical_id);
+"""
+
+# eine Zeile pro realer Einrichtung; Facilities ohne Cluster-Zeile (neu seit
+# dem letzten Lauf) zählen als eigener Cluster
+CREATE_CANONICAL_FACILITIES_VIEW_SQL = """
+CREATE OR REPLACE VIEW canonical_facilities AS
+SELECT f.*, COALESCE(c.cluster_size, 1) AS cluster_size
+FROM facilities f
+LEFT JOIN facility_clusters c ON c.facility_id = f.id
+WHERE c.facility_id IS NULL OR c.canonical_id = f.id;
+"""
+
+CREATE_TRAVEL_TIME_MATRIX_SQL = """
+CREATE TABLE IF NOT EXISTS travel_time_matrix (
+  profile TEXT NOT NULL,
+  origin_kind TEXT NOT NULL,
+  origin_key TEXT NOT NULL,
+  stadtteil_name TEXT,
+  origin_lat DOUBLE PRECISION NOT NULL,
+  origin_lon DOUBLE PRECISION NOT NULL,
+  facility_id BIGINT NOT NULL REFERENCES facilities(id) ON DELETE CASCADE,
+  facility_type TEXT NOT NULL,
+  duration_s DOUBLE PRECISION,
+  distance_m DOUBLE PRECISION,
+  computed_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (profile, origin_kind, origin_key, facility_id)
+);
+CREATE INDEX IF NOT EXISTS idx_travel_time_matrix_lookup
+  ON travel_time_matrix (profile, origin_kind, facility_type, origin_key, duration_s);
+CREATE INDEX IF NOT EXISTS idx_travel_time_matrix_facility ON travel_time_matrix (facility_id);
+"""
+
+# NULL-Dauer = von OSRM nicht erreichbar (kein Straßennetz dazwischen)
+CREATE_NEAREST_FACILITY_VIEW_SQL = """
+CREATE OR REPLACE VIEW nearest_facility_by_origin AS
+SELECT DISTINCT ON (profile, origin_kind, origin_key, facility_type)
+  profile, origin_kind, origin_key, stadtteil_name, facility_type,
+  facility_id, duration_s, distance_m, computed_at
+FROM travel_time_matrix
+WHERE duration_s IS NOT NULL
+ORDER BY profile, origin_kind, origin_key, facility_type, duration_s;
+"""
+
+
+# ============================================================
+# Optional: district_* nach stichtag partitionieren (RANGE, ein Jahr
+# pro Partition + DEFAULT). Abfragen per findByStichtag lesen dann nur
+# eine Partition. Postgres verlangt den Partitionsschlüssel in jedem
+# PK/UNIQUE: PK wird (id, stichtag), UNIQUE (stichtag, stadtteil_id)
+# passt bereits; Hibernate (@Id id) kommt damit zurecht.
+# Die View district_facility_density hängt an district_population und
+# fällt beim Umbau weg -> wird danach neu angelegt, sofern
+# facility_district (Migration 7) schon existiert.
+# ============================================================
+PARTITIONED_DISTRICT_POPULATION_SQL = """
+CREATE TABLE district_population (
+  id BIGSERIAL,
+  stichtag DATE NOT NULL,
+  stadtbezirk_id INT,
+  stadtbezirk_name TEXT,
+  stadtteil_id INT NOT NULL,
+  stadtteil_name TEXT NOT NULL,
+  deutsch INT,
+  deutsch_mit_2_sta INT,
+  nichtdeutsch INT,
+  gesamt INT GENERATED ALWAYS AS (
+    COALESCE(deutsch,0) + COALESCE(nichtdeutsch,0)
+  ) STORED,
+  PRIMARY KEY (id, stichtag),
+  UNIQUE (stichtag, stadtteil_id)
+) PARTITION BY RANGE (stichtag);
+"""
+
+PARTITIONED_DISTRICT_UNEMPLOYMENT_SQL = """
+CREATE TABLE district_unemployment (
+    id BIGSERIAL,
+    stichtag DATE NOT NULL,
+    stadtteil_id INTEGER NOT NULL,
+    stadtteil_name VARCHAR(255) NOT NULL,
+    arbeitslosenanteil NUMERIC(6,2),
+    arbeitslosenanteil_maennlich NUMERIC(6,2),
+    arbeitslosenanteil_weiblich NUMERIC(6,2),
+    arbeitslosenanteil_deutsch NUMERIC(6,2),
+    arbeitslosenanteil_nichtdeutsch NUMERIC(6,2),
+    jugendarbeitslosigkeit_u25 NUMERIC(6,2),
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, stichtag),
+    CONSTRAINT uq_district_unemployment UNIQUE (stichtag, stadtteil_id)
+) PARTITION BY RANGE (stichtag);
+CREATE INDEX IF NOT EXISTS idx_district_unemployment_stichtag
+ON district_unemployment (stichtag);
+"""
+
+# Tabelle -> (DDL der partitionierten Tabelle, zu übernehmende Spalten)
+PARTITIONED_DISTRICT_TABLES: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    "district_population": (
+        PARTITIONED_DISTRICT_POPULATION_SQL,
+        ("id", "stichtag", "stadtbezirk_id", "stadtbezirk_name", "stadtteil_id", "stadtteil_name",
+         "deutsch", "deutsch_mit_2_sta", "nichtdeutsch"),
+    ),
+    "district_unemployment": (
+        PARTITIONED_DISTRICT_UNEMPLOYMENT_SQL,
+        ("id", "stichtag", "stadtteil_id", "stadtteil_name", "arbeitslosenanteil",
+         "arbeitslosenanteil_maennlich", "arbeitslosenanteil_weiblich", "arbeitslosenanteil_deutsch",
+         "arbeitslosenanteil_nichtdeutsch", "jugendarbeitslosigkeit_u25", "created_at", "updated_at"),
+    ),
+}
+
+
+def _is_partitioned(cur, table: str) -> bool:
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s);", (table,))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def partition_district_tables(cur) -> None:
+    """Baut district_population/-unemployment als nach stichtag partitionierte Tabellen neu auf."""
+    this_year = datetime.date.today().year
+    for table, (create_sql, columns) in PARTITIONED_DISTRICT_TABLES.items():
+        if _is_partitioned(cur, table):
+            continue
+
+        # bestehende Zeilen zwischenparken (wenige hundert pro Stichtag)
+        cur.execute(f"CREATE TEMP TABLE {table}_copy ON COMMIT DROP AS SELECT * FROM {table};")
+        cur.execute(f"DROP TABLE {table} CASCADE;")
+        cur.execute(create_sql)
+
+        cur.execute(f"SELECT DISTINCT EXTRACT(YEAR FROM stichtag)::int FROM {table}_copy;")
+        years = {row[0] for row in cur.fetchall()} | {this_year, this_year + 1}
+        for year in sorted(years):
+            cur.execute(
+                f"CREATE TABLE {table}_{year} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01');"
+            )
+        # spätere Stichtage landen ohne neue Migration in der DEFAULT-Partition
+        cur.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT;")
+
+        cols = ", ".join(columns)
+        cur.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {table}_copy;")
+        cur.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {table};"
+        )
+
+    if not _missing_tables(cur, ("facility_district",)):
+        cur.execute(CREATE_DISTRICT_FACILITY_DENSITY_VIEW_SQL)
+
+
+# (version, name, SQL oder Funktion(cur), benötigte Backend-Tabellen, aktiv)
+Migration = Tuple[int, str, Union[str, Callable[..., None]], Sequence[str], bool]
+
+MIGRATIONS: List[Migration] = [
+    (1, "district_population", CREATE_DISTRICT_POPULATION_SQL, (), True),
+    (2, "district_unemployment", CREATE_DISTRICT_UNEMPLOYMENT_SQL, (), True),
+    (3, "content_hash_columns", ADD_CONTENT_HASH_COLUMNS_SQL, ("facilities", "doctors"), True),
+    (4, "access_path_indexes", CREATE_ACCESS_PATH_INDEXES_SQL, ("facilities", "doctors"), True),
+    (5, "partition_district_tables", partition_district_tables, (), SCHEMA_PARTITION_DISTRICTS),
+    # 6 entfallen (backfill_last_seen_at), Nummer nicht wiederverwenden
+    (7, "facility_district", CREATE_FACILITY_DISTRICT_SQL + CREATE_DISTRICT_FACILITY_DENSITY_VIEW_SQL, ("facilities",), True),
+    (8, "facility_clusters", CREATE_FACILITY_CLUSTERS_SQL + CREATE_CANONICAL_FACILITIES_VIEW_SQL, ("facilities",), True),
+    (9, "travel_time_matrix", CREATE_TRAVEL_TIME_MATRIX_SQL + CREATE_NEAREST_FACILITY_VIEW_SQL, ("facilities",), True),
+]
+
+
+# ============================================================
+# Anwenden
+# ============================================================
+def applied_versions(conn) -> Dict[int, str]:
+    with conn.cursor(row_factory=tuple_row) as cur:
+        cur.execute(CREATE_MIGRATIONS_TABLE_SQL)
+        cur.execute("SELECT version, name FROM schema_migrations;")
+        return {version: name for version, name in cur.fetchall()}
+
+
+def _missing_tables(cur, tables: Sequence[str]) -> List[str]:
+    missing = []
+    for table in tables:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (table,))
+        if not cur.fetchone()[0]:
+            missing.append(table)
+    return missing
+
+
+def migrate(conn, tag: str = "[migrations]") -> int:
+    """Wendet alle offenen, aktiven Migrationen an (commit je Migration). Rückgabe: Anzahl angewendet."""
+    applied = 0
+    with conn.cursor(row_factory=tuple_row) as lock_cur:
+        lock_cur.execute("SELECT pg_advisory_lock(%s);", (MIGRATIONS_LOCK_KEY,))
+    conn.commit()
+    try:
+        done = applied_versions(conn)
+        conn.commit()
+
+        for version, name, step, requires, enabled in MIGRATIONS:
+            if version in done or not enabled:
+                continue
+            try:
+                with conn.cursor(row_factory=tuple_row) as cur:
+                    missing = _missing_tables(cur, requires)
+                    if missing:
+                        print(f"{tag} ⏳ Migration {version} ({name}) wartet auf {', '.join(missing)} (Backend)")
+                        conn.rollback()
+                        continue
+                    if callable(step):
+                        step(cur)
+                    else:
+                        cur.execute(step)
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s);", (version, name)
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied += 1
+            print(f"{tag} 🧱 Migration {version} ({name}) angewendet")
+    finally:
+        with conn.cursor(row_factory=tuple_row) as lock_cur:
+            lock_cur.execute("SELECT pg_advisory_unlock(%s);", (MIGRATIONS_LOCK_KEY,))
+        conn.commit()
+    return applied
+
+
+# einmal vollständig migriert -> ensure_current() ist danach ein No-op
+_current = False
+_current_lock = threading.Lock()
+
+
+def _migrate_pending(tag: str) -> List[str]:
+    """Migriert über eine eigene Connection. Rückgabe: Namen weiterhin offener, aktiver Migrationen."""
+    global _current
+    with db.connect() as conn:
+        migrate(conn, tag)
+        done = applied_versions(conn)
+        conn.commit()
+    pending = [name for version, name, _, _, enabled in MIGRATIONS if enabled and version not in done]
+    _current = not pending
+    return pending
+
+
+def run_migrations(tag: str) -> None:
+    """Beim Start. Fehler brechen ab, auf Backend-Tabellen wartende Migrationen nicht."""
+    with _current_lock:
+        _migrate_pending(tag)
+
+
+def ensure_current(tag: str, strict: bool = True) -> None:
+    """
+    Vor dem ersten Schreiben einer Quelle: offene Migrationen nachholen
+    (z.B. content_hash, falls das Backend facilities erst nach dem Start
+    angelegt hat). Aufrufen, solange die eigene Transaktion noch keine
+    Locks auf facilities/doctors hält, sonst wartet das ALTER TABLE auf uns.
+    strict=False (Post-Stufen): offene Migrationen sind kein Fehler, die
+    Stufe prüft selbst, ob facilities schon existiert.
+    """
+    if _current:
+        return
+    with _current_lock:
+        if _current:
+            return
+        pending = _migrate_pending(tag)
+    if pending and strict:
+        raise RuntimeError(f"Schema nicht bereit, offene Migrationen: {', '.join(pending)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema-Migrationen der Python-Loader anwenden.")
+    parser.add_argument("--status", action="store_true", help="nur anzeigen, nichts anwenden")
+    args = parser.parse_args()
+
+    db.wait_for_db("[migrations]")
+    if not args.status:
+        run_migrations("[migrations]")
+
+    with db.connect() as conn:
+        done = applied_versions(conn)
+        conn.commit()
+    for version, name, _, _, enabled in MIGRATIONS:
+        state = "angewendet" if version in done else ("offen" if enabled else "deaktiviert")
+        print(f"[migrations]   {version:>3} {name:<28} {state}")
+
+
+if __name__ == "__main__":
+    main()
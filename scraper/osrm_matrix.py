@@ -0,0 +1,284 @@
+# osrm_matrix.py
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+import db
+import geo
+import http_client
+import metrics
+import migrations
+import ratelimit
+from bulk_writer import copy_rows
+from psycopg.rows import tuple_row
+
+
+# ============================================================
+# Reisezeit-Matrix über OSRM /table
+# RoutingService.route() fragt OSRM pro Nutzeranfrage einmal /route
+# (ein Start, ein Ziel). Für Erreichbarkeits-Auswertungen ("nächste
+# Apotheke je Stadtteil") rechnet dieser Job alles einmal vor:
+#
+# - Start-Punkte: Flächenschwerpunkt je Stadtteil (origin_kind=district)
+#   oder Rasterzellen im Stadtgebiet (origin_kind=grid, MATRIX_GRID_KM)
+# - Ziele: alle facilities mit Koordinaten (optional nur --types)
+# - OSRM /table in Blöcken (OSRM_SOURCES_CHUNK x OSRM_DESTINATIONS_CHUNK,
+#   zusammen <= --max-table-size von osrm-routed, Default 100),
+#   OSRM_CONCURRENCY Blöcke parallel
+# - Ergebnis per COPY in eine Staging-Tabelle und ein Statement in
+#   travel_time_matrix (veraltete Paare desselben Laufs-Umfangs fliegen raus)
+#
+# Abfragen sind danach reine Lookups, z.B. über die View
+# nearest_facility_by_origin (nächste Facility je Start-Punkt und Typ).
+# Start: docker compose run --rm travel-matrix [--origins grid] [--types APOTHEKE]
+# ============================================================
+OSRM_URL = os.getenv("OSRM_URL", "http://osrm-routing:5000").rstrip("/")
+OSRM_PROFILE = os.getenv("OSRM_PROFILE", "driving")
+OSRM_SOURCES_CHUNK = int(os.getenv("OSRM_SOURCES_CHUNK", "20"))
+OSRM_DESTINATIONS_CHUNK = int(os.getenv("OSRM_DESTINATIONS_CHUNK", "80"))
+OSRM_CONCURRENCY = int(os.getenv("OSRM_CONCURRENCY", "4"))
+OSRM_MAX_RATE = float(os.getenv("OSRM_MAX_RATE", "50"))  # eigener Container -> kein Hochfahren nötig
+MATRIX_GRID_KM = float(os.getenv("MATRIX_GRID_KM", "1.0"))
+
+ORIGIN_KINDS = ("district", "grid")
+
+Origin = Tuple[str, Optional[str], float, float]  # (origin_key, stadtteil_name, lat, lon)
+Destination = Tuple[int, str, float, float]       # (facility_id, type, lat, lon)
+
+CREATE_STAGE_SQL = """
+DROP TABLE IF EXISTS pg_temp.travel_time_matrix_stage;
+CREATE TEMP TABLE travel_time_matrix_stage (
+  origin_key TEXT NOT NULL,
+  stadtteil_name TEXT,
+  origin_lat DOUBLE PRECISION NOT NULL,
+  origin_lon DOUBLE PRECISION NOT NULL,
+  facility_id BIGINT NOT NULL,
+  facility_type TEXT NOT NULL,
+  duration_s DOUBLE PRECISION,
+  distance_m DOUBLE PRECISION
+) ON COMMIT DROP;
+"""
+
+STAGE_COLUMNS = (
+    "origin_key", "stadtteil_name", "origin_lat", "origin_lon",
+    "facility_id", "facility_type", "duration_s", "distance_m",
+)
+
+SELECT_DESTINATIONS_SQL = """
+SELECT id, type, latitude, longitude
+FROM facilities
+WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+  AND (%(types)s::text[] IS NULL OR type = ANY(%(types)s))
+ORDER BY id;
+"""
+
+# Ein Statement: Paare, die dieser Lauf (profile, origin_kind, types) nicht
+# mehr liefert, löschen und den Rest upserten. Beide Teile sehen denselben
+# Snapshot und fassen disjunkte Zeilen an.
+MERGE_SQL = """
+WITH removed AS (
+  DELETE FROM travel_time_matrix t
+  WHERE t.profile = %(profile)s
+    AND t.origin_kind = %(origin_kind)s
+    AND (%(types)s::text[] IS NULL OR t.facility_type = ANY(%(types)s))
+    AND NOT EXISTS (
+      SELECT 1 FROM travel_time_matrix_stage s
+      WHERE s.origin_key = t.origin_key AND s.facility_id = t.facility_id
+    )
+  RETURNING 1
+)
+INSERT INTO travel_time_matrix (
+  profile, origin_kind, origin_key, stadtteil_name, origin_lat, origin_lon,
+  facility_id, facility_type, duration_s, distance_m, computed_at
+)
+SELECT
+  %(profile)s, %(origin_kind)s, s.origin_key, s.stadtteil_name, s.origin_lat, s.origin_lon,
+  s.facility_id, s.facility_type, s.duration_s, s.distance_m, NOW()
+FROM travel_time_matrix_stage s
+JOIN facilities f ON f.id = s.facility_id
+ON CONFLICT (profile, origin_kind, origin_key, facility_id)
+DO UPDATE SET
+  stadtteil_name = EXCLUDED.stadtteil_name,
+  origin_lat = EXCLUDED.origin_lat,
+  origin_lon = EXCLUDED.origin_lon,
+  facility_type = EXCLUDED.facility_type,
+  duration_s = EXCLUDED.duration_s,
+  distance_m = EXCLUDED.distance_m,
+  computed_at = NOW();
+"""
+
+
+# ============================================================
+# Start-Punkte
+# ============================================================
+def district_origins(boundary: geo.CityBoundary) -> List[Origin]:
+    """Ein Punkt pro Stadtteil (Flächenschwerpunkt, OSRM snappt auf die nächste Straße)."""
+    origins = []
+    for d in boundary.districts:
+        lat, lon = d.centroid()
+        origins.append((d.name, d.name, lat, lon))
+    return origins
+
+
+def grid_origins(boundary: geo.CityBoundary, step_km: float = MATRIX_GRID_KM) -> List[Origin]:
+    """Rasterzellen im Stadtgebiet; Key = Zellmitte, Stadtteil per Punkt-in-Polygon."""
+    return [
+        (f"{lat:.5f},{lon:.5f}", boundary.district_of(lat, lon), lat, lon)
+        for lat, lon in geo.grid_points_inside(boundary, step_km)
+    ]
+
+
+def load_origins(kind: str, boundary: geo.CityBoundary) -> List[Origin]:
+    if kind == "district":
+        return district_origins(boundary)
+    if kind == "grid":
+        return grid_origins(boundary)
+    raise ValueError(f"Unbekannte origin_kind: {kind}")
+
+
+# ============================================================
+# OSRM /table
+# ============================================================
+def _chunks(items: Sequence[Any], size: int) -> List[Sequence[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), max(1, size))]
+
+
+def fetch_table(
+    origins: Sequence[Origin],
+    destinations: Sequence[Destination],
+    base_url: str = OSRM_URL,
+    profile: str = OSRM_PROFILE,
+) -> Tuple[List[List[Optional[float]]], List[List[Optional[float]]]]:
+    """Ein /table-Request: (durations, distances) als [origin][destination]."""
+    coords = ";".join(
+        f"{lon:.6f},{lat:.6f}"
+        for lat, lon in [(o[2], o[3]) for o in origins] + [(d[2], d[3]) for d in destinations]
+    )
+    n = len(origins)
+    params = {
+        "sources": ";".join(str(i) for i in range(n)),
+        "destinations": ";".join(str(n + j) for j in range(len(destinations))),
+        "annotations": "duration,distance",
+    }
+    resp = http_client.get(f"{base_url}/table/v1/{profile}/{coords}", params=params)
+    data = resp.json() if resp.headers.get("Content-Type", "").startswith("application/json") else {}
+    if resp.status_code != 200 or data.get("code") != "Ok":
+        raise RuntimeError(f"OSRM /table fehlgeschlagen ({resp.status_code}): {data.get('message') or resp.text[:200]}")
+    return data["durations"], data["distances"]
+
+
+def compute_matrix(
+    origins: Sequence[Origin],
+    destinations: Sequence[Destination],
+    concurrency: int = OSRM_CONCURRENCY,
+) -> Iterator[Tuple[Any, ...]]:
+    """
+    Zerlegt origins x destinations in Blöcke, fragt OSRM_CONCURRENCY Blöcke
+    parallel ab und liefert Zeilen in STAGE_COLUMNS-Reihenfolge, sobald ein
+    Block fertig ist (der COPY läuft währenddessen im Haupt-Thread weiter).
+    """
+    blocks = [
+        (o_chunk, d_chunk)
+        for o_chunk in _chunks(origins, OSRM_SOURCES_CHUNK)
+        for d_chunk in _chunks(destinations, OSRM_DESTINATIONS_CHUNK)
+    ]
+    print(f"[matrix] {len(origins)} Start-Punkte x {len(destinations)} Ziele -> {len(blocks)} /table-Requests")
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(fetch_table, o, d): (o, d) for o, d in blocks}
+        for done, future in enumerate(as_completed(futures), start=1):
+            o_chunk, d_chunk = futures[future]
+            durations, distances = future.result()
+            for i, (origin_key, stadtteil, lat, lon) in enumerate(o_chunk):
+                for j, (facility_id, facility_type, _, _) in enumerate(d_chunk):
+                    yield (
+                        origin_key, stadtteil, lat, lon,
+                        facility_id, facility_type, durations[i][j], distances[i][j],
+                    )
+            if done % 50 == 0:
+                print(f"[matrix] {done}/{len(blocks)} Blöcke fertig")
+
+
+# ============================================================
+# Lauf
+# ============================================================
+def build_matrix(
+    conn,
+    origin_kind: str,
+    boundary: geo.CityBoundary,
+    types: Optional[List[str]] = None,
+    profile: str = OSRM_PROFILE,
+) -> int:
+    """Rechnet die Matrix für origin_kind (und types) neu. Rückgabe: Zeilen. Kein commit."""
+    with conn.cursor(row_factory=tuple_row) as cur:
+        cur.execute("SELECT to_regclass('facilities') IS NOT NULL;")
+        if not cur.fetchone()[0]:
+            print("[matrix] Tabelle facilities existiert (noch) nicht, übersprungen.")
+            return 0
+
+        with metrics.timer("stage_seconds", source="osrm_matrix", stage="load"):
+            origins = load_origins(origin_kind, boundary)
+            cur.execute(SELECT_DESTINATIONS_SQL, {"types": types})
+            destinations = [(fid, ftype, float(lat), float(lon)) for fid, ftype, lat, lon in cur.fetchall()]
+        if not origins or not destinations:
+            print(f"[matrix] nichts zu rechnen ({len(origins)} Start-Punkte, {len(destinations)} Ziele)")
+            return 0
+
+        cur.execute(CREATE_STAGE_SQL)
+        with metrics.timer("stage_seconds", source="osrm_matrix", stage="table"):
+            rows = copy_rows(cur, "travel_time_matrix_stage", STAGE_COLUMNS, compute_matrix(origins, destinations))
+        with metrics.timer("stage_seconds", source="osrm_matrix", stage="merge"):
+            cur.execute(MERGE_SQL, {"profile": profile, "origin_kind": origin_kind, "types": types})
+
+    metrics.inc("rows_written", rows, table="travel_time_matrix", source="osrm_matrix")
+    return rows
+
+
+def run_matrix(tag: str, origin_kind: str = "district", types: Optional[List[str]] = None) -> bool:
+    """Eigene Connection + Transaktion, Rückgabe ok/Fehler (wie run_enrichment)."""
+    started = time.monotonic()
+    ratelimit.configure_host(
+        urlsplit(OSRM_URL).netloc,
+        max_rate=OSRM_MAX_RATE,
+        burst=OSRM_CONCURRENCY,
+        initial_rate=OSRM_MAX_RATE,
+    )
+    try:
+        # Tabelle/View legt migrations.py an (requires facilities)
+        migrations.ensure_current(tag, strict=False)
+        boundary = geo.load_city_boundary()
+        with db.connection() as conn:
+            try:
+                rows = build_matrix(conn, origin_kind, boundary, types=types)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    except Exception as e:
+        print(f"{tag} ❌ Reisezeit-Matrix ({origin_kind}) fehlgeschlagen: {e}")
+        return False
+
+    print(f"{tag} 🚗 Reisezeit-Matrix ({origin_kind}, {OSRM_PROFILE}): {rows} Paare ({time.monotonic() - started:.1f}s)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reisezeiten Stadtteile/Raster -> Facilities über OSRM /table.")
+    parser.add_argument("--origins", choices=ORIGIN_KINDS, default="district", help="Start-Punkte (Default: district)")
+    parser.add_argument("--types", default="", help="nur diese FacilityTypes, kommagetrennt (z.B. APOTHEKE,ARZTPRAXIS)")
+    args = parser.parse_args()
+    types = [t.strip().upper() for t in args.types.split(",") if t.strip()] or None
+
+    db.wait_for_db("[matrix]")
+    ok = run_matrix("[matrix]", args.origins, types)
+    metrics.write_report("osrm_matrix", "[matrix]")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# ratelimit.py
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import metrics
+
+
+# ============================================================
+# Token-Bucket Rate-Limiter
+# Statt nach jedem Request fix zu schlafen, verteilt der Bucket
+# "Tokens" mit einer festen Rate (rate pro Sekunde). Jeder Request
+# verbraucht ein Token. Ist der Bucket leer, wartet acquire() genau
+# so lange, bis wieder ein Token nachgelaufen ist.
+#
+# burst: wie viele Requests maximal direkt hintereinander erlaubt sind
+# (z.B. nach einer Pause). Thread-safe, damit mehrere Worker-Threads
+# sich denselben Bucket teilen können.
+# ============================================================
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("rate muss > 0 sein.")
+        self.rate = float(rate)
+        self.capacity = float(max(1, burst))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self) -> None:
+        """Blockiert, bis ein Token verfügbar ist, und verbraucht es."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait_s = (1.0 - self._tokens) / self.rate
+            metrics.sleep(wait_s, reason="ratelimit")
+
+
+# ============================================================
+# Adaptiver Limiter pro Host (AIMD)
+# Die Rate ist nicht fix, sondern folgt dem, was der Server verträgt:
+# - jede schnelle, erfolgreiche Antwort erhöht die Rate additiv
+#   (ca. +HTTP_RATE_STEP req/s pro Sekunde Traffic) bis max_rate
+# - 429/503, Timeouts/Verbindungsfehler oder Latenz über
+#   HTTP_LATENCY_TARGET halbieren die Rate (HTTP_RATE_DECREASE),
+#   höchstens einmal pro Cooldown, damit ein Schwall Fehler nicht
+#   sofort auf min_rate drückt
+# - Retry-After (Sekunden oder HTTP-Datum) sperrt den Host bis dahin
+#
+# Alle Quellen teilen sich die Limiter über get_host_limiter(host),
+# der Aufruf passiert zentral in http_client (acquire vor, feedback
+# nach jedem Request). Obergrenzen pro Host über HTTP_HOST_MAX_RATE
+# ("www.kvwl.de=5,www.aponet.de=2") oder configure_host().
+# ============================================================
+HTTP_RATE_INITIAL = float(os.getenv("HTTP_RATE_INITIAL", "1.0"))
+HTTP_RATE_MIN = float(os.getenv("HTTP_RATE_MIN", "0.2"))
+HTTP_RATE_MAX = float(os.getenv("HTTP_RATE_MAX", "10.0"))
+HTTP_RATE_STEP = float(os.getenv("HTTP_RATE_STEP", "0.5"))
+HTTP_RATE_DECREASE = float(os.getenv("HTTP_RATE_DECREASE", "0.5"))
+HTTP_LATENCY_TARGET = float(os.getenv("HTTP_LATENCY_TARGET", "2.0"))
+HTTP_RETRY_AFTER_MAX = float(os.getenv("HTTP_RETRY_AFTER_MAX", "120"))
+
+THROTTLE_STATUS = (429, 503)
+
+
+def _parse_host_rates(raw: str) -> Dict[str, float]:
+    rates: Dict[str, float] = {}
+    for part in raw.split(","):
+        if "=" in part:
+            host, rate = part.split("=", 1)
+            rates[host.strip().lower()] = float(rate)
+    return rates
+
+
+HTTP_HOST_MAX_RATE = _parse_host_rates(os.getenv("HTTP_HOST_MAX_RATE", ""))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After als Sekunden ("120") oder HTTP-Datum -> Sekunden ab jetzt."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(0.0, seconds), HTTP_RETRY_AFTER_MAX)
+
+
+class AdaptiveLimiter(TokenBucket):
+    def __init__(
+        self,
+        host: str,
+        initial_rate: float = HTTP_RATE_INITIAL,
+        min_rate: float = HTTP_RATE_MIN,
+        max_rate: float = HTTP_RATE_MAX,
+        burst: int = 1,
+    ):
+        if not 0 < min_rate <= max_rate:
+            raise ValueError("Es muss 0 < min_rate <= max_rate gelten.")
+        super().__init__(rate=min(max(initial_rate, min_rate), max_rate), burst=burst)
+        self.host = host
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    wait_s, reason = self._blocked_until - now, "retry_after"
+                else:
+                    self._refill()
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return
+                    wait_s, reason = (1.0 - self._tokens) / self.rate, "ratelimit"
+            metrics.sleep(wait_s, reason=reason)
+
+    def feedback(self, status: Optional[int], latency_s: float, retry_after_s: Optional[float] = None) -> None:
+        """status=None -> Timeout/Verbindungsfehler."""
+        with self._lock:
+            now = time.monotonic()
+            if status is None or status in THROTTLE_STATUS:
+                self._decrease(now, "error" if status is None else str(status))
+                pause = retry_after_s if retry_after_s is not None else 1.0 / self.rate
+                self._blocked_until = max(self._blocked_until, now + pause)
+                self._tokens = 0.0
+            elif latency_s > HTTP_LATENCY_TARGET:
+                self._decrease(now, "latency")
+            elif status < 500:
+                self.rate = min(self.max_rate, self.rate + HTTP_RATE_STEP / self.rate)
+
+    def _decrease(self, now: float, reason: str) -> None:
+        # ein Fenster pro Senkung: alle Antworten auf Requests, die noch mit der
+        # alten Rate rausgegangen sind, zählen nicht noch einmal
+        if now - self._last_decrease < max(1.0, 1.0 / self.rate):
+            return
+        self._last_decrease = now
+        old = self.rate
+        self.rate = max(self.min_rate, self.rate * HTTP_RATE_DECREASE)
+        metrics.inc("ratelimit_decrease", host=self.host, reason=reason)
+        print(f"[ratelimit] {self.host}: {reason} -> {old:.2f} -> {self.rate:.2f} req/s")
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def configure_host(
+    host: str,
+    max_rate: Optional[float] = None,
+    burst: int = 1,
+    initial_rate: float = HTTP_RATE_INITIAL,
+) -> AdaptiveLimiter:
+    """
+    Setzt die Obergrenze für einen Host (HTTP_HOST_MAX_RATE hat Vorrang).
+    initial_rate=max_rate z.B. für eigene Dienste (OSRM), die nicht erst
+    langsam hochfahren müssen.
+    """
+    host = host.lower()
+    max_rate = HTTP_HOST_MAX_RATE.get(host, max_rate if max_rate is not None else HTTP_RATE_MAX)
+    with _limiters_lock:
+        limiter = AdaptiveLimiter(
+            host,
+            initial_rate=initial_rate,
+            max_rate=max_rate,
+            min_rate=min(HTTP_RATE_MIN, max_rate),
+            burst=burst,
+        )
+        _limiters[host] = limiter
+    return limiter
+
+
+def get_host_limiter(host: str) -> AdaptiveLimiter:
+    host = host.lower()
+    limiter = _limiters.get(host)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(host)
+            if limiter is None:
+                max_rate = HTTP_HOST_MAX_RATE.get(host, HTTP_RATE_MAX)
+                limiter = AdaptiveLimiter(host, max_rate=max_rate, min_rate=min(HTTP_RATE_MIN, max_rate))
+                _limiters[host] = limiter
+    return limiter
@@ -0,0 +1,189 @@
+# replay.py
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+
+
+# ============================================================
+# Record/Replay für alle HTTP-Calls der Scraper
+#
+# Aufnehmen: HTTP_RECORD_DIR=/app/fixtures python main.py
+#   -> jede Antwort landet als <key>.json im Verzeichnis. key ist derselbe
+#      Schlüssel wie im HTTP-Cache (Methode + URL + Query + Body).
+#
+# Abspielen: python replay.py --fixtures /app/fixtures --latency-ms 80
+#   startet einen lokalen Server, der die Fixtures ausliefert (optional mit
+#   künstlicher Latenz und Fehlerrate). Mit HTTP_REPLAY_URL=http://host:port
+#   schickt http_client alle Requests dorthin; der Key geht im Header
+#   X-Replay-Key mit, der Server muss also nichts über die Quellen wissen.
+#
+# Benchmark end-to-end: python -m benchmarks.bench_scrape_replay
+# ============================================================
+HTTP_RECORD_DIR = os.getenv("HTTP_RECORD_DIR", "")
+HTTP_REPLAY_URL = os.getenv("HTTP_REPLAY_URL", "")
+
+REPLAY_KEY_HEADER = "X-Replay-Key"
+REPLAY_HOST_HEADER = "X-Replay-Host"
+
+_record_lock = threading.Lock()
+
+
+def record_fixture(directory: str, key: str, method: str, url: str, resp: requests.Response) -> None:
+    fixture = {
+        "method": method.upper(),
+        "url": url,
+        "status": resp.status_code,
+        "content_type": resp.headers.get("Content-Type", ""),
+        "body": resp.content.decode("utf-8", "replace"),
+    }
+    path = os.path.join(directory, f"{key}.json")
+    with _record_lock:
+        os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def to_replay_url(url: str, replay_base: str) -> str:
+    """Ersetzt Schema + Host durch den Replay-Server, Pfad und Query bleiben."""
+    base = urlsplit(replay_base)
+    parts = urlsplit(url)
+    return urlunsplit((base.scheme, base.netloc, parts.path, parts.query, ""))
+
+
+def load_fixtures(directory: str) -> Dict[str, Dict[str, Any]]:
+    fixtures: Dict[str, Dict[str, Any]] = {}
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                fixtures[name[:-5]] = json.load(f)
+    return fixtures
+
+
+# ============================================================
+# Lokaler Replay-Server
+# ============================================================
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        fixtures: Dict[str, Dict[str, Any]],
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        super().__init__(address, ReplayHandler)
+        self.fixtures = fixtures
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rnd = random.Random(seed)
+        self.stats = {"requests": 0, "served": 0, "errors_injected": 0, "missing": 0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, field: str) -> None:
+        with self.stats_lock:
+            self.stats[field] += 1
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server: ReplayServer
+
+    def _handle(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        srv = self.server
+        srv.count("requests")
+
+        with srv.stats_lock:
+            delay = srv.latency_ms + srv.rnd.uniform(-srv.jitter_ms, srv.jitter_ms)
+            fail = srv.rnd.random() < srv.error_rate
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+        if fail:
+            srv.count("errors_injected")
+            self._send(503, "text/plain", b"injected error")
+            return
+
+        fixture = srv.fixtures.get(self.headers.get(REPLAY_KEY_HEADER, ""))
+        if fixture is None:
+            srv.count("missing")
+            print(f"[replay] ⚠️  keine Fixture für {self.command} {self.headers.get(REPLAY_HOST_HEADER)}{self.path}")
+            self._send(404, "text/plain", b"no fixture")
+            return
+
+        srv.count("served")
+        self._send(fixture["status"], fixture["content_type"], fixture["body"].encode("utf-8"))
+
+    def _send(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def start_server(
+    fixtures_dir: str,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    **options: Any,
+) -> ReplayServer:
+    """Startet den Replay-Server in einem Hintergrund-Thread (port=0 -> freier Port)."""
+    server = ReplayServer((host, port), load_fixtures(fixtures_dir), **options)
+    threading.Thread(target=server.serve_forever, name="replay-server", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lokaler Replay-Server für aufgenommene Scraper-Antworten")
+    parser.add_argument("--fixtures", required=True, help="Verzeichnis aus HTTP_RECORD_DIR")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Anteil 503-Antworten (0..1)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = ReplayServer(
+        (args.host, args.port),
+        load_fixtures(args.fixtures),
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    print(f"[replay] {len(server.fixtures)} Fixtures auf http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"[replay] Statistik: {server.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# retention.py
+import os
+from typing import Dict, Optional, Sequence, Tuple
+
+from psycopg.rows import tuple_row
+
+import metrics
+
+
+# ============================================================
+# Aufbewahrung: veraltete Facilities einer Quelle entfernen
+# Bisher nur bei KVWL, mit zwei DELETEs (erst doctors über die
+# "doomed"-Facilities, dann dieselben Facilities nochmal gesucht).
+# Die Gesundheitskarte hat last_seen_at bei Updates nie angefasst (es
+# blieb beim Insert-Zeitpunkt), aufgeräumt wurde sie gar nicht.
+#
+# Jetzt für alle Quellen gleich:
+# - jede Quelle markiert, was sie in diesem Lauf gesehen hat
+#   (bulk_upsert_facilities mit touch_last_seen bzw. mark_seen)
+# - nach erfolgreichem Lauf löscht purge_stale() in EINEM Statement
+#   alles, was länger als das Aufbewahrungsfenster nicht gesehen wurde:
+#   Kandidaten einmal über idx_facilities_source_last_seen_at, dann
+#   doctors + facilities als datenverändernde CTEs. Die FK-Prüfung
+#   doctors -> facilities läuft erst am Statement-Ende, die übrigen
+#   abhängigen Tabellen (facility_district, facility_clusters,
+#   travel_time_matrix) hängen per ON DELETE CASCADE dran.
+#
+# RETENTION_DAYS gilt für alle Quellen, RETENTION_SOURCE_DAYS
+# überschreibt einzelne, z.B. "gelsenkirchen_gesundheitskarte=14,kvwl=7".
+# 0 oder negativ -> Quelle wird nie aufgeräumt.
+# ============================================================
+RETENTION_DAYS = float(os.getenv("RETENTION_DAYS", "7"))
+
+
+def _parse_source_days(raw: str) -> Dict[str, float]:
+    days: Dict[str, float] = {}
+    for part in raw.split(","):
+        if "=" in part:
+            source, value = part.split("=", 1)
+            days[source.strip()] = float(value)
+    return days
+
+
+RETENTION_SOURCE_DAYS = _parse_source_days(os.getenv("RETENTION_SOURCE_DAYS", ""))
+
+MARK_SEEN_SQL = "UPDATE facilities SET last_seen_at = NOW() WHERE id = ANY(%s);"
+
+PURGE_STALE_SQL = """
+WITH doomed AS (
+  SELECT id
+  FROM facilities
+  WHERE source = %(source)s
+    AND last_seen_at < NOW() - make_interval(secs => %(seconds)s)
+),
+doctors_deleted AS (
+  DELETE FROM doctors d
+  USING doomed
+  WHERE d.facility_id = doomed.id
+  RETURNING 1
+),
+facilities_deleted AS (
+  DELETE FROM facilities f
+  USING doomed
+  WHERE f.id = doomed.id
+  RETURNING 1
+)
+SELECT (SELECT COUNT(*) FROM facilities_deleted), (SELECT COUNT(*) FROM doctors_deleted);
+"""
+
+
+def retention_days(source: str) -> float:
+    return RETENTION_SOURCE_DAYS.get(source, RETENTION_DAYS)
+
+
+def mark_seen(cur, facility_ids: Sequence[int]) -> None:
+    """Unveränderte Facilities nur als "gesehen" markieren (kein Rewrite der Zeile)."""
+    if facility_ids:
+        cur.execute(MARK_SEEN_SQL, (list(facility_ids),))
+
+
+def purge_stale(conn, source: str, days: Optional[float] = None) -> Tuple[int, int]:
+    """
+    Löscht Facilities der Quelle, die länger als days (Default: Konfiguration
+    der Quelle) nicht gesehen wurden, samt ihrer Doctors.
+    Rückgabe: (facilities, doctors) gelöscht. Kein commit -> macht der Aufrufer.
+    """
+    days = retention_days(source) if days is None else days
+    if days <= 0:
+        return 0, 0
+
+    with conn.cursor(row_factory=tuple_row) as cur:
+        cur.execute(PURGE_STALE_SQL, {"source": source, "seconds": days * 86400})
+        facilities_deleted, doctors_deleted = cur.fetchone()
+
+    metrics.inc("rows_deleted", facilities_deleted, table="facilities", source=source)
+    metrics.inc("rows_deleted", doctors_deleted, table="doctors", source=source)
+    return facilities_deleted, doctors_deleted
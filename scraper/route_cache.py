@@ -0,0 +1,288 @@
+# route_cache.py
+import argparse
+import glob
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# ============================================================
+# Route-Cache vor OSRM
+# Das Backend (RoutingService) fragt für jede Karten-Anfrage OSRM /route
+# mit Start -> Facility. Start-Punkte aus der Karte unterscheiden sich um
+# ein paar Meter, ein exakter Cache würde also nie treffen.
+#
+# Dieser Proxy sitzt zwischen Backend und OSRM (routing.osrm.base-url
+# zeigt auf ihn) und
+# - rastet den Start auf ROUTE_CACHE_CELL_M Meter ein (Zelle),
+# - nimmt das Ziel (Facility-Koordinate, ändert sich nicht) auf ~1 m genau,
+# - hält (Profil, Zelle, Ziel, Query) -> OSRM-Antwort in einem LRU mit
+#   ROUTE_CACHE_SIZE Einträgen und ROUTE_CACHE_TTL Sekunden,
+# - leert den Cache, sobald sich region.osrm* ändert (neuer OSRM-Build).
+# Alles andere (/table, /nearest, mehr als zwei Punkte, Fehler) geht
+# ungecacht durch.
+#
+# Start: python route_cache.py (docker compose: Service osrm-cache)
+# Statistik: GET /_cache/stats
+# Benchmark Trefferquote: python -m benchmarks.bench_route_cache
+# ============================================================
+ROUTE_CACHE_UPSTREAM = os.getenv("ROUTE_CACHE_UPSTREAM", "http://osrm-routing:5000").rstrip("/")
+ROUTE_CACHE_CELL_M = float(os.getenv("ROUTE_CACHE_CELL_M", "50"))
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "10000"))
+ROUTE_CACHE_TTL = float(os.getenv("ROUTE_CACHE_TTL", str(24 * 3600)))
+ROUTE_CACHE_DATA_PATH = os.getenv("ROUTE_CACHE_DATA_PATH", "/data/region.osrm")
+ROUTE_CACHE_WATCH_S = float(os.getenv("ROUTE_CACHE_WATCH_S", "30"))
+ROUTE_CACHE_TIMEOUT = float(os.getenv("ROUTE_CACHE_TIMEOUT", "30"))
+
+CACHE_HEADER = "X-Route-Cache"
+STATS_PATH = "/_cache/stats"
+
+METERS_PER_DEG = 111320.0
+
+
+# ============================================================
+# Einrasten
+# ============================================================
+def snap(lat: float, lon: float, cell_m: float = ROUTE_CACHE_CELL_M) -> Tuple[int, int]:
+    """(lat, lon) -> Zelle (Zeile, Spalte); Spaltenbreite nach Breite der Zeile."""
+    dlat = cell_m / METERS_PER_DEG
+    row = math.floor(lat / dlat)
+    row_lat = (row + 0.5) * dlat
+    dlon = cell_m / (METERS_PER_DEG * math.cos(math.radians(row_lat)))
+    return row, math.floor(lon / dlon)
+
+
+def route_key(path: str, query: str, cell_m: float = ROUTE_CACHE_CELL_M) -> Optional[str]:
+    """
+    Cache-Key für "/route/v1/<profil>/<lon,lat>;<lon,lat>", sonst None.
+    Der Start wird eingerastet, das Ziel auf 5 Nachkommastellen gerundet.
+    """
+    parts = path.split("/")
+    if len(parts) != 5 or parts[1] != "route":
+        return None
+    coords = parts[4]
+    if coords.endswith(".json"):
+        coords = coords[:-5]
+    points = coords.split(";")
+    if len(points) != 2:
+        return None
+    try:
+        (o_lon, o_lat), (d_lon, d_lat) = [tuple(float(v) for v in p.split(",")) for p in points]
+    except ValueError:
+        return None
+
+    row, col = snap(o_lat, o_lon, cell_m)
+    params = urlencode(sorted(parse_qsl(query, keep_blank_values=True)))
+    return f"{parts[2]}/{parts[3]}|{row},{col}|{d_lon:.5f},{d_lat:.5f}|{params}"
+
+
+# ============================================================
+# LRU mit TTL
+# ============================================================
+class RouteCache:
+    def __init__(self, max_entries: int = ROUTE_CACHE_SIZE, ttl_s: float = ROUTE_CACHE_TTL):
+        self.max_entries = max(1, max_entries)
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[str, Tuple[float, str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidations": 0, "bypass": 0}
+
+    def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            stored_at, content_type, body = entry
+            if time.monotonic() - stored_at > self.ttl_s:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return content_type, body
+
+    def put(self, key: str, content_type: str, body: bytes) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), content_type, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evicted"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.stats["invalidations"] += 1
+
+    def count(self, field: str) -> None:
+        with self._lock:
+            self.stats[field] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self.stats, entries=len(self._entries), max_entries=self.max_entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# ============================================================
+# Neuer OSRM-Build -> Cache leeren
+# ============================================================
+class DatasetWatcher:
+    """Prüft höchstens alle interval_s Sekunden mtime/Größe von <path>*."""
+
+    def __init__(self, path: str = ROUTE_CACHE_DATA_PATH, interval_s: float = ROUTE_CACHE_WATCH_S):
+        self.path = path
+        self.interval_s = interval_s
+        self._signature = self._current()
+        self._checked_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _current(self) -> Tuple[Tuple[str, float, int], ...]:
+        signature = []
+        for name in sorted(glob.glob(f"{self.path}*")):
+            try:
+                st = os.stat(name)
+            except OSError:
+                continue
+            signature.append((name, st.st_mtime, st.st_size))
+        return tuple(signature)
+
+    def changed(self) -> bool:
+        if not self.path:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at < self.interval_s:
+                return False
+            self._checked_at = now
+            current = self._current()
+            if current == self._signature:
+                return False
+            self._signature = current
+            return True
+
+
+# ============================================================
+# Proxy-Server
+# ============================================================
+class RouteCacheServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address,
+        upstream: str = ROUTE_CACHE_UPSTREAM,
+        cache: Optional[RouteCache] = None,
+        watcher: Optional[DatasetWatcher] = None,
+        cell_m: float = ROUTE_CACHE_CELL_M,
+    ):
+        super().__init__(address, RouteCacheHandler)
+        self.upstream = upstream.rstrip("/")
+        self.cache = cache or RouteCache()
+        self.watcher = watcher
+        self.cell_m = cell_m
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+
+class RouteCacheHandler(BaseHTTPRequestHandler):
+    server: RouteCacheServer
+
+    def do_GET(self) -> None:
+        srv = self.server
+        parts = urlsplit(self.path)
+
+        if parts.path == STATS_PATH:
+            self._send(200, "application/json", json.dumps(srv.cache.snapshot()).encode("utf-8"), "STATS")
+            return
+
+        if srv.watcher is not None and srv.watcher.changed():
+            srv.cache.clear()
+            print("[route-cache] 🔄 region.osrm geändert -> Cache geleert")
+
+        key = route_key(parts.path, parts.query, srv.cell_m)
+        if key is None:
+            srv.cache.count("bypass")
+            status, content_type, body = self._forward()
+            self._send(status, content_type, body, "BYPASS")
+            return
+
+        cached = srv.cache.get(key)
+        if cached is not None:
+            self._send(200, cached[0], cached[1], "HIT")
+            return
+
+        status, content_type, body = self._forward()
+        if status == 200 and b'"code":"Ok"' in body.replace(b" ", b""):
+            srv.cache.put(key, content_type, body)
+        self._send(status, content_type, body, "MISS")
+
+    def _forward(self) -> Tuple[int, str, bytes]:
+        try:
+            resp = self.server.session.get(f"{self.server.upstream}{self.path}", timeout=ROUTE_CACHE_TIMEOUT)
+        except requests.RequestException as e:
+            return 502, "text/plain", f"OSRM nicht erreichbar: {e}".encode("utf-8")
+        return resp.status_code, resp.headers.get("Content-Type", ""), resp.content
+
+    def _send(self, status: int, content_type: str, body: bytes, cache_state: str) -> None:
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header(CACHE_HEADER, cache_state)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, **options: Any) -> RouteCacheServer:
+    """Startet den Proxy in einem Hintergrund-Thread (port=0 -> freier Port)."""
+    server = RouteCacheServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, name="route-cache", daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cache-Proxy vor OSRM /route (Start eingerastet, LRU + TTL)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--upstream", default=ROUTE_CACHE_UPSTREAM)
+    args = parser.parse_args()
+
+    server = RouteCacheServer(
+        (args.host, args.port),
+        upstream=args.upstream,
+        cache=RouteCache(),
+        watcher=DatasetWatcher(),
+    )
+    print(
+        f"[route-cache] http://{args.host}:{args.port} -> {server.upstream} "
+        f"(Zelle {ROUTE_CACHE_CELL_M:.0f} m, {ROUTE_CACHE_SIZE} Einträge, TTL {ROUTE_CACHE_TTL:.0f}s)"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"[route-cache] Statistik: {server.cache.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
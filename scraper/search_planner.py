@@ -0,0 +1,243 @@
+# search_planner.py
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import geo
+
+
+# ============================================================
+# Suchpunkt-Planer für KVWL und aponet
+# Die festen Suchpunkte (ein Punkt pro PLZ) überlappen stark: dieselben
+# Ärzte/Apotheken kommen mehrfach zurück und viele Treffer liegen
+# außerhalb von Gelsenkirchen. Der Planer
+#
+# 1) tastet das Stadtgebiet (GeoJSON) in einem feinen Raster ab,
+# 2) nimmt Kandidaten (grobes Raster + PLZ-Punkte) mit dem Radius, den
+#    eine Suche effektiv abdeckt,
+# 3) wählt gierig so lange den Kandidaten, der die meisten noch nicht
+#    abgedeckten Rasterzellen abdeckt, bis die Stadt abgedeckt ist.
+#    Zellen, in denen frühere Läufe viele Treffer hatten, zählen mehr.
+#
+# Gelernt wird aus SEARCH_STATS_PATH (pro Quelle, wird nach jedem Lauf
+# geschrieben): Treffer/Duplikate/Treffer außerhalb pro Suchpunkt,
+# effektiver Radius (Median der weitesten Treffer je Punkt) und die
+# Trefferdichte im Raster. Ohne Vorlauf-Daten bleibt es bei den festen
+# Punkten, die Statistik wird trotzdem geschrieben.
+# ============================================================
+SEARCH_STATS_PATH = os.getenv("SEARCH_STATS_PATH", "/app/cache/search_stats.json")
+PLANNER_SAMPLE_KM = float(os.getenv("PLANNER_SAMPLE_KM", "0.5"))      # Abtastraster Stadtgebiet
+PLANNER_CANDIDATE_KM = float(os.getenv("PLANNER_CANDIDATE_KM", "1.0"))  # Raster der Kandidaten
+PLANNER_RADIUS_MARGIN = float(os.getenv("PLANNER_RADIUS_MARGIN", "0.8"))  # Sicherheitsabschlag
+
+Point = Tuple[float, float]
+
+_stats_file_lock = threading.Lock()
+
+# PLZ-Schwerpunkte Gelsenkirchen (lat, lon); aponet sucht per PLZ-String
+PLZ_POINTS: Dict[str, Point] = {
+    "45879": (51.5074086885497, 7.09422362114849),
+    "45881": (51.5285024259591, 7.07863180952606),
+    "45883": (51.5154383889844, 7.05712246590032),
+    "45884": (51.4934186141858, 7.0845770890135),
+    "45886": (51.4991346811294, 7.11864101982773),
+    "45888": (51.5179268800199, 7.11805545154942),
+    "45889": (51.5376570371888, 7.11022695447703),
+    "45891": (51.5593155331453, 7.08174970144914),
+    "45892": (51.5721755419602, 7.11157055160658),
+    "45894": (51.5826435374217, 7.05658911035039),
+    "45896": (51.6072345927372, 7.02851589356686),
+    "45897": (51.5605660236072, 7.04130812771978),
+    "45899": (51.5397718367201, 7.03043069983145),
+}
+
+
+def load_boundary(path: str = geo.CITY_BOUNDARY_PATH) -> Optional[geo.CityBoundary]:
+    """Stadtgrenze laden; fehlt die Datei, laufen die Quellen mit festen Punkten."""
+    try:
+        return geo.load_city_boundary(path)
+    except (OSError, ValueError) as e:
+        print(f"[planner] ⚠️  Stadtgrenze nicht geladen ({path}): {e}")
+        return None
+
+
+def point_key(point: Point) -> str:
+    return f"{point[0]:.5f},{point[1]:.5f}"
+
+
+# ============================================================
+# Statistik pro Lauf
+# ============================================================
+class SearchStats:
+    """Sammelt pro Suchpunkt Treffer und (später) die Orte der Treffer. Thread-safe."""
+
+    def __init__(self, source: str, page_size: int = 20):
+        self.source = source
+        self.page_size = page_size
+        self.points: Dict[str, Dict[str, Any]] = {}
+        self.found_at: Dict[str, List[str]] = {}   # id -> Punkte, die sie geliefert haben
+        self.locations: Dict[str, Tuple[Optional[float], Optional[float], bool]] = {}
+        self._lock = threading.Lock()
+
+    def record_id(self, point: Point, item_id: str, new: bool) -> None:
+        key = point_key(point)
+        with self._lock:
+            p = self.points.setdefault(key, {"lat": point[0], "lon": point[1], "ids": 0, "new": 0})
+            p["ids"] += 1
+            if new:
+                p["new"] += 1
+            self.found_at.setdefault(item_id, []).append(key)
+
+    def record_location(self, item_id: str, lat: Optional[float], lon: Optional[float], in_city: bool) -> None:
+        with self._lock:
+            self.locations[item_id] = (lat, lon, in_city)
+
+    def summarize(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            summary = {k: dict(v) for k, v in self.points.items()}
+            for p in summary.values():
+                p.update(outside=0, max_dist_km=0.0)
+            for item_id, keys in self.found_at.items():
+                lat, lon, in_city = self.locations.get(item_id, (None, None, True))
+                for key in keys:
+                    p = summary[key]
+                    if not in_city:
+                        p["outside"] += 1
+                    if lat is not None and lon is not None:
+                        dist = geo.haversine_km(p["lat"], p["lon"], float(lat), float(lon))
+                        p["max_dist_km"] = max(p["max_dist_km"], round(dist, 3))
+
+        for p in summary.values():
+            p["pages"] = p["ids"] // self.page_size + 1
+            p["duplicates"] = p["ids"] - p["new"]
+            p["dup_ratio"] = round(p["duplicates"] / p["ids"], 3) if p["ids"] else 0.0
+        return summary
+
+    def hit_cells(self, boundary: geo.CityBoundary) -> Dict[str, int]:
+        cells: Dict[str, int] = {}
+        with self._lock:
+            locations = list(self.locations.values())
+        for lat, lon, in_city in locations:
+            if in_city and lat is not None and lon is not None:
+                row, col = geo.grid_cell(float(lat), float(lon), boundary.bbox, PLANNER_SAMPLE_KM)
+                cells[f"{row},{col}"] = cells.get(f"{row},{col}", 0) + 1
+        return cells
+
+    def print_report(self, tag: str) -> None:
+        summary = self.summarize()
+        total_ids = sum(p["ids"] for p in summary.values())
+        total_dup = sum(p["duplicates"] for p in summary.values())
+        print(f"{tag} 🗺️  Suchpunkte {self.source}: {len(summary)}, Treffer={total_ids}, "
+              f"Duplikate={total_dup} ({(total_dup / total_ids if total_ids else 0):.0%})")
+        for key, p in sorted(summary.items(), key=lambda kv: -kv[1]["dup_ratio"]):
+            print(f"{tag}   {key:<20} ids={p['ids']:<5} neu={p['new']:<5} dup={p['dup_ratio']:<6.0%} "
+                  f"außerhalb={p['outside']:<5} seiten={p['pages']:<4} max_dist={p['max_dist_km']:.1f}km")
+
+    def save(self, boundary: Optional[geo.CityBoundary], path: Optional[str] = None) -> None:
+        path = SEARCH_STATS_PATH if path is None else path
+        summary = self.summarize()
+        dists = sorted(p["max_dist_km"] for p in summary.values() if p["max_dist_km"] > 0)
+        entry: Dict[str, Any] = {
+            "updated_at": time.time(),
+            "points": summary,
+            "radius_km": dists[len(dists) // 2] if dists else None,
+            "hit_cells": self.hit_cells(boundary) if boundary is not None else {},
+        }
+
+        # KVWL und aponet laufen parallel und schreiben dieselbe Datei
+        with _stats_file_lock:
+            data = load_stats(path)
+            data[self.source] = entry
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, path)
+
+
+def load_stats(path: Optional[str] = None) -> Dict[str, Any]:
+    path = SEARCH_STATS_PATH if path is None else path
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# ============================================================
+# Planung: gierige Überdeckung
+# ============================================================
+def plan_cover(
+    boundary: geo.CityBoundary,
+    radius_km: float,
+    candidates: Sequence[Point],
+    hit_cells: Optional[Dict[str, int]] = None,
+) -> List[Point]:
+    """
+    Wählt aus candidates möglichst wenige Punkte, deren Kreise (radius_km)
+    alle Rasterzellen des Stadtgebiets abdecken. Gewicht einer Zelle:
+    1 + Treffer früherer Läufe -> dichte Gebiete werden zuerst abgedeckt.
+    """
+    samples = geo.grid_points_inside(boundary, PLANNER_SAMPLE_KM)
+    hit_cells = hit_cells or {}
+    weights = []
+    for lat, lon in samples:
+        row, col = geo.grid_cell(lat, lon, boundary.bbox, PLANNER_SAMPLE_KM)
+        weights.append(1 + hit_cells.get(f"{row},{col}", 0))
+
+    covers: List[Set[int]] = [
+        {i for i, (lat, lon) in enumerate(samples) if geo.haversine_km(c[0], c[1], lat, lon) <= radius_km}
+        for c in candidates
+    ]
+
+    uncovered = set(range(len(samples)))
+    chosen: List[Point] = []
+    while uncovered:
+        best, best_gain = -1, 0
+        for idx, cover in enumerate(covers):
+            gain = sum(weights[i] for i in cover & uncovered)
+            if gain > best_gain:
+                best, best_gain = idx, gain
+        if best < 0:
+            break
+        chosen.append(candidates[best])
+        uncovered -= covers[best]
+
+    if uncovered:
+        print(f"[planner] ⚠️  {len(uncovered)} von {len(samples)} Rasterzellen nicht abgedeckt (Radius {radius_km:.1f} km)")
+    return chosen
+
+
+def candidate_points(boundary: geo.CityBoundary, extra: Sequence[Point] = ()) -> List[Point]:
+    return list(extra) + geo.grid_points_inside(boundary, PLANNER_CANDIDATE_KM)
+
+
+def plan_search_points(
+    source: str,
+    boundary: geo.CityBoundary,
+    fallback: Sequence[Point],
+    radius_km: Optional[float] = None,
+    candidates: Optional[Sequence[Point]] = None,
+) -> List[Point]:
+    """
+    Suchpunkte für source. radius_km=None -> aus SEARCH_STATS_PATH gelernt.
+    Ohne Radius (erster Lauf) -> fallback.
+    """
+    previous = load_stats().get(source) or {}
+    if radius_km is None:
+        radius_km = previous.get("radius_km")
+    if not radius_km:
+        print(f"[planner] {source}: noch keine Statistik -> {len(fallback)} feste Suchpunkte")
+        return list(fallback)
+
+    effective = radius_km * PLANNER_RADIUS_MARGIN
+    points = plan_cover(
+        boundary,
+        effective,
+        candidates if candidates is not None else candidate_points(boundary, fallback),
+        previous.get("hit_cells"),
+    )
+    print(f"[planner] {source}: {len(points)} Suchpunkte statt {len(fallback)} (Radius {effective:.1f} km)")
+    return points
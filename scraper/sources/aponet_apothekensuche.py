@@ -2,12 +2,19 @@
 import os
 import re
 import hashlib
-import time
-import random
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
 
 import requests
 
+import geo
+import http_client
+import metrics
+import migrations
+import ratelimit
+import search_planner
+from bulk_writer import bulk_upsert_facilities
+
 # ==============================
 # KONSTANTEN
 # ==============================
@@ -17,10 +24,15 @@ SOURCE = "aponet_apotheken"
 SEARCH_TERM = os.getenv("APONET_PLZORT", "Gelsenkirchen")
 RADIUS_KM = int(os.getenv("APONET_RADIUS", "10"))
 TIMEOUT = int(os.getenv("APONET_TIMEOUT", "30"))
+# Obergrenze Requests/s (statt fixer Pause pro Suche, siehe ratelimit.py)
+APONET_RATE = float(os.getenv("APONET_RATE", "2.0"))
+# Radius pro Suchzentrum und Suchpunkt-Planer (siehe plan_search_centers)
+SEARCH_RADIUS_KM = int(os.getenv("APONET_SEARCH_RADIUS", "5"))
+APONET_PLANNER = os.getenv("APONET_PLANNER", "1") == "1"
 
 # Manuell aus Browser/Postman übergeben (derzeit der zuverlässige Weg)
 # Beispiel:
-# docker compose run --rm -e APONET_TOKEN=2168... scraper python /app/sources/aponet_apothekensuche.py
+# docker compose run --rm -e APONET_TOKEN=2168... scraper python -m sources.aponet_apothekensuche
 TOKEN_FROM_ENV = os.getenv("APONET_TOKEN")
 
 HEADERS_HTML = {
@@ -86,13 +98,13 @@ def fetch_token(session: requests.Session) -> str:
         print(f"[aponet] Verwende APONET_TOKEN aus ENV: {TOKEN_FROM_ENV[:12]}...")
         # Seite optional laden (Cookies/Session)
         try:
-            session.get(BASE_URL, headers=HEADERS_HTML, timeout=TIMEOUT)
+            http_client.get(BASE_URL, session=session, headers=HEADERS_HTML, timeout=TIMEOUT)
         except Exception:
             pass
         return TOKEN_FROM_ENV.strip()
 
     # 2) Versuch: Token aus HTML ziehen (funktioniert evtl. nicht immer)
-    r = session.get(BASE_URL, headers=HEADERS_HTML, timeout=TIMEOUT)
+    r = http_client.get(BASE_URL, session=session, headers=HEADERS_HTML, timeout=TIMEOUT)
     r.raise_for_status()
     html = r.text
 
@@ -136,7 +148,16 @@ def _fetch_search_json(session: requests.Session, token: str, plzort: str, radiu
     }
 
 
-    r = session.get(BASE_URL, params=params, headers=HEADERS_AJAX, timeout=TIMEOUT)
+    # Token wechselt pro Session -> nicht Teil des Cache-Keys
+    r = http_client.get(
+        BASE_URL,
+        session=session,
+        params=params,
+        headers=HEADERS_AJAX,
+        timeout=TIMEOUT,
+        cache=True,
+        cache_ignore_params=("tx_aponetpharmacy_search[token]",),
+    )
     r.raise_for_status()
     
     ct = (r.headers.get("Content-Type") or "").lower()
@@ -144,35 +165,51 @@ def _fetch_search_json(session: requests.Session, token: str, plzort: str, radiu
         print("[aponet] Antwort-Start:", r.text[:400])
         raise RuntimeError("Aponet lieferte kein JSON (Token/Header/Session-Problem).")
     
-    return r.json()
+    with metrics.timer("parse_seconds", source=SOURCE, stage="json"):
+        return r.json()
 
     
 
 
 
+# ==============================
+# SUCHZENTREN
+# Früher: alle 13 PLZ mit je 5 km Radius (starke Überlappung).
+# Jetzt wählt search_planner aus den PLZ-Schwerpunkten die kleinste
+# Menge, deren Kreise das Stadtgebiet abdecken. Radius: der angefragte
+# SEARCH_RADIUS_KM bzw. kleiner, falls frühere Läufe gezeigt haben, dass
+# aponet weniger weit liefert. APONET_PLANNER=0 -> alle PLZ wie bisher.
+# ==============================
+def plan_search_centers(boundary: Optional[geo.CityBoundary]) -> List[Tuple[str, int]]:
+    all_centers = [(plz, SEARCH_RADIUS_KM) for plz in search_planner.PLZ_POINTS]
+    if not APONET_PLANNER or boundary is None:
+        return all_centers
+
+    learned = (search_planner.load_stats().get(SOURCE) or {}).get("radius_km")
+    radius = min(SEARCH_RADIUS_KM, learned) if learned else SEARCH_RADIUS_KM
+    points = search_planner.plan_search_points(
+        SOURCE,
+        boundary,
+        fallback=list(search_planner.PLZ_POINTS.values()),
+        radius_km=radius,
+        candidates=list(search_planner.PLZ_POINTS.values()),
+    )
+    plz_by_point = {point: plz for plz, point in search_planner.PLZ_POINTS.items()}
+    return [(plz_by_point[p], SEARCH_RADIUS_KM) for p in points]
+
+
 # ==============================
 # SCRAPEN
 # ==============================
 def scrape_all_facilities() -> List[Dict[str, Any]]:
-    session = requests.Session()
+    # gemeinsame Session (Keep-Alive, Pool, Retry) -> siehe http_client.py
+    session = http_client.get_session()
+    ratelimit.configure_host(urlsplit(BASE_URL).netloc, max_rate=APONET_RATE)
     token = fetch_token(session)
 
-    # Mehrere Zentren: Norden/Mitte/Süden (kannst du anpassen)
-    search_centers = [
-        ("45879", 5),
-        ("45881", 5),
-        ("45883", 5),
-        ("45884", 5),
-        ("45886", 5),
-        ("45888", 5),
-        ("45889", 5),
-        ("45891", 5),
-        ("45892", 5),
-        ("45894", 5),
-        ("45896", 5),
-        ("45897", 5),
-        ("45899", 5),
-    ]
+    boundary = search_planner.load_boundary()
+    search_centers = plan_search_centers(boundary)
+    stats = search_planner.SearchStats(SOURCE)
 
     items: List[Dict[str, Any]] = []
     seen_apo_ids: Set[str] = set()
@@ -192,6 +229,14 @@ def scrape_all_facilities() -> List[Dict[str, Any]]:
 
         for a in apo_list:
             apo_id = _clean(a.get("apo_id") or a.get("id"))
+            if apo_id:
+                stats.record_id(search_planner.PLZ_POINTS[plzort], apo_id, new=apo_id not in seen_apo_ids)
+                stats.record_location(
+                    apo_id,
+                    _try_float(a.get("latitude")),
+                    _try_float(a.get("longitude")),
+                    _is_in_gelsenkirchen(_clean(a.get("ort")), _clean(a.get("plz"))),
+                )
             if apo_id and apo_id in seen_apo_ids:
                 duplicates_skipped += 1
                 continue
@@ -234,8 +279,6 @@ def scrape_all_facilities() -> List[Dict[str, Any]]:
 
             items.append(rec)
 
-        time.sleep(random.uniform(0.4, 0.9))  # freundlich bleiben
-
     print(
         f"[aponet] summary_multi: searches={len(search_centers)}, "
         f"gesamt_empfangen={total_received}, "
@@ -243,6 +286,8 @@ def scrape_all_facilities() -> List[Dict[str, Any]]:
         f"duplikate={duplicates_skipped}, "
         f"final_gespeichert={len(items)}"
     )
+    stats.print_report("[aponet]")
+    stats.save(boundary)
 
     return items
 
@@ -255,56 +300,20 @@ def scrape_all() -> List[Dict[str, Any]]:
 # ==============================
 # DB PERSISTIEREN
 # ==============================
-UPSERT_FACILITY_RETURN_ID = """
-INSERT INTO facilities
-  (source, source_key, facility_name, type, street, postal_code, city, phone,
-   latitude, longitude, wheelchair_accessible, last_seen_at)
-VALUES
-  (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s, NOW())
-ON CONFLICT (source, source_key)
-DO UPDATE SET
-  facility_name = EXCLUDED.facility_name,
-  type = EXCLUDED.type,
-  street = EXCLUDED.street,
-  postal_code = EXCLUDED.postal_code,
-  city = EXCLUDED.city,
-  phone = EXCLUDED.phone,
-  latitude = EXCLUDED.latitude,
-  longitude = EXCLUDED.longitude,
-  wheelchair_accessible = EXCLUDED.wheelchair_accessible,
-  last_seen_at = NOW()
-RETURNING id;
-"""
-
-
 def persist_aponet_apotheken_gelsenkirchen(conn) -> int:
-    facilities = scrape_all_facilities()
+    with metrics.timer("stage_seconds", source=SOURCE, stage="scrape"):
+        facilities = scrape_all_facilities()
 
     if not facilities:
         print("[aponet] Keine Apotheken (Gelsenkirchen) gefunden.")
         return 0
 
-    written = 0
-    with conn.cursor() as cur:
-        for fac in facilities:
-            cur.execute(
-                UPSERT_FACILITY_RETURN_ID,
-                (
-                    fac["source"],
-                    fac["source_key"],
-                    fac["facility_name"],
-                    fac["type"],
-                    fac["street"],
-                    fac["postal_code"],
-                    fac["city"],
-                    fac["phone"],
-                    fac["latitude"],
-                    fac["longitude"],
-                    fac["wheelchair_accessible"],
-                ),
-            )
-            cur.fetchone()  # RETURNING id validieren
-            written += 1
+    # Bulk: COPY in Staging-Tabelle + ein INSERT ... SELECT (siehe bulk_writer.py)
+    # Schema (content_hash) ggf. nachziehen, siehe migrations.ensure_current
+    migrations.ensure_current("[aponet]")
+    with metrics.timer("stage_seconds", source=SOURCE, stage="write"):
+        ids = bulk_upsert_facilities(conn, facilities)
+    written = len(ids)
 
     # Kein commit hier erzwingen – main.py macht conn.commit()
     print(f"[aponet] ✅ Apotheken upserted: {written}")
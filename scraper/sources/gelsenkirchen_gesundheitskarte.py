@@ -1,12 +1,19 @@
 # sources/gelsenkirchen_gesundheitskarte.py
 import json
+import os
 import re
 import hashlib
 import html as html_lib
-from typing import List, Dict, Optional, Tuple
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree
+from lxml import html as lxml_html
+
+import http_client
+import metrics
+import migrations
+from bulk_writer import bulk_upsert_facilities
 
 # ==============================
 # KONSTANTEN
@@ -18,6 +25,10 @@ HEADERS = {
     "User-Agent": "Mozilla/5.0 (compatible; BachelorarbeitScraper/1.0)"
 }
 
+# Parser-Backend für die Tabelle (siehe "PARSER-BACKENDS" unten):
+# lxml (Default), lxml-stream, strainer, html.parser (alter Weg)
+GK_PARSER = os.getenv("GK_PARSER", "lxml")
+
 # ==============================
 # HILFSFUNKTIONEN
 # ==============================
@@ -35,7 +46,7 @@ def _facility_key(name: str, street: str, postal: str, city: str) -> str:
 
 
 def _fetch_html(url: str) -> str:
-    r = requests.get(url, headers=HEADERS, timeout=30)
+    r = http_client.get(url, headers=HEADERS, timeout=30, cache=True)
     r.raise_for_status()
     return r.text
 
@@ -100,19 +111,118 @@ def _to_internal_type(label: str) -> str:
     return mapping.get(s, "SONSTIGES")
 
 
+# ==============================
+# PARSER-BACKENDS
+# Jedes Backend liefert pro Tabellenzeile mit data-gemap-marker ein Tupel
+# (marker_raw, name_texte, art_texte). *_texte sind die getrimmten,
+# nicht-leeren Textstücke der Zelle (wie get_text(strip=True) sie
+# zusammensetzt). Zeilen mit weniger als 2 Zellen werden übersprungen.
+#
+# - html.parser:  kompletter BeautifulSoup-Baum mit dem Python-Parser (langsam)
+# - strainer:     BeautifulSoup + lxml, baut nur die <tr data-gemap-marker> auf
+# - lxml:         lxml.html Baum + XPath, kein BeautifulSoup
+# - lxml-stream:  lxml Pull-Parser, verarbeitete Zeilen werden sofort
+#                 freigegeben -> niedrigster Speicherbedarf
+#
+# Vergleich auf einer gespeicherten Seite:
+#   python -m benchmarks.bench_gesundheitskarte_parser --html seite.html
+# ==============================
+RowTexts = Tuple[Optional[str], List[str], List[str]]
+
+
+def _bs4_rows(soup) -> Iterator[RowTexts]:
+    for tr in soup.select("tr[data-gemap-marker]"):
+        tds = tr.find_all("td")
+        if len(tds) < 2:
+            continue
+        yield (
+            tr.get("data-gemap-marker"),
+            list(tds[0].stripped_strings),
+            list(tds[1].stripped_strings),
+        )
+
+
+def _rows_html_parser(html: str) -> Iterator[RowTexts]:
+    yield from _bs4_rows(BeautifulSoup(html, "html.parser"))
+
+
+def _rows_strainer(html: str) -> Iterator[RowTexts]:
+    only_marker_rows = SoupStrainer("tr", attrs={"data-gemap-marker": True})
+    yield from _bs4_rows(BeautifulSoup(html, "lxml", parse_only=only_marker_rows))
+
+
+# Textstücke eines lxml-Elements wie bei BeautifulSoup: ohne Kommentare,
+# ohne Inhalt von <script>/<style>, aber mit dem Text hinter diesen Tags.
+def _lxml_strings(el) -> Iterator[str]:
+    if not isinstance(el.tag, str) or el.tag in ("script", "style"):
+        return
+    if el.text:
+        yield el.text
+    for child in el:
+        yield from _lxml_strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def _lxml_row(tr) -> Optional[RowTexts]:
+    tds = list(tr.iter("td"))
+    if len(tds) < 2:
+        return None
+    return (
+        tr.get("data-gemap-marker"),
+        [t.strip() for t in _lxml_strings(tds[0]) if t.strip()],
+        [t.strip() for t in _lxml_strings(tds[1]) if t.strip()],
+    )
+
+
+def _rows_lxml(html: str) -> Iterator[RowTexts]:
+    doc = lxml_html.fromstring(html)
+    for tr in doc.xpath("//tr[@data-gemap-marker]"):
+        row = _lxml_row(tr)
+        if row is not None:
+            yield row
+
+
+def _rows_lxml_stream(html: str) -> Iterator[RowTexts]:
+    parser = etree.HTMLPullParser(events=("end",), tag="tr")
+    chunk_size = 64 * 1024
+
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start:start + chunk_size])
+        for _, tr in parser.read_events():
+            if tr.get("data-gemap-marker") is not None:
+                row = _lxml_row(tr)
+                if row is not None:
+                    yield row
+            # Zeile (und bereits verarbeitete Geschwister) freigeben
+            tr.clear()
+            while tr.getprevious() is not None:
+                del tr.getparent()[0]
+
+    parser.close()
+
+
+PARSERS: Dict[str, Callable[[str], Iterator[RowTexts]]] = {
+    "html.parser": _rows_html_parser,
+    "strainer": _rows_strainer,
+    "lxml": _rows_lxml,
+    "lxml-stream": _rows_lxml_stream,
+}
+
+
 # ==============================
 # 1) SCRAPEN (HTML -> Python Dicts)
 # ==============================
-def scrape_all_facilities() -> List[Dict]:
-    html = _fetch_html(URL)
-    soup = BeautifulSoup(html, "html.parser")
+def parse_facilities(html: str, parser: str = GK_PARSER) -> List[Dict]:
+    rows = PARSERS.get(parser)
+    if rows is None:
+        valid = ", ".join(PARSERS)
+        raise ValueError(f"Unbekannter GK_PARSER '{parser}'. Erlaubt: {valid}")
 
-    # Robust: wir nehmen alle Zeilen, die marker data haben
-    rows = soup.select('tr[data-gemap-marker]')
     items: List[Dict] = []
 
-    for tr in rows:
-        marker = _parse_marker(tr.get("data-gemap-marker"))
+    for marker_raw, name_parts, art_parts in rows(html):
+        marker = _parse_marker(marker_raw)
         lat = marker.get("lat") if marker else None
         lon = marker.get("lng") if marker else None
         addr = marker.get("address") if marker else None
@@ -120,24 +230,15 @@ def scrape_all_facilities() -> List[Dict]:
         street, postal, city = _split_address(addr)
 
         # Spalten: [0]=Name(+Telefon), [1]=Art, ...
-        tds = tr.find_all("td")
-        if len(tds) < 2:
-            continue
-
-        name_td = tds[0]
-        art_td = tds[1]
-
-        # Name + Telefon aus erster Spalte
-        name_text_multiline = name_td.get_text("\n", strip=True)
-        name = name_text_multiline.split("\n")[0].strip()
+        # Name = erste Textzeile der ersten Spalte
+        name = "\n".join(name_parts).split("\n")[0].strip()
 
         # stabiler: für Phone-Suche lieber mit Spaces
-        name_text_spaced = name_td.get_text(" ", strip=True)
-        phone_match = re.search(r"(\+?\d[\d\s()/.-]{6,})", name_text_spaced)
+        phone_match = re.search(r"(\+?\d[\d\s()/.-]{6,})", " ".join(name_parts))
         phone = phone_match.group(1).strip() if phone_match else ""
 
         # Kategorie ("Art")
-        art_label = art_td.get_text(" ", strip=True)
+        art_label = " ".join(art_parts)
         internal_type = _to_internal_type(art_label)
 
         # Debug-Hilfe: zeigt dir neue/unbekannte Kategorien
@@ -163,29 +264,16 @@ def scrape_all_facilities() -> List[Dict]:
     return items
 
 
+def scrape_all_facilities() -> List[Dict]:
+    with metrics.timer("stage_seconds", source=SOURCE, stage="fetch"):
+        html = _fetch_html(URL)
+    with metrics.timer("parse_seconds", source=SOURCE, parser=GK_PARSER):
+        return parse_facilities(html)
+
+
 # ==============================
 # 2) PERSISTIEREN (Dicts -> DB)
 # ==============================
-UPSERT_FACILITY_RETURN_ID = """
-INSERT INTO facilities
-  (source, source_key, facility_name, type, street, postal_code, city, phone, latitude, longitude, wheelchair_accessible)
-VALUES
-  (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-ON CONFLICT (source, source_key)
-DO UPDATE SET
-  facility_name = EXCLUDED.facility_name,
-  type = EXCLUDED.type,
-  street = EXCLUDED.street,
-  postal_code = EXCLUDED.postal_code,
-  city = EXCLUDED.city,
-  phone = EXCLUDED.phone,
-  latitude = EXCLUDED.latitude,
-  longitude = EXCLUDED.longitude,
-  wheelchair_accessible = EXCLUDED.wheelchair_accessible
-RETURNING id;
-"""
-
-
 def persist_gelsenkirchen_gesundheitskarte(conn) -> int:
     facilities = scrape_all_facilities()
 
@@ -193,27 +281,13 @@ def persist_gelsenkirchen_gesundheitskarte(conn) -> int:
         print("[scraper] [GE] Keine Einträge gefunden.")
         return 0
 
-    written = 0
-    with conn.cursor() as cur:
-        for fac in facilities:
-            cur.execute(
-                UPSERT_FACILITY_RETURN_ID,
-                (
-                    fac["source"],
-                    fac["source_key"],
-                    fac["facility_name"],
-                    fac["type"],
-                    fac["street"],
-                    fac["postal_code"],
-                    fac["city"],
-                    fac["phone"],
-                    fac["latitude"],
-                    fac["longitude"],
-                    fac["wheelchair_accessible"],
-                ),
-            )
-            cur.fetchone()  # id wird erzeugt, hier nicht benötigt
-            written += 1
+    # Bulk: COPY in Staging-Tabelle + ein INSERT ... SELECT (siehe bulk_writer.py).
+    # last_seen_at = NOW(): sonst gälten für retention.py alle Einträge nach
+    # dem Aufbewahrungsfenster (ab Insert-Zeitpunkt) als veraltet.
+    migrations.ensure_current("[scraper] [GE]")
+    with metrics.timer("stage_seconds", source=SOURCE, stage="write"):
+        ids = bulk_upsert_facilities(conn, facilities)
+    written = len(ids)
 
     print(f"[scraper] [GE] ✅ Facilities upserted: {written}")
-    return written
\ No newline at end of file
+    return written
@@ -1,12 +1,31 @@
 import csv
 from datetime import date, datetime
 from decimal import Decimal
-from typing import Any
-
+from typing import Any, Iterator, Tuple
+
+import metrics
+from bulk_writer import copy_rows
+
+
+# Staging-Tabelle für COPY FROM STDIN. line_no: bei doppelten
+# (stichtag, stadtteil_id) gewinnt wie bisher die letzte Zeile der CSV.
+STAGE_COLUMNS = (
+    "line_no",
+    "stichtag",
+    "stadtteil_id",
+    "stadtteil_name",
+    "arbeitslosenanteil",
+    "arbeitslosenanteil_maennlich",
+    "arbeitslosenanteil_weiblich",
+    "arbeitslosenanteil_deutsch",
+    "arbeitslosenanteil_nichtdeutsch",
+    "jugendarbeitslosigkeit_u25",
+)
 
-CREATE_TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS district_unemployment (
-    id BIGSERIAL PRIMARY KEY,
+CREATE_STAGE_SQL = """
+DROP TABLE IF EXISTS pg_temp.district_unemployment_stage;
+CREATE TEMP TABLE district_unemployment_stage (
+    line_no INTEGER NOT NULL,
     stichtag DATE NOT NULL,
     stadtteil_id INTEGER NOT NULL,
     stadtteil_name VARCHAR(255) NOT NULL,
@@ -15,19 +34,11 @@ CREATE TABLE IF NOT EXISTS district_unemployment (
     arbeitslosenanteil_weiblich NUMERIC(6,2),
     arbeitslosenanteil_deutsch NUMERIC(6,2),
     arbeitslosenanteil_nichtdeutsch NUMERIC(6,2),
-    jugendarbeitslosigkeit_u25 NUMERIC(6,2),
-    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
-    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
-    CONSTRAINT uq_district_unemployment UNIQUE (stichtag, stadtteil_id)
-);
-"""
-
-CREATE_INDEX_SQL = """
-CREATE INDEX IF NOT EXISTS idx_district_unemployment_stichtag
-ON district_unemployment (stichtag);
+    jugendarbeitslosigkeit_u25 NUMERIC(6,2)
+) ON COMMIT DROP;
 """
 
-UPSERT_SQL = """
+MERGE_SQL = """
 INSERT INTO district_unemployment (
     stichtag,
     stadtteil_id,
@@ -40,7 +51,19 @@ INSERT INTO district_unemployment (
     jugendarbeitslosigkeit_u25,
     updated_at
 )
-VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
+SELECT DISTINCT ON (stichtag, stadtteil_id)
+    stichtag,
+    stadtteil_id,
+    stadtteil_name,
+    arbeitslosenanteil,
+    arbeitslosenanteil_maennlich,
+    arbeitslosenanteil_weiblich,
+    arbeitslosenanteil_deutsch,
+    arbeitslosenanteil_nichtdeutsch,
+    jugendarbeitslosigkeit_u25,
+    NOW()
+FROM district_unemployment_stage
+ORDER BY stichtag, stadtteil_id, line_no DESC
 ON CONFLICT (stichtag, stadtteil_id)
 DO UPDATE SET
     stadtteil_name = EXCLUDED.stadtteil_name,
@@ -54,12 +77,6 @@ DO UPDATE SET
 """
 
 
-def ensure_schema(conn) -> None:
-    with conn.cursor() as cur:
-        cur.execute(CREATE_TABLE_SQL)
-        cur.execute(CREATE_INDEX_SQL)
-
-
 def parse_date(value: Any) -> date | None:
     if value is None:
         return None
@@ -93,45 +110,52 @@ def is_stadtteil(raum_id: int) -> bool:
     return 10 <= raum_id <= 52
 
 
-def persist_unemployment_from_csv(conn, csv_path: str) -> int:
-    ensure_schema(conn)
+# Zeile 8 enthält die eigentlichen Spaltennamen
+HEADER_ROW_INDEX = 7
+
+REQUIRED_COLUMNS = [
+    "Stichtag",
+    "Raum_ID",
+    "Raum_Name",
+    "Arbeitslosenanteil",
+    "Arbeitslosenanteil, männlich",
+    "Arbeitslosenanteil, weiblich",
+    "Arbeitslosenanteil, deutsch",
+    "Arbeitslosenanteil, nichtdeutsch",
+    "Jugendarbeitslosigkeit unter 25 Jahre",
+]
+
 
+def iter_unemployment_rows(csv_path: str) -> Iterator[Tuple]:
+    """
+    Liest die CSV Zeile für Zeile (Generator, konstanter Speicher) und
+    liefert Tupel in der Reihenfolge von STAGE_COLUMNS.
+    """
     with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
         reader = csv.reader(f, delimiter=";")
-        rows = list(reader)
-
-    if len(rows) < 9:
-        raise ValueError("CSV-Datei hat zu wenige Zeilen.")
-
-    # Zeile 8 enthält die eigentlichen Spaltennamen
-    header = rows[7]
-
-    headers = {}
-    for idx, col in enumerate(header):
-        col_name = str(col).strip()
-        if col_name:
-            headers[col_name] = idx
-
-    required = [
-        "Stichtag",
-        "Raum_ID",
-        "Raum_Name",
-        "Arbeitslosenanteil",
-        "Arbeitslosenanteil, männlich",
-        "Arbeitslosenanteil, weiblich",
-        "Arbeitslosenanteil, deutsch",
-        "Arbeitslosenanteil, nichtdeutsch",
-        "Jugendarbeitslosigkeit unter 25 Jahre",
-    ]
-
-    missing = [col for col in required if col not in headers]
-    if missing:
-        raise ValueError(f"Fehlende Spalten in CSV-Datei: {missing}")
-
-    written = 0
 
-    with conn.cursor() as cur:
-        for row in rows[8:]:
+        header = None
+        for idx, row in enumerate(reader):
+            if idx == HEADER_ROW_INDEX:
+                header = row
+                break
+
+        if header is None:
+            raise ValueError("CSV-Datei hat zu wenige Zeilen.")
+
+        headers = {}
+        for idx, col in enumerate(header):
+            col_name = str(col).strip()
+            if col_name:
+                headers[col_name] = idx
+
+        missing = [col for col in REQUIRED_COLUMNS if col not in headers]
+        if missing:
+            raise ValueError(f"Fehlende Spalten in CSV-Datei: {missing}")
+
+        data_rows = 0
+        for row in reader:
+            data_rows += 1
             if not row:
                 continue
 
@@ -150,30 +174,33 @@ def persist_unemployment_from_csv(conn, csv_path: str) -> int:
             if not is_stadtteil(raum_id):
                 continue
 
-            stichtag = parse_date(stichtag_raw)
-            stadtteil_name = str(raum_name_raw).strip()
-
-            arbeitslosenanteil = to_decimal(row[headers["Arbeitslosenanteil"]])
-            arbeitslosenanteil_maennlich = to_decimal(row[headers["Arbeitslosenanteil, männlich"]])
-            arbeitslosenanteil_weiblich = to_decimal(row[headers["Arbeitslosenanteil, weiblich"]])
-            arbeitslosenanteil_deutsch = to_decimal(row[headers["Arbeitslosenanteil, deutsch"]])
-            arbeitslosenanteil_nichtdeutsch = to_decimal(row[headers["Arbeitslosenanteil, nichtdeutsch"]])
-            jugendarbeitslosigkeit_u25 = to_decimal(row[headers["Jugendarbeitslosigkeit unter 25 Jahre"]])
-
-            cur.execute(
-                UPSERT_SQL,
-                (
-                    stichtag,
-                    raum_id,
-                    stadtteil_name,
-                    arbeitslosenanteil,
-                    arbeitslosenanteil_maennlich,
-                    arbeitslosenanteil_weiblich,
-                    arbeitslosenanteil_deutsch,
-                    arbeitslosenanteil_nichtdeutsch,
-                    jugendarbeitslosigkeit_u25,
-                ),
+            yield (
+                reader.line_num,
+                parse_date(stichtag_raw),
+                raum_id,
+                str(raum_name_raw).strip(),
+                to_decimal(row[headers["Arbeitslosenanteil"]]),
+                to_decimal(row[headers["Arbeitslosenanteil, männlich"]]),
+                to_decimal(row[headers["Arbeitslosenanteil, weiblich"]]),
+                to_decimal(row[headers["Arbeitslosenanteil, deutsch"]]),
+                to_decimal(row[headers["Arbeitslosenanteil, nichtdeutsch"]]),
+                to_decimal(row[headers["Jugendarbeitslosigkeit unter 25 Jahre"]]),
             )
-            written += 1
 
-    return written
\ No newline at end of file
+        if data_rows == 0:
+            raise ValueError("CSV-Datei hat zu wenige Zeilen.")
+
+
+def persist_unemployment_from_csv(conn, csv_path: str) -> int:
+    """
+    Streamt die CSV per COPY FROM STDIN in eine Staging-Tabelle und
+    übernimmt sie mit einem einzigen INSERT ... SELECT ... ON CONFLICT.
+    """
+    with conn.cursor() as cur:
+        cur.execute(CREATE_STAGE_SQL)
+        rows = metrics.timed_iter(iter_unemployment_rows(csv_path), "parse_seconds", source="unemployment")
+        written = copy_rows(cur, "district_unemployment_stage", STAGE_COLUMNS, rows)
+        cur.execute(MERGE_SQL)
+
+    metrics.inc("rows_written", written, table="district_unemployment", source="unemployment")
+    return written
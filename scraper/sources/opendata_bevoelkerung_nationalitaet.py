@@ -1,42 +1,51 @@
 # sources/opendata_bevoelkerung_nationalitaet.py
 import csv
 import datetime
-from typing import Optional
-
-
-
-CREATE_TABLE_SQL = """
-CREATE TABLE IF NOT EXISTS district_population (
-  id BIGSERIAL PRIMARY KEY,
-
+from typing import Iterator, Optional, Tuple
+
+import metrics
+from bulk_writer import copy_rows
+
+
+
+# Staging-Tabelle für COPY FROM STDIN. line_no merkt sich die Zeile in der
+# CSV, damit bei doppelten (stichtag, stadtteil_id) wie bisher die letzte gewinnt.
+STAGE_COLUMNS = (
+    "line_no",
+    "stichtag",
+    "stadtbezirk_id",
+    "stadtbezirk_name",
+    "stadtteil_id",
+    "stadtteil_name",
+    "deutsch",
+    "deutsch_mit_2_sta",
+    "nichtdeutsch",
+)
+
+CREATE_STAGE_SQL = """
+DROP TABLE IF EXISTS pg_temp.district_population_stage;
+CREATE TEMP TABLE district_population_stage (
+  line_no INT NOT NULL,
   stichtag DATE NOT NULL,
-
   stadtbezirk_id INT,
   stadtbezirk_name TEXT,
-
   stadtteil_id INT NOT NULL,
   stadtteil_name TEXT NOT NULL,
-
   deutsch INT,
   deutsch_mit_2_sta INT,
-  nichtdeutsch INT,
-
-  gesamt INT GENERATED ALWAYS AS (
-    COALESCE(deutsch,0) + COALESCE(nichtdeutsch,0)
-  ) STORED,
-
-  UNIQUE (stichtag, stadtteil_id)
-);
+  nichtdeutsch INT
+) ON COMMIT DROP;
 """
 
-
-
-UPSERT_POP_SQL = """
+MERGE_POP_SQL = """
 INSERT INTO district_population
 (stichtag, stadtbezirk_id, stadtbezirk_name, stadtteil_id, stadtteil_name,
  deutsch, deutsch_mit_2_sta, nichtdeutsch)
-VALUES
-(%s,%s,%s,%s,%s,%s,%s,%s)
+SELECT DISTINCT ON (stichtag, stadtteil_id)
+  stichtag, stadtbezirk_id, stadtbezirk_name, stadtteil_id, stadtteil_name,
+  deutsch, deutsch_mit_2_sta, nichtdeutsch
+FROM district_population_stage
+ORDER BY stichtag, stadtteil_id, line_no DESC
 ON CONFLICT (stichtag, stadtteil_id)
 DO UPDATE SET
   stadtbezirk_id = EXCLUDED.stadtbezirk_id,
@@ -60,48 +69,47 @@ def _parse_date(v: str) -> datetime.date:
     # Format: 31.12.2025
     return datetime.datetime.strptime(s, "%d.%m.%Y").date()
 
-def persist_population_from_csv(conn, csv_path: str) -> int:
+def iter_population_rows(csv_path: str) -> Iterator[Tuple]:
     """
-    Liest die OpenData-CSV (Bevölkerung Nationalität) und upserted nach district_population.
-    Erwartet delimiter=';' und Spalten wie in deiner Datei.
+    Liest die CSV Zeile für Zeile (Generator, konstanter Speicher) und
+    liefert Tupel in der Reihenfolge von STAGE_COLUMNS.
     """
-    written = 0
-    
-    with conn.cursor() as cur:
-        cur.execute(CREATE_TABLE_SQL)
-
     with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
         reader = csv.DictReader(f, delimiter=";")
-        with conn.cursor() as cur:
-            for row in reader:
-                stichtag = _parse_date(row["Stichtag"])
-                stadtbezirk_id = _parse_int(row.get("Stadtbezirk_ID"))
-                stadtbezirk_name = (row.get("Stadtbezirk_Name") or "").strip().strip('"')
+        for row in reader:
+            stadtteil_id = _parse_int(row.get("Stadtteil_ID"))
+            if stadtteil_id is None:
+                continue
+
+            yield (
+                reader.line_num,
+                _parse_date(row["Stichtag"]),
+                _parse_int(row.get("Stadtbezirk_ID")),
+                (row.get("Stadtbezirk_Name") or "").strip().strip('"'),
+                stadtteil_id,
+                (row.get("Stadtteil_Name") or "").strip().strip('"'),
+                _parse_int(row.get("deutsch")),
+                _parse_int(row.get("davon deutsch mit 2. StA")),
+                _parse_int(row.get("nichtdeutsch")),
+            )
 
-                stadtteil_id = _parse_int(row.get("Stadtteil_ID"))
-                stadtteil_name = (row.get("Stadtteil_Name") or "").strip().strip('"')
 
-                deutsch = _parse_int(row.get("deutsch"))
-                deutsch_mit_2_sta = _parse_int(row.get("davon deutsch mit 2. StA"))
-                nichtdeutsch = _parse_int(row.get("nichtdeutsch"))
+def persist_population_from_csv(conn, csv_path: str) -> int:
+    """
+    Liest die OpenData-CSV (Bevölkerung Nationalität) und upserted nach district_population.
+    Erwartet delimiter=';' und Spalten wie in deiner Datei.
 
-                if stadtteil_id is None:
-                    continue
+    Die Zeilen laufen per COPY FROM STDIN in eine Staging-Tabelle und werden
+    danach mit einem einzigen INSERT ... SELECT ... ON CONFLICT übernommen.
+    """
+    with conn.cursor() as cur:
+        cur.execute(CREATE_STAGE_SQL)
+        # timed_iter: misst nur das CSV-Parsen, nicht die Zeit im COPY
+        rows = metrics.timed_iter(iter_population_rows(csv_path), "parse_seconds", source="population")
+        written = copy_rows(cur, "district_population_stage", STAGE_COLUMNS, rows)
+        cur.execute(MERGE_POP_SQL)
 
-                cur.execute(
-                    UPSERT_POP_SQL,
-                    (
-                        stichtag,
-                        stadtbezirk_id,
-                        stadtbezirk_name,
-                        stadtteil_id,
-                        stadtteil_name,
-                        deutsch,
-                        deutsch_mit_2_sta,
-                        nichtdeutsch,
-                    ),
-                )
-                written += 1
+    metrics.inc("rows_written", written, table="district_population", source="population")
 
     print(f"[opendata] ✅ district_population upserted: {written}")
-    return written
\ No newline at end of file
+    return written